@@ -1,4 +1,9 @@
-from config import app
+from config import app, mysql
+from services import logs
+
+# Log terstruktur lewat queue, dipasang sebelum modul lain mulai menulis
+logs.setup()
+
 from models import inject_globals, from_json_filter, parse_amenities_filter
 
 import routes.main_routes
@@ -7,6 +12,12 @@ import routes.booking_routes
 import routes.user_routes
 import routes.admin_routes
 import routes.api_routes
+from services.expiry import sweeper as expiry_sweeper
+from services.holds import reaper as hold_reaper
+from services.images import image_srcset, image_srcsets, image_src
+from services.uploads import processor as upload_processor
+from services.bookings import writer as booking_writer
+from services import static_files, page_cache, templates, idempotency
 
 app.config['WTF_CSRF_ENABLED'] = True
 app.context_processor(inject_globals)
@@ -14,6 +25,35 @@ app.context_processor(inject_globals)
 app.jinja_env.filters['from_json'] = from_json_filter
 app.jinja_env.filters['parse_amenities'] = parse_amenities_filter
 
+# URL static otomatis diberi fingerprint isi file
+asset_url = static_files.install(app)
+
+def image_src_url(path, size='card', fmt='jpeg'):
+    return asset_url(image_src(path, size, fmt))
+
+app.jinja_env.globals['image_srcset'] = image_srcset
+app.jinja_env.globals['image_srcsets'] = image_srcsets
+app.jinja_env.globals['image_src'] = image_src_url
+
+# {{ fragment('...') }}: bagian personal halaman yang di-cache
+page_cache.install(app)
+
+# {{ idempotency_key() }}: key sekali pakai untuk form booking/pembayaran
+idempotency.install(app)
+
+# Pool proses upload dibuat sebelum thread lain berjalan
+upload_processor.start(app, mysql)
+
+# Group commit booking (opsional, untuk lonjakan request)
+if app.config.get('BOOKING_GROUP_COMMIT'):
+    booking_writer.start(app, mysql)
+
+# Expire booking yang belum dibayar di luar request
+expiry_sweeper.start(app, mysql)
+
+# Lepas hold checkout yang habis waktunya
+hold_reaper.start(app, mysql)
+
 @app.template_filter('contains')
 def contains_filter(value, substring):
     """Custom filter untuk cek substring"""
@@ -24,5 +64,9 @@ def contains_case_filter(value, substring):
     """Custom filter untuk cek substring (case-sensitive)"""
     return substring in str(value)
 
+# Compile semua template saat boot (setelah semua filter terdaftar),
+# bytecode disimpan di instance/jinja_cache
+templates.install(app)
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
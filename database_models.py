@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from services.parsing import parse_images, parse_amenities, parse_features
 
 db = SQLAlchemy()
 
@@ -67,23 +68,11 @@ class Room(db.Model):
     
     @property
     def images_list(self):
-        import json
-        if self.images:
-            try:
-                return json.loads(self.images)
-            except:
-                return [img.strip() for img in self.images.split(',') if img.strip()]
-        return []
+        return parse_images(self.images)
     
     @property
     def amenities_list(self):
-        import json
-        if self.amenities:
-            try:
-                return json.loads(self.amenities)
-            except:
-                return [amenity.strip() for amenity in self.amenities.split(',') if amenity.strip()]
-        return []
+        return parse_amenities(self.amenities)
     
     @property
     def formatted_price(self):
@@ -277,23 +266,11 @@ class Venue(db.Model):
     
     @property
     def amenities_list(self):
-        import json
-        if self.amenities:
-            try:
-                return json.loads(self.amenities)
-            except:
-                return [amenity.strip() for amenity in self.amenities.split(',') if amenity.strip()]
-        return []
+        return parse_amenities(self.amenities)
     
     @property
     def features_list(self):
-        import json
-        if self.features:
-            try:
-                return json.loads(self.features)
-            except:
-                return [feature.strip() for feature in self.features.split(',') if feature.strip()]
-        return []
+        return parse_features(self.features)
     
     @property
     def formatted_price_per_hour(self):
@@ -1,53 +1,73 @@
-import json
+import base64
 from datetime import datetime
+from services.parsing import parse_images, parse_amenities, main_image as first_image
 
-# PARSE FUNCTIONS
-def parse_images_data(images_raw):
-    """Parse images data from database (JSON string or comma-separated)"""
-    if not images_raw:
-        return []
-    
+# PRICING
+TAX_RATE = 0.10  # 10%
+SERVICE_RATE = 0.11  # 11%
+
+def calculate_stay_price(price_per_night, nights):
+    """Subtotal, tax, service charge and total for a stay"""
+    subtotal = float(price_per_night) * nights
+    tax_amount = subtotal * TAX_RATE
+    service_charge = subtotal * SERVICE_RATE
+    return {
+        'subtotal': subtotal,
+        'tax_amount': tax_amount,
+        'service_charge': service_charge,
+        'total_price': subtotal + tax_amount + service_charge
+    }
+
+# KEYSET PAGINATION
+# Cursor = (created_at, id) baris terakhir halaman sebelumnya, jadi halaman
+# ke-N tetap satu index range scan tanpa OFFSET.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Clamp a per_page query arg to 1..MAX_PAGE_SIZE"""
     try:
-        if isinstance(images_raw, str):
-            # Try to parse as JSON
-            try:
-                images_list = json.loads(images_raw)
-            except json.JSONDecodeError:
-                # If not JSON, treat as comma-separated string
-                images_list = [img.strip() for img in images_raw.split(',') if img.strip()]
-        else:
-            images_list = []
-        
-        # Ensure it's a list
-        if not isinstance(images_list, list):
-            images_list = [images_list]
-        
-        return images_list
-    except Exception as e:
-        print(f"Error parsing images: {e}")
-        return []
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
 
-def parse_amenities_data(amenities_raw):
-    """Parse amenities data from database"""
-    if not amenities_raw:
-        return []
-    
+def encode_cursor(created_at, row_id):
+    """Opaque URL-safe cursor for one (created_at, id) position"""
+    if isinstance(created_at, datetime):
+        created_at = created_at.strftime('%Y-%m-%d %H:%M:%S')
+    raw = f"{created_at}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Return (created_at, id) or None for a missing/invalid cursor"""
+    if not cursor:
+        return None
     try:
-        if isinstance(amenities_raw, str):
-            if amenities_raw.startswith('['):
-                try:
-                    amenities_list = json.loads(amenities_raw.replace("'", '"'))
-                except:
-                    amenities_list = [a.strip() for a in amenities_raw.split(',')]
-            else:
-                amenities_list = [a.strip() for a in amenities_raw.split(',')]
-        else:
-            amenities_list = []
-        
-        return amenities_list
-    except Exception as e:
-        print(f"Error parsing amenities: {e}")
-        return []
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S'), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def keyset_condition(alias, cursor):
+    """SQL fragment + params selecting rows older than `cursor` (newest first)"""
+    position = decode_cursor(cursor)
+    if position is None:
+        return '', []
+    created_at, row_id = position
+    return (f" AND ({alias}.created_at < %s OR ({alias}.created_at = %s AND {alias}.id < %s))",
+            [created_at, created_at, row_id])
+
+def keyset_page(rows, per_page):
+    """Trim a per_page + 1 fetch to one page and build the next cursor"""
+    rows = list(rows)
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    return rows, next_cursor
 
 # FORMAT FUNCTIONS
 def format_price(price):
@@ -117,7 +137,7 @@ def process_room_data(room):
     
     # Parse images
     images_raw = room_dict.get('images')
-    room_dict['images_list'] = parse_images_data(images_raw)
+    room_dict['images_list'] = parse_images(images_raw)
     
     # Get main image for card
     if room_dict['images_list'] and len(room_dict['images_list']) > 0:
@@ -127,7 +147,7 @@ def process_room_data(room):
     
     # Parse amenities
     amenities_raw = room_dict.get('amenities')
-    room_dict['amenities_list'] = parse_amenities_data(amenities_raw)
+    room_dict['amenities_list'] = parse_amenities(amenities_raw)
     
     # Format price
     try:
@@ -153,7 +173,7 @@ def process_facility_data(facility):
     
     # Get images from image_url or images column
     images_raw = facility_dict.get('image_url') or facility_dict.get('images')
-    facility_dict['images_list'] = parse_images_data(images_raw)
+    facility_dict['images_list'] = parse_images(images_raw)
     
     # Add fallback image if no images
     if not facility_dict['images_list']:
@@ -161,7 +181,7 @@ def process_facility_data(facility):
     
     # Parse amenities
     amenities_raw = facility_dict.get('amenities')
-    facility_dict['amenities_list'] = parse_amenities_data(amenities_raw)
+    facility_dict['amenities_list'] = parse_amenities(amenities_raw)
     
     # Format price
     if facility_dict.get('price_per_hour'):
@@ -208,12 +228,7 @@ def process_room_images(rooms):
     for raw_room in rooms:
         room = dict(raw_room)
         
-        main_image = None
-        
-        if room.get('images'):
-            img = str(room['images']).strip()
-            if img and img.lower() not in ['null', 'none', '']:
-                main_image = img
+        main_image = first_image(room.get('images'))
         
         # Fallback
         if not main_image:
@@ -1,10 +1,11 @@
-from functools import wraps
+from functools import wraps, lru_cache
 from flask import session, flash, redirect, url_for, request
 import json
 import os
 from werkzeug.utils import secure_filename
 from datetime import datetime
 from config import app
+from services.parsing import parse_amenities
 
 # Helper Functions
 def allowed_file(filename):
@@ -40,9 +41,28 @@ def inject_globals():
     }
 
 # Custom Jinja2 Filters
+# String JSON yang sama (kolom amenities/images) muncul di setiap render,
+# jadi hasil parse-nya di-memo; list dikembalikan sebagai tuple supaya
+# hasil yang dipakai bersama tidak bisa diubah template
+JSON_FILTER_CACHE_SIZE = 1024
+
+def _freeze(value):
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+@lru_cache(maxsize=JSON_FILTER_CACHE_SIZE)
+def _parse_json(value):
+    try:
+        return _freeze(json.loads(value))
+    except:
+        return ()
+
 def from_json_filter(value):
     """Convert JSON string to Python object"""
     if value:
+        if isinstance(value, str):
+            return _parse_json(value)
         try:
             return json.loads(value)
         except:
@@ -50,13 +70,5 @@ def from_json_filter(value):
     return []
 
 def parse_amenities_filter(value):
-    """Parse amenities JSON and return list"""
-    if value:
-        try:
-            amenities = json.loads(value)
-            if isinstance(amenities, list):
-                return amenities
-        except:
-            pass
-    return []
-
+    """Parse amenities JSON (or comma-separated) and return list"""
+    return parse_amenities(value)
@@ -1,4 +1,4 @@
-from flask import render_template, request, redirect, url_for, flash, session, jsonify
+from flask import render_template, request, redirect, url_for, flash, session, jsonify, abort
 from config import app, mysql
 from models import login_required, admin_required, allowed_file
 import os
@@ -8,7 +8,20 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import re
 from functools import wraps
-from helpers import process_room_images
+from helpers import process_room_images, parse_page_size, keyset_condition, keyset_page
+from services import inventory, counters
+from services.availability import engine as availability_engine
+from services.dashboard import dashboard_cache
+from services.catalog import catalog
+from services.page_cache import page_cache
+from services.parsing import parse_images, parse_amenities
+from services.logs import get_logger
+from services.uploads import processor as upload_processor, ROOM, PENDING, READY
+from services import blobs
+from services.blobs import room_store, payment_store
+from services.static_files import send_fingerprinted
+
+log = get_logger('admin')
 
 def login_required(f):
     @wraps(f)
@@ -36,81 +49,17 @@ def admin_required(f):
 @login_required
 @admin_required
 def admin_dashboard():
-    cur = mysql.connection.cursor()
-    
     try:
-        # Get statistics
-        cur.execute("SELECT COUNT(*) as total FROM rooms")
-        total_rooms = cur.fetchone()['total'] or 0
-        
-        cur.execute("SELECT COUNT(*) as total FROM bookings")
-        total_bookings = cur.fetchone()['total'] or 0
-        
-        cur.execute("SELECT COUNT(*) as total FROM users")
-        total_users = cur.fetchone()['total'] or 0
-        
-        cur.execute("SELECT SUM(total_price) as total FROM bookings WHERE status = 'completed'")
-        revenue_result = cur.fetchone()
-        total_revenue = revenue_result['total'] if revenue_result and revenue_result['total'] else 0
-        
-        # Available rooms
-        cur.execute("SELECT SUM(available_count) as available FROM rooms WHERE is_available = 1")
-        available_result = cur.fetchone()
-        available_rooms = available_result['available'] if available_result and available_result['available'] else 0
-        
-        # Pending bookings count
-        cur.execute("SELECT COUNT(*) as pending FROM bookings WHERE status = 'pending'")
-        pending_bookings = cur.fetchone()['pending'] or 0
-        
-        # Today's bookings
-        today = datetime.now().date()
-        cur.execute("SELECT COUNT(*) as today FROM bookings WHERE DATE(created_at) = %s", (today,))
-        today_bookings = cur.fetchone()['today'] or 0
-        
-        # Recent bookings
-        cur.execute("""
-            SELECT 
-                b.id, b.booking_code, b.status, b.total_price, b.guests,
-                b.check_in, b.check_out, b.created_at,
-                r.name as room_name,
-                u.first_name, u.last_name, u.email
-            FROM bookings b
-            JOIN rooms r ON b.room_id = r.id
-            LEFT JOIN users u ON b.user_id = u.id
-            ORDER BY b.created_at DESC
-            LIMIT 8
-        """)
-        recent_bookings = cur.fetchall()
-        
-        # Recent users
-        cur.execute("""
-            SELECT id, first_name, last_name, email, created_at 
-            FROM users 
-            ORDER BY created_at DESC 
-            LIMIT 5
-        """)
-        recent_users = cur.fetchall()
-        
+        stats = dashboard_cache.get(lambda: mysql.connection.cursor())
     except Exception as e:
-        print(f"Error fetching dashboard data: {e}")
-        total_rooms = total_bookings = total_users = total_revenue = 0
-        available_rooms = pending_bookings = today_bookings = 0
-        recent_bookings = []
-        recent_users = []
-    
-    finally:
-        cur.close()
+        log.exception('dashboard.error')
+        stats = {
+            'total_rooms': 0, 'total_bookings': 0, 'total_users': 0, 'total_revenue': 0,
+            'available_rooms': 0, 'pending_bookings': 0, 'today_bookings': 0,
+            'recent_bookings': [], 'recent_users': []
+        }
     
-    return render_template('admin/dashboard.html',
-                         total_rooms=total_rooms,
-                         total_bookings=total_bookings,
-                         total_users=total_users,
-                         total_revenue=total_revenue,
-                         available_rooms=available_rooms,
-                         pending_bookings=pending_bookings,
-                         today_bookings=today_bookings,
-                         recent_bookings=recent_bookings,
-                         recent_users=recent_users)
+    return render_template('admin/dashboard.html', **stats)
 
 @app.route('/profile/change-password', methods=['POST'])
 @login_required
@@ -154,74 +103,67 @@ def change_password():
 @admin_required
 def admin_bookings():
     status_filter = request.args.get('status', 'all')
+    cursor = request.args.get('cursor')
+    per_page = parse_page_size(request.args.get('per_page'))
     cur = mysql.connection.cursor()
     
+    query = """
+        SELECT 
+            b.id, 
+            b.booking_code, 
+            b.status, 
+            b.total_price, 
+            b.guests,
+            b.check_in,
+            b.check_out,
+            b.created_at,
+            b.special_requests,
+            b.admin_notes,
+            b.payment_status as booking_payment_status,
+            u.first_name, 
+            u.last_name, 
+            u.email, 
+            u.phone,
+            r.name as room_name,
+            p.status as payment_table_status,
+            p.proof_image,
+            p.payment_method,
+            COALESCE(p.status, b.payment_status, 'pending') as final_payment_status,
+            p.id as payment_id
+        FROM bookings b
+        JOIN users u ON b.user_id = u.id
+        JOIN rooms r ON b.room_id = r.id
+        LEFT JOIN payments p ON b.id = p.booking_id
+        WHERE 1=1
+    """
+    params = []
+    
+    if status_filter != 'all':
+        query += " AND b.status = %s"
+        params.append(status_filter)
+    
+    keyset_sql, keyset_params = keyset_condition('b', cursor)
+    query += keyset_sql
+    params.extend(keyset_params)
+    
+    query += " ORDER BY b.created_at DESC, b.id DESC LIMIT %s"
+    params.append(per_page + 1)
+    
+    cur.execute(query, params)
+    bookings, next_cursor = keyset_page(cur.fetchall(), per_page)
+    
+    # Total perkiraan dari status_counters, tanpa COUNT(*)
+    booking_counts = counters.booking_counts(cur)
     if status_filter == 'all':
-        cur.execute("""
-            SELECT 
-                b.id, 
-                b.booking_code, 
-                b.status, 
-                b.total_price, 
-                b.guests,
-                b.check_in,
-                b.check_out,
-                b.created_at,
-                b.special_requests,
-                b.admin_notes,
-                b.payment_status as booking_payment_status,
-                u.first_name, 
-                u.last_name, 
-                u.email, 
-                u.phone,
-                r.name as room_name,
-                p.status as payment_table_status,
-                p.proof_image,
-                p.payment_method,
-                COALESCE(p.status, b.payment_status, 'pending') as final_payment_status,
-                p.id as payment_id
-            FROM bookings b
-            JOIN users u ON b.user_id = u.id
-            JOIN rooms r ON b.room_id = r.id
-            LEFT JOIN payments p ON b.id = p.booking_id
-            ORDER BY b.created_at DESC
-        """)
+        total_bookings = sum(booking_counts.values())
     else:
-        cur.execute("""
-            SELECT 
-                b.id, 
-                b.booking_code, 
-                b.status, 
-                b.total_price, 
-                b.guests,
-                b.check_in,
-                b.check_out,
-                b.created_at,
-                b.special_requests,
-                b.admin_notes,
-                b.payment_status as booking_payment_status,
-                u.first_name, 
-                u.last_name, 
-                u.email, 
-                u.phone,
-                r.name as room_name,
-                p.status as payment_table_status,
-                p.proof_image,
-                p.payment_method,
-                COALESCE(p.status, b.payment_status, 'pending') as final_payment_status,
-                p.id as payment_id
-            FROM bookings b
-            JOIN users u ON b.user_id = u.id
-            JOIN rooms r ON b.room_id = r.id
-            LEFT JOIN payments p ON b.id = p.booking_id
-            WHERE b.status = %s
-            ORDER BY b.created_at DESC
-        """, (status_filter,))
-        
-    bookings = cur.fetchall()
+        total_bookings = booking_counts.get(status_filter, 0)
+    
     cur.close()
     
-    return render_template('admin/bookings.html', bookings=bookings, status_filter=status_filter)
+    return render_template('admin/bookings.html', bookings=bookings, status_filter=status_filter,
+                           next_cursor=next_cursor, cursor=cursor, per_page=per_page,
+                           total_bookings=total_bookings)
 
 @app.route('/admin/booking/<int:booking_id>/update', methods=['POST'])
 @admin_required
@@ -237,12 +179,10 @@ def update_booking_status(booking_id):
     
     cur = mysql.connection.cursor()
     
-    # Dapatkan data booking dan room
+    # Dapatkan data booking
     cur.execute("""
-        SELECT b.room_id, b.status as old_status, 
-               r.available_count, r.room_count
+        SELECT b.room_id, b.check_in, b.check_out, b.status as old_status
         FROM bookings b
-        JOIN rooms r ON b.room_id = r.id
         WHERE b.id = %s
     """, (booking_id,))
     
@@ -255,55 +195,33 @@ def update_booking_status(booking_id):
     old_status = booking['old_status']
     room_id = booking['room_id']
     
-    # 2. Update status booking
-    cur.execute("""
-        UPDATE bookings 
-        SET status = %s, admin_notes = %s, updated_at = NOW()
-        WHERE id = %s
-    """, (new_status, admin_notes, booking_id))
-
     try:
-        if new_status == 'confirmed' and old_status != 'confirmed':
-            cur.execute("""
-                UPDATE rooms 
-                SET is_available = CASE 
-                    WHEN available_count <= 0 THEN 0 
-                    ELSE 1 
-                END
-                WHERE id = %s
-            """, (room_id,))
-            print(f"✅ Booking {booking_id} confirmed. Updated is_available based on available_count")
-            
-        elif new_status in ['cancelled'] and old_status in ['confirmed', 'pending', 'waiting_payment']:
-
-            cur.execute("""
-                UPDATE rooms 
-                SET available_count = LEAST(room_count, available_count + 1),
-                    is_available = CASE 
-                        WHEN available_count + 1 > 0 THEN 1 
-                        ELSE 0 
-                    END
-                WHERE id = %s
-            """, (room_id,))
-            print(f"✅ Booking {booking_id} cancelled. Incremented available_count")
-            
-        elif new_status == 'completed':
-
-            cur.execute("""
-                UPDATE rooms 
-                SET available_count = LEAST(room_count, available_count + 1),
-                    is_available = CASE 
-                        WHEN available_count + 1 > 0 THEN 1 
-                        ELSE 0 
-                    END
-                WHERE id = %s
-            """, (room_id,))
-            print(f"✅ Booking {booking_id} completed. Incremented available_count")
-            
-        elif new_status == 'waiting_payment' and old_status == 'pending':
-            print(f"⚠️ Booking {booking_id} waiting payment. No room availability change.")
-            
+        inventory.ensure_nights(cur, room_id, booking['check_in'], booking['check_out'])
+        
+        # 2. Update status booking
+        cur.execute("""
+            UPDATE bookings 
+            SET status = %s, admin_notes = %s, updated_at = NOW()
+            WHERE id = %s
+        """, (new_status, admin_notes, booking_id))
+        
+        # 3. Sesuaikan stok per malam (release saat keluar dari status aktif,
+        #    reserve ulang kalau booking diaktifkan kembali)
+        if not inventory.apply_status_change(cur, room_id, booking['check_in'], booking['check_out'],
+                                             old_status, new_status):
+            mysql.connection.rollback()
+            flash('Room is fully booked for these dates. Status not changed.', 'danger')
+            cur.close()
+            return redirect(url_for('admin_bookings'))
+        
+        counters.booking_status_changed(cur, room_id, old_status, new_status)
+        
+        log.info('booking.status_changed', booking_id=booking_id, old=old_status, new=new_status)
+        
         mysql.connection.commit()
+        dashboard_cache.invalidate()
+        availability_engine.apply_status_change(room_id, booking['check_in'], booking['check_out'],
+                                                old_status, new_status)
         
     except Exception as e:
         mysql.connection.rollback()
@@ -473,13 +391,42 @@ def admin_delete_user(user_id):
     
     cur = mysql.connection.cursor()
     
-    cur.execute("DELETE FROM bookings WHERE user_id = %s", (user_id,))
-    
-    # Delete user
-    cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
+    try:
+        cur.execute("""
+            SELECT room_id, status, COUNT(*) as total FROM bookings
+            WHERE user_id = %s GROUP BY room_id, status
+        """, (user_id,))
+        for row in cur.fetchall():
+            counters.bump(cur, counters.BOOKING, row['status'], -row['total'], row['room_id'])
+        
+        # Booking yang masih memegang kamar: malamnya dikembalikan ke ledger
+        placeholders = ', '.join(['%s'] * len(inventory.HOLDING_STATUSES))
+        cur.execute(f"""
+            SELECT room_id, check_in, check_out FROM bookings
+            WHERE user_id = %s AND status IN ({placeholders})
+            FOR UPDATE
+        """, (user_id, *inventory.HOLDING_STATUSES))
+        holding = cur.fetchall()
+        for booking in holding:
+            inventory.release_nights(cur, booking['room_id'], booking['check_in'], booking['check_out'])
+        
+        cur.execute("DELETE FROM bookings WHERE user_id = %s", (user_id,))
+        
+        # Delete user
+        cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        
+        mysql.connection.commit()
+    except Exception:
+        mysql.connection.rollback()
+        log.exception('user.delete_error', user_id=user_id)
+        flash('Error deleting user', 'error')
+        return redirect(url_for('admin_users'))
+    finally:
+        cur.close()
     
-    mysql.connection.commit()
-    cur.close()
+    dashboard_cache.invalidate()
+    for booking in holding:
+        availability_engine.record_release(booking['room_id'], booking['check_in'], booking['check_out'])
     
     flash('User deleted successfully', 'success')
     return redirect(url_for('admin_users'))
@@ -540,17 +487,11 @@ def add_room():
         image_files = request.files.getlist('images')
         image_filenames = []
         
-        # Create uploads directory if not exists
-        upload_dir = 'static/uploads/rooms'
-        if not os.path.exists(upload_dir):
-            os.makedirs(upload_dir)
-        
         for image in image_files:
             if image and image.filename != '':
-                filename = secure_filename(f"{int(time.time())}_{image.filename}")
-                image_path = os.path.join(upload_dir, filename)
-                image.save(image_path)
-                image_filenames.append(f"static/uploads/rooms/{filename}")
+                image_ref, _, _ = room_store.put(image.stream)
+                if image_ref not in image_filenames:
+                    image_filenames.append(image_ref)
         
         images_str = ','.join(image_filenames) if image_filenames else None
         
@@ -558,12 +499,22 @@ def add_room():
         try:
             cur.execute("""
                 INSERT INTO rooms (name, description, price, capacity, size, view_type, 
-                                 amenities, images, is_available, room_type, available_count)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                                 amenities, images, is_available, room_type, available_count,
+                                 images_status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """, (name, description, price, capacity, size, view_type, 
-                  ', '.join(amenities), images_str, is_available, room_type, available_count))
+                  ', '.join(amenities), images_str, is_available, room_type, available_count,
+                  PENDING if image_filenames else READY))
+            room_id = cur.lastrowid
+            blobs.change_refs(cur, blobs.ROOMS, [], image_filenames)
             
+            catalog.bump(cur)
             mysql.connection.commit()
+            catalog.invalidate()
+            upload_processor.submit(ROOM, room_id, image_filenames)
+            dashboard_cache.invalidate()
+            availability_engine.invalidate()
+            page_cache.purge()
             flash('Room added successfully!', 'success')
             return redirect(url_for('manage_rooms'))
             
@@ -604,22 +555,21 @@ def edit_room(room_id):
         new_image_filenames = []
         
         # Upload new images
-        upload_dir = 'static/uploads/rooms'
-        if not os.path.exists(upload_dir):
-            os.makedirs(upload_dir)
-        
         for image in image_files:
             if image and image.filename != '':
-                filename = secure_filename(f"{int(time.time())}_{image.filename}")
-                image_path = os.path.join(upload_dir, filename)
-                image.save(image_path)
-                new_image_filenames.append(f"static/uploads/rooms/{filename}")
+                image_ref, _, _ = room_store.put(image.stream)
+                if image_ref not in existing_images and image_ref not in new_image_filenames:
+                    new_image_filenames.append(image_ref)
         
         # Combine existing and new images
         all_images = existing_images + new_image_filenames
         images_str = ','.join(all_images) if all_images else None
         
         try:
+            cur.execute("SELECT images FROM rooms WHERE id = %s FOR UPDATE", (room_id,))
+            old_room = cur.fetchone()
+            old_images = blobs.split_refs(old_room['images']) if old_room else []
+            
             cur.execute("""
                 UPDATE rooms 
                 SET name=%s, description=%s, price=%s, capacity=%s, size=%s, 
@@ -629,8 +579,20 @@ def edit_room(room_id):
             """, (name, description, price, capacity, size, view_type, 
                   ', '.join(amenities), images_str, is_available,
                   room_type, available_count, room_id))
+            if new_image_filenames:
+                cur.execute("UPDATE rooms SET images_status = %s WHERE id = %s", (PENDING, room_id))
+            blobs.change_refs(cur, blobs.ROOMS, old_images, all_images)
+            
+            # Kapasitas baru berlaku untuk semua malam ke depan di ledger
+            inventory.set_capacity(cur, room_id, available_count)
             
+            catalog.bump(cur)
             mysql.connection.commit()
+            catalog.invalidate()
+            upload_processor.submit(ROOM, room_id, new_image_filenames)
+            dashboard_cache.invalidate()
+            availability_engine.invalidate()
+            page_cache.purge()
             flash('Room updated successfully!', 'success')
             return redirect(url_for('manage_rooms'))
             
@@ -678,8 +640,13 @@ def toggle_room_status(room_id):
             WHERE id = %s
         """, (new_status, room_id))
         
+        catalog.bump(cur)
         mysql.connection.commit()
+        catalog.invalidate()
         cur.close()
+        dashboard_cache.invalidate()
+        availability_engine.invalidate()
+        page_cache.purge()
         
         status_text = "enabled" if new_status == 1 else "disabled"
         return jsonify({
@@ -689,7 +656,7 @@ def toggle_room_status(room_id):
         })
         
     except Exception as e:
-        print(f"Error toggling room status: {str(e)}")
+        log.exception('room.toggle_error', room_id=room_id)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -723,8 +690,18 @@ def delete_room(room_id):
             return redirect(url_for('manage_rooms'))
         
         # Delete the room
+        cur.execute("SELECT images FROM rooms WHERE id = %s FOR UPDATE", (room_id,))
+        old_room = cur.fetchone()
+        if old_room:
+            blobs.change_refs(cur, blobs.ROOMS, blobs.split_refs(old_room['images']), [])
         cur.execute("DELETE FROM rooms WHERE id = %s", (room_id,))
+        counters.drop_scope(cur, counters.BOOKING, room_id)
+        catalog.bump(cur)
         mysql.connection.commit()
+        catalog.invalidate()
+        dashboard_cache.invalidate()
+        availability_engine.invalidate()
+        page_cache.purge()
         
         flash('Room deleted successfully!', 'success')
         
@@ -777,44 +754,21 @@ def room_details(room_id):
     
     recent_bookings = cur.fetchall()
     
-    # Get booking statistics
-    cur.execute("""
-        SELECT 
-            COUNT(*) as total_bookings,
-            SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed_bookings,
-            SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END) as pending_bookings,
-            SUM(CASE WHEN status = 'confirmed' THEN 1 ELSE 0 END) as confirmed_bookings,
-            SUM(CASE WHEN status = 'cancelled' THEN 1 ELSE 0 END) as cancelled_bookings
-        FROM bookings
-        WHERE room_id = %s
-    """, (room_id,))
-    
-    booking_stats = cur.fetchone()
+    # Get booking statistics (dari status_counters)
+    booking_counts = counters.booking_counts(cur, room_id)
+    booking_stats = {
+        'total_bookings': sum(booking_counts.values()),
+        'completed_bookings': booking_counts.get('completed', 0),
+        'pending_bookings': booking_counts.get('pending', 0),
+        'confirmed_bookings': booking_counts.get('confirmed', 0),
+        'cancelled_bookings': booking_counts.get('cancelled', 0)
+    }
     
     cur.close()
     
-    # Process room images
-    if room['images']:
-        if isinstance(room['images'], str):
-            try:
-                # Try to parse as JSON
-                import json
-                images = json.loads(room['images'].replace("'", '"'))
-            except:
-                # Fallback to comma-separated
-                images = [img.strip() for img in room['images'].split(',') if img.strip()]
-        else:
-            images = []
-    else:
-        images = []
-    
-    # Process amenities
-    amenities = []
-    if room['amenities']:
-        if isinstance(room['amenities'], str):
-            amenities = [a.strip() for a in room['amenities'].split(',') if a.strip()]
-        else:
-            amenities = room['amenities']
+    # Process room images & amenities
+    images = list(parse_images(room['images']))
+    amenities = list(parse_amenities(room['amenities']))
     
     return render_template('admin/rooms.html',
                           room=room,
@@ -828,6 +782,8 @@ def room_details(room_id):
 def admin_payments():
     status_filter = request.args.get('status', 'all')
     method_filter = request.args.get('method', 'all')
+    cursor = request.args.get('cursor')
+    per_page = parse_page_size(request.args.get('per_page'))
     
     cur = mysql.connection.cursor()
     
@@ -860,25 +816,22 @@ def admin_payments():
         query += " AND p.payment_method = %s"
         params.append(method_filter)
     
-    query += " ORDER BY p.created_at DESC"
+    keyset_sql, keyset_params = keyset_condition('p', cursor)
+    query += keyset_sql
+    params.extend(keyset_params)
+    
+    query += " ORDER BY p.created_at DESC, p.id DESC LIMIT %s"
+    params.append(per_page + 1)
     
     cur.execute(query, params)
-    payments = cur.fetchall()
+    payments, next_cursor = keyset_page(cur.fetchall(), per_page)
     
-    cur.execute("SELECT COUNT(*) as total FROM payments")
-    total_payments = cur.fetchone()['total']
-
-    cur.execute("SELECT COUNT(*) as total FROM payments WHERE status = 'pending'")
-    pending_payments = cur.fetchone()['total']
-
-    cur.execute("SELECT COUNT(*) as total FROM payments WHERE status = 'completed'")
-    completed_payments = cur.fetchone()['total']
-
-    cur.execute("SELECT COUNT(*) as total FROM payments WHERE status = 'processing'")
-    processing_payments = cur.fetchone()['total']
-
-    cur.execute("SELECT COUNT(*) as total FROM payments WHERE status = 'failed'")
-    failed_payments = cur.fetchone()['total']
+    payment_counts = counters.payment_counts(cur)
+    total_payments = sum(payment_counts.values())
+    pending_payments = payment_counts.get('pending', 0)
+    completed_payments = payment_counts.get('completed', 0)
+    processing_payments = payment_counts.get('processing', 0)
+    failed_payments = payment_counts.get('failed', 0)
     
     cur.close()
     
@@ -888,7 +841,23 @@ def admin_payments():
                          pending_payments=pending_payments,
                          completed_payments=completed_payments,
                          processing_payments=processing_payments,
-                         failed_payments=failed_payments)
+                         failed_payments=failed_payments,
+                         status_filter=status_filter,
+                         method_filter=method_filter,
+                         next_cursor=next_cursor,
+                         cursor=cursor,
+                         per_page=per_page)
+
+@app.route('/uploads/payments/blobs/<path:ref>')
+@app.route('/uploads/payments/qris_simulated/blobs/<path:ref>')
+@admin_required
+def payment_proof_blob(ref):
+    """Serve a content-addressed payment proof (admin only)"""
+    path = payment_store.path_for_ref('blobs/' + ref)
+    if not path or not os.path.isfile(path):
+        abort(404)
+    # Nama file = hash isi, jadi aman di-cache selamanya oleh browser admin
+    return send_fingerprinted(path, blobs.parse_ref(ref)[0], immutable=True, private=True)
 
 @app.route('/admin/payment/<int:payment_id>/details')
 @admin_required
@@ -922,7 +891,10 @@ def payment_details(payment_id):
             image_html = '<p class="text-sm text-gray-600 mb-2">QRIS Payment (Simulated)</p>'
         else:
 
-            image_url = url_for('uploaded_file', filename=payment['proof_image'], _external=True)
+            if blobs.parse_ref(payment['proof_image']):
+                image_url = url_for('payment_proof_blob', ref=payment['proof_image'].split('blobs/', 1)[1], _external=True)
+            else:
+                image_url = url_for('uploaded_file', filename=payment['proof_image'], _external=True)
             
             image_html = f'''
             <div class="text-center">
@@ -1051,12 +1023,11 @@ def verify_payment(payment_id):
             p.booking_id, 
             p.status as payment_status,
             b.room_id, 
-            b.status as booking_status,
-            r.available_count,
-            r.room_count
+            b.check_in,
+            b.check_out,
+            b.status as booking_status
         FROM payments p
         JOIN bookings b ON p.booking_id = b.id
-        JOIN rooms r ON b.room_id = r.id
         WHERE p.id = %s
     """, (payment_id,))
     
@@ -1072,6 +1043,8 @@ def verify_payment(payment_id):
     if current_payment_status in ['completed', 'failed']:
         return jsonify({'success': False, 'error': f'Payment already {current_payment_status}'})
     
+    inventory.ensure_nights(cur, room_id, result['check_in'], result['check_out'])
+    
     cur.execute("START TRANSACTION")
     
     try:
@@ -1079,32 +1052,22 @@ def verify_payment(payment_id):
             new_payment_status = 'completed'
             new_booking_status = 'confirmed'
             
-            cur.execute("""
-                UPDATE rooms 
-                SET is_available = CASE 
-                    WHEN available_count <= 0 THEN 0 
-                    ELSE 1 
-                END
-                WHERE id = %s
-            """, (room_id,))
-            
         elif action == 'reject':
             new_payment_status = 'failed'
             new_booking_status = 'cancelled'
             
-            cur.execute("""
-                UPDATE rooms 
-                SET available_count = LEAST(room_count, available_count + 1),
-                    is_available = CASE 
-                        WHEN available_count + 1 > 0 THEN 1 
-                        ELSE 0 
-                    END
-                WHERE id = %s
-            """, (room_id,))
-            
         else:
+            cur.execute("ROLLBACK")
+            cur.close()
             return jsonify({'success': False, 'error': 'Invalid action'})
         
+        # Release stok per malam kalau booking ditolak; verify tidak mengubah ledger
+        if not inventory.apply_status_change(cur, room_id, result['check_in'], result['check_out'],
+                                             result['booking_status'], new_booking_status):
+            cur.execute("ROLLBACK")
+            cur.close()
+            return jsonify({'success': False, 'error': 'Room is fully booked for these dates'})
+        
         cur.execute("""
             UPDATE payments 
             SET status = %s, 
@@ -1122,8 +1085,14 @@ def verify_payment(payment_id):
             WHERE id = %s
         """, (new_booking_status, new_payment_status, booking_id))
         
+        counters.payment_status_changed(cur, current_payment_status, new_payment_status)
+        counters.booking_status_changed(cur, room_id, result['booking_status'], new_booking_status)
+        
         cur.execute("COMMIT")
         cur.close()
+        dashboard_cache.invalidate()
+        availability_engine.apply_status_change(room_id, result['check_in'], result['check_out'],
+                                                result['booking_status'], new_booking_status)
         
         return jsonify({
             'success': True, 
@@ -1133,5 +1102,5 @@ def verify_payment(payment_id):
     except Exception as e:
         cur.execute("ROLLBACK")
         cur.close()
-        print(f"Payment verification error: {str(e)}")
+        log.exception('payment.verify_error', payment_id=payment_id)
         return jsonify({'success': False, 'error': str(e)})
\ No newline at end of file
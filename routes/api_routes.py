@@ -3,9 +3,19 @@ from config import app, mysql, csrf
 from models import login_required, admin_required
 from werkzeug.security import check_password_hash
 import os
-import json
 from datetime import datetime, timedelta
 import uuid
+from services import inventory, counters, blobs, bookings, holds
+from services.availability import engine as availability_engine, MAX_CALENDAR_DAYS
+from services.booking_codes import allocator as code_allocator
+from services.dashboard import dashboard_cache
+from services.catalog import catalog
+from services.uploads import processor as upload_processor
+from services.page_cache import page_cache
+from services.idempotency import store as idempotency_store
+from services import logs
+from services.parsing import parse_images, parse_amenities, normalize
+from helpers import calculate_stay_price, parse_page_size, keyset_condition, keyset_page
 
 # =============== HELPER FUNCTIONS ===============
 def format_datetime(value):
@@ -13,60 +23,49 @@ def format_datetime(value):
         return value.isoformat()
     return value
 
+def db_cursor():
+    return mysql.connection.cursor()
+
+def db_pool_stats():
+    # None kalau config.py masih memakai flask_mysqldb.MySQL biasa
+    pool_stats = getattr(mysql, 'pool_stats', None)
+    return pool_stats() if pool_stats else None
+
 # =============== PUBLIC API ROUTES ===============
+def room_details_data(room):
+    """Public JSON shape of one room (memoized per catalog version)"""
+    images = list(parse_images(room['images']))
+    amenities = list(parse_amenities(room['amenities']))
+    
+    return {
+        'id': room['id'],
+        'name': room['name'],
+        'description': room['description'],
+        'size': room['size'],
+        'capacity': room['capacity'],
+        'price': float(room['price']),
+        'available_count': room['available_count'],
+        'room_count': room['room_count'],
+        'view_type': room['view_type'],
+        'room_type': room['room_type'],
+        'is_available': bool(room['is_available']),
+        'amenities': amenities,
+        'images': images
+    }
+
 @app.route('/api/room/<int:room_id>/details')
 def room_details_api(room_id):
     try:
-        cur = mysql.connection.cursor()
-        cur.execute("""
-            SELECT id, name, description, size, capacity, price, 
-                   available_count, room_count, view_type, room_type,
-                   amenities, images, is_available
-            FROM rooms WHERE id = %s
-        """, (room_id,))
-        room = cur.fetchone()
-        cur.close()
+        cursor_factory = lambda: mysql.connection.cursor()
+        room = catalog.room(room_id, cursor_factory)
         
         if not room:
             return jsonify({'success': False, 'error': 'Room not found', 'code': 404}), 404
-
-        images = []
-        if room['images']:
-            try:
-                if isinstance(room['images'], str):
-                    try:
-                        images = json.loads(room['images'])
-                    except:
-                        images = [img.strip() for img in room['images'].split(',') if img.strip()]
-            except:
-                images = []
-        
-        amenities = []
-        if room['amenities']:
-            if isinstance(room['amenities'], str):
-                try:
-                    amenities = json.loads(room['amenities'])
-                except:
-                    amenities = [a.strip() for a in room['amenities'].split(',') if a.strip()]
         
-        return jsonify({
-            'success': True,
-            'data': {
-                'id': room['id'],
-                'name': room['name'],
-                'description': room['description'],
-                'size': room['size'],
-                'capacity': room['capacity'],
-                'price': float(room['price']),
-                'available_count': room['available_count'],
-                'room_count': room['room_count'],
-                'view_type': room['view_type'],
-                'room_type': room['room_type'],
-                'is_available': bool(room['is_available']),
-                'amenities': amenities,
-                'images': images
-            }
-        })
+        data = catalog.view(f"api_room:{room_id}", lambda rooms, venues: room_details_data(room),
+                            cursor_factory)
+        
+        return jsonify({'success': True, 'data': data})
         
     except Exception as e:
         return jsonify({'success': False, 'error': f'Server error: {str(e)}', 'code': 500}), 500
@@ -115,21 +114,8 @@ def rooms_list_api():
         cur.close()
         
         processed_rooms = []
-        for room in rooms:
-            room_data = dict(room)
-            
-            images = []
-            if room_data['images']:
-                try:
-                    if isinstance(room_data['images'], str):
-                        try:
-                            images = json.loads(room_data['images'])
-                        except:
-                            images = [img.strip() for img in room_data['images'].split(',') if img.strip()]
-                except:
-                    images = []
-            
-            room_data['images'] = images
+        for room_data in normalize(rooms, amenities_field=None):
+            room_data['images'] = list(room_data.pop('images_list'))
             room_data['price'] = float(room_data['price'])
             room_data['is_available'] = bool(room_data['is_available'])
             processed_rooms.append(room_data)
@@ -153,55 +139,145 @@ def rooms_list_api():
 @app.route('/api/check-availability')
 def check_availability_api():
     try:
-        room_id = request.args.get('room_id')
+        room_id = request.args.get('room_id', type=int)
         check_in = request.args.get('check_in')
         check_out = request.args.get('check_out')
         
         if not all([room_id, check_in, check_out]):
             return jsonify({'success': False, 'error': 'Missing required parameters', 'code': 400}), 400
         
-        cur = mysql.connection.cursor()
-        cur.execute("""
-            SELECT id, name, available_count, room_count, price, capacity
-            FROM rooms WHERE id = %s AND is_available = 1
-        """, (room_id,))
-        room = cur.fetchone()
+        # Snapshot in-memory; MySQL hanya disentuh saat snapshot kedaluwarsa
+        availability_engine.ensure_loaded(lambda: mysql.connection.cursor())
         
-        if not room:
+        room = availability_engine.room(room_id)
+        if not room or not room.is_available:
             return jsonify({'success': False, 'error': 'Room not available', 'code': 404}), 404
         
-        cur.execute("""
-            SELECT COUNT(*) as overlapping_bookings
-            FROM bookings 
-            WHERE room_id = %s 
-            AND status IN ('confirmed', 'pending', 'waiting_payment')
-            AND (
-                (check_in <= %s AND check_out >= %s) OR
-                (check_in <= %s AND check_out >= %s) OR
-                (check_in >= %s AND check_out <= %s)
-            )
-        """, (room_id, check_out, check_in, check_in, check_out, check_in, check_out))
+        nights = availability_engine.free_by_night(room_id, check_in, check_out)
+        available_count = min((night['available'] for night in nights), default=0)
         
-        overlap_result = cur.fetchone()
-        overlapping_bookings = overlap_result['overlapping_bookings'] if overlap_result else 0
-        cur.close()
+        return jsonify({
+            'success': True,
+            'data': {
+                'room_id': room.room_id,
+                'room_name': room.name,
+                'is_available': available_count > 0,
+                'available_count': available_count,
+                'nights': nights,
+                'max_capacity': room.max_guests,
+                'price_per_night': room.price
+            }
+        })
+        
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid date format, use YYYY-MM-DD', 'code': 400}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Server error: {str(e)}', 'code': 500}), 500
+
+@app.route('/api/rooms/search')
+def search_availability_api():
+    """Availability and total price for every matching room type in one call"""
+    try:
+        check_in = request.args.get('check_in')
+        check_out = request.args.get('check_out')
+        guests = request.args.get('guests', 1, type=int)
+        room_type = request.args.get('type')
+        min_price = request.args.get('min_price', type=float)
+        max_price = request.args.get('max_price', type=float)
+        
+        if not all([check_in, check_out]):
+            return jsonify({'success': False, 'error': 'Missing required parameters', 'code': 400}), 400
+        
+        nights = (datetime.strptime(check_out, '%Y-%m-%d') - datetime.strptime(check_in, '%Y-%m-%d')).days
+        if nights <= 0:
+            return jsonify({'success': False, 'error': 'Check-out date must be after check-in date', 'code': 400}), 400
+        
+        availability_engine.ensure_loaded(lambda: mysql.connection.cursor())
         
-        available_count = room['available_count']
-        is_available = available_count > overlapping_bookings
+        results = []
+        for room, available_count in availability_engine.search(check_in, check_out, guests=guests,
+                                                                 room_type=room_type,
+                                                                 min_price=min_price,
+                                                                 max_price=max_price):
+            room_data = room.to_dict()
+            room_data['available_count'] = available_count
+            room_data['is_available'] = available_count > 0
+            room_data['nights'] = nights
+            room_data.update(calculate_stay_price(room.price, nights))
+            results.append(room_data)
         
         return jsonify({
             'success': True,
             'data': {
-                'room_id': room['id'],
-                'room_name': room['name'],
-                'is_available': is_available,
-                'available_count': available_count,
-                'overlapping_bookings': overlapping_bookings,
-                'max_capacity': room['capacity'],
-                'price_per_night': float(room['price'])
+                'check_in': check_in,
+                'check_out': check_out,
+                'guests': guests,
+                'nights': nights,
+                'rooms': results
             }
         })
         
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid date format, use YYYY-MM-DD', 'code': 400}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Server error: {str(e)}', 'code': 500}), 500
+
+@app.route('/api/rooms/<int:room_id>/calendar')
+def room_calendar_api(room_id):
+    """Per-night remaining inventory and price for date pickers"""
+    try:
+        date_from = request.args.get('from') or datetime.now().strftime('%Y-%m-%d')
+        date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
+        
+        date_to = request.args.get('to')
+        if date_to:
+            date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
+        else:
+            date_to = date_from + timedelta(days=90)
+        
+        if date_to <= date_from:
+            return jsonify({'success': False, 'error': "'to' must be after 'from'", 'code': 400}), 400
+        
+        if (date_to - date_from).days > MAX_CALENDAR_DAYS:
+            return jsonify({'success': False, 'error': f'Range is limited to {MAX_CALENDAR_DAYS} days', 'code': 400}), 400
+        
+        availability_engine.ensure_loaded(lambda: mysql.connection.cursor())
+        
+        room = availability_engine.room(room_id)
+        if not room:
+            return jsonify({'success': False, 'error': 'Room not found', 'code': 404}), 404
+        
+        # Di luar horizon engine tidak ada data: tolak, jangan dipotong diam-diam
+        horizon_start, horizon_end = availability_engine.horizon()
+        if date_from < horizon_start or date_to > horizon_end:
+            return jsonify({
+                'success': False,
+                'error': f'Range must be between {horizon_start.isoformat()} and {horizon_end.isoformat()}',
+                'code': 400,
+                'horizon_start': horizon_start.isoformat(),
+                'horizon_end': horizon_end.isoformat()
+            }), 400
+        
+        days = availability_engine.calendar(room_id, date_from, date_to)
+        
+        response = jsonify({
+            'success': True,
+            'data': {
+                'room_id': room.room_id,
+                'room_name': room.name,
+                'is_available': room.is_available,
+                'units_on_sale': room.capacity,
+                'from': date_from.isoformat(),
+                'to': date_to.isoformat(),
+                'horizon_end': horizon_end.isoformat(),
+                'days': days
+            }
+        })
+        response.headers['Cache-Control'] = 'public, max-age=30'
+        return response
+        
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid date format, use YYYY-MM-DD', 'code': 400}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': f'Server error: {str(e)}', 'code': 500}), 500
 
@@ -473,6 +549,7 @@ def user_booking_detail_api(booking_id):
 @app.route('/api/user/create-booking', methods=['POST'])
 @login_required
 @csrf.exempt
+@idempotency_store.guard('create_booking', db_cursor)
 def create_booking_api():
     try:
         data = request.get_json()
@@ -481,89 +558,92 @@ def create_booking_api():
             if field not in data:
                 return jsonify({'success': False, 'error': f'Missing required field: {field}', 'code': 400}), 400
         
-        room_id = data['room_id']
-        check_in = data['check_in']
-        check_out = data['check_out']
-        guests = int(data['guests'])
-        special_requests = data.get('special_requests', '')
-        
         cur = mysql.connection.cursor()
-        cur.execute("""
-            SELECT * FROM rooms 
-            WHERE id = %s AND is_available = 1 AND available_count > 0
-        """, (room_id,))
-        room = cur.fetchone()
-        
-        if not room:
-            return jsonify({'success': False, 'error': 'Room not available', 'code': 400}), 400
-        
-        if guests > room['capacity']:
-            return jsonify({'success': False, 'error': f'Maximum capacity is {room["capacity"]}', 'code': 400}), 400
-        
-        check_in_date = datetime.strptime(check_in, '%Y-%m-%d')
-        check_out_date = datetime.strptime(check_out, '%Y-%m-%d')
-        nights = (check_out_date - check_in_date).days
-        
-        room_price = float(room['price'])
-        subtotal = room_price * nights
-        tax_amount = subtotal * 0.10
-        service_charge = subtotal * 0.11
-        total_price = subtotal + tax_amount + service_charge
+        try:
+            booking_request = bookings.prepare(
+                bookings.load_room(cur, data['room_id']),
+                session['user_id'],
+                data['check_in'],
+                data['check_out'],
+                data['guests'],
+                data.get('special_requests', ''),
+                hold_token=data.get('hold_token')
+            )
+            booking = bookings.submit(cur, booking_request)
+        finally:
+            cur.close()
         
-        import random, string
-        letters = ''.join(random.choices(string.ascii_uppercase, k=3))
-        numbers = ''.join(random.choices(string.digits, k=6))
-        booking_code = f"FH-{letters}-{numbers}"
+        return jsonify({
+            'success': True,
+            'data': {
+                'booking_id': booking['booking_id'],
+                'booking_code': booking['booking_code'],
+                'total_price': booking['total_price'],
+                'status': booking['status']
+            }
+        })
         
-        cur.execute("START TRANSACTION")
-        try:
-            cur.execute("""
-                INSERT INTO bookings 
-                (user_id, room_id, check_in, check_out, guests, 
-                total_price, subtotal, tax_amount, service_charge, 
-                special_requests, status, booking_code)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'waiting_payment', %s)
-            """, (session['user_id'], room_id, check_in, check_out, guests,
-                  total_price, subtotal, tax_amount, service_charge, 
-                  special_requests, booking_code))
-            
-            booking_id = cur.lastrowid
-            
-            new_available = room['available_count'] - 1
-            cur.execute("""
-                UPDATE rooms 
-                SET available_count = %s,
-                    is_available = CASE WHEN %s > 0 THEN 1 ELSE 0 END
-                WHERE id = %s
-            """, (new_available, new_available, room_id))
-            
-            expiration_date = datetime.now() + timedelta(hours=24)
-            cur.execute("""
-                INSERT INTO payments 
-                (booking_id, amount, payment_method, status, expiration_date)
-                VALUES (%s, %s, 'pending', 'pending', %s)
-            """, (booking_id, total_price, expiration_date))
-            
-            cur.execute("COMMIT")
-            
-            return jsonify({
-                'success': True,
-                'data': {
-                    'booking_id': booking_id,
-                    'booking_code': booking_code,
-                    'total_price': total_price,
-                    'status': 'waiting_payment'
-                }
-            })
-            
-        except Exception as e:
-            cur.execute("ROLLBACK")
-            raise e
-            
+    except bookings.BookingError as e:
+        return jsonify({'success': False, 'error': str(e), 'code': e.status}), e.status
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e), 'code': 500}), 500
+
+@app.route('/api/user/holds', methods=['POST'])
+@login_required
+@csrf.exempt
+def place_hold_api():
+    """Hold one unit of a room for the booking form (see services/holds.py)"""
+    data = request.get_json(silent=True) or {}
+    for field in ('room_id', 'check_in', 'check_out'):
+        if not data.get(field):
+            return jsonify({'success': False, 'error': f'Missing required field: {field}', 'code': 400}), 400
+    
+    cur = mysql.connection.cursor()
+    try:
+        # Validasi tanggal dan kamar sama dengan booking
+        stay = bookings.prepare(
+            bookings.load_room(cur, data['room_id']),
+            session['user_id'],
+            data['check_in'],
+            data['check_out'],
+            data.get('guests', 1)
+        )
+        hold = holds.place(cur, session['user_id'], stay['room_id'], stay['check_in'], stay['check_out'])
+    except bookings.BookingError as e:
+        return jsonify({'success': False, 'error': str(e), 'code': e.status}), e.status
     except Exception as e:
         return jsonify({'success': False, 'error': str(e), 'code': 500}), 500
     finally:
         cur.close()
+    
+    if not hold:
+        return jsonify({'success': False, 'error': 'Room is fully booked for the selected dates.', 'code': 409}), 409
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'hold_token': hold['hold_token'],
+            'check_in': hold['check_in'].isoformat(),
+            'check_out': hold['check_out'].isoformat(),
+            'expires_at': hold['expires_at'].isoformat(),
+            'ttl_seconds': holds.HOLD_TTL_SECONDS
+        }
+    })
+
+@app.route('/api/user/holds/<hold_token>', methods=['DELETE'])
+@login_required
+@csrf.exempt
+def release_hold_api(hold_token):
+    cur = mysql.connection.cursor()
+    try:
+        released = holds.release(cur, session['user_id'], hold_token)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e), 'code': 500}), 500
+    finally:
+        cur.close()
+    
+    return jsonify({'success': True, 'data': {'released': released}})
+
 @app.route('/api/user/booking/<int:booking_id>/cancel', methods=['POST'])
 @login_required
 @csrf.exempt
@@ -581,9 +661,8 @@ def cancel_user_booking(booking_id):
         
         # 1. Cek booking exists dan milik user
         cur.execute("""
-            SELECT b.*, r.available_count, r.room_count
+            SELECT b.*
             FROM bookings b
-            JOIN rooms r ON b.room_id = r.id
             WHERE b.id = %s AND b.user_id = %s
         """, (booking_id, user_id))
         
@@ -615,18 +694,10 @@ def cancel_user_booking(booking_id):
                 WHERE id = %s
             """, (cancellation_reason, booking_id))
             
-            # Update room availability
-            room_id = booking['room_id']
-            new_available = booking['available_count'] + 1
-            cur.execute("""
-                UPDATE rooms 
-                SET available_count = LEAST(room_count, %s),
-                    is_available = CASE 
-                        WHEN %s > 0 THEN 1 
-                        ELSE 0 
-                    END
-                WHERE id = %s
-            """, (new_available, new_available, room_id))
+            # Kembalikan stok malam yang dipegang booking ini
+            inventory.apply_status_change(cur, booking['room_id'], booking['check_in'],
+                                          booking['check_out'], current_status, 'cancelled')
+            counters.booking_status_changed(cur, booking['room_id'], current_status, 'cancelled')
             
             # Update payment_status di tabel bookings
             cur.execute("""
@@ -636,6 +707,9 @@ def cancel_user_booking(booking_id):
             """, (booking_id,))
             
             cur.execute("COMMIT")
+            dashboard_cache.invalidate()
+            availability_engine.apply_status_change(booking['room_id'], booking['check_in'],
+                                                    booking['check_out'], current_status, 'cancelled')
             
             # Ambil data terbaru
             cur.execute("""
@@ -676,8 +750,8 @@ def cancel_user_booking(booking_id):
 def admin_bookings_api():
     try:
         status = request.args.get('status')
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
+        cursor = request.args.get('cursor')
+        per_page = parse_page_size(request.args.get('per_page'), default=20)
         
         cur = mysql.connection.cursor()
         query = """
@@ -693,15 +767,23 @@ def admin_bookings_api():
             query += " AND b.status = %s"
             params.append(status)
         
-        count_query = f"SELECT COUNT(*) as total FROM ({query}) as filtered"
-        cur.execute(count_query, tuple(params))
-        total_count = cur.fetchone()['total']
+        keyset_sql, keyset_params = keyset_condition('b', cursor)
+        query += keyset_sql
+        params.extend(keyset_params)
         
-        query += " ORDER BY b.created_at DESC LIMIT %s OFFSET %s"
-        offset = (page - 1) * per_page
-        params.extend([per_page, offset])
+        query += " ORDER BY b.created_at DESC, b.id DESC LIMIT %s"
+        params.append(per_page + 1)
         cur.execute(query, tuple(params))
-        bookings = cur.fetchall()
+        bookings, next_cursor = keyset_page(cur.fetchall(), per_page)
+        
+        # Total perkiraan (opsional) dari status_counters
+        total_estimate = None
+        if request.args.get('with_total') in ('1', 'true'):
+            booking_counts = counters.booking_counts(cur)
+            if status and status != 'all':
+                total_estimate = booking_counts.get(status, 0)
+            else:
+                total_estimate = sum(booking_counts.values())
         cur.close()
         
         processed_bookings = []
@@ -722,10 +804,11 @@ def admin_bookings_api():
             'data': {
                 'bookings': processed_bookings,
                 'pagination': {
-                    'page': page,
                     'per_page': per_page,
-                    'total': total_count,
-                    'pages': (total_count + per_page - 1) // per_page
+                    'cursor': cursor,
+                    'next_cursor': next_cursor,
+                    'has_more': next_cursor is not None,
+                    'total_estimate': total_estimate
                 }
             }
         })
@@ -783,19 +866,35 @@ def admin_booking_detail_api(booking_id):
                 return jsonify({'success': False, 'error': f'Invalid status', 'code': 400}), 400
             
             cur = mysql.connection.cursor()
-            cur.execute("SELECT room_id, status as old_status FROM bookings WHERE id = %s", (booking_id,))
+            cur.execute("""
+                SELECT room_id, check_in, check_out, status as old_status
+                FROM bookings WHERE id = %s
+            """, (booking_id,))
             booking = cur.fetchone()
             
             if not booking:
                 return jsonify({'success': False, 'error': 'Booking not found', 'code': 404}), 404
             
+            inventory.ensure_nights(cur, booking['room_id'], booking['check_in'], booking['check_out'])
+            
             cur.execute("""
                 UPDATE bookings 
                 SET status = %s, admin_notes = %s, updated_at = NOW()
                 WHERE id = %s
             """, (new_status, admin_notes, booking_id))
             
+            if not inventory.apply_status_change(cur, booking['room_id'], booking['check_in'],
+                                                 booking['check_out'], booking['old_status'], new_status):
+                mysql.connection.rollback()
+                cur.close()
+                return jsonify({'success': False, 'error': 'Room is fully booked for these dates', 'code': 409}), 409
+            
+            counters.booking_status_changed(cur, booking['room_id'], booking['old_status'], new_status)
+            
             mysql.connection.commit()
+            dashboard_cache.invalidate()
+            availability_engine.apply_status_change(booking['room_id'], booking['check_in'],
+                                                    booking['check_out'], booking['old_status'], new_status)
             cur.close()
             
             return jsonify({
@@ -834,6 +933,86 @@ def health_check():
             'database': 'disconnected'
         }), 500
 
+@app.route('/api/admin/db-pool')
+@admin_required
+def db_pool_api():
+    """Connection pool statistics"""
+    stats = db_pool_stats()
+    return jsonify({
+        'success': True,
+        'data': {
+            'pooled': stats is not None,
+            'stats': stats or {}
+        }
+    })
+
+@app.route('/api/admin/runtime')
+@admin_required
+def runtime_stats_api():
+    """Per-worker statistics of the background services and caches"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'pool': db_pool_stats(),
+            'uploads': upload_processor.snapshot(),
+            'page_cache': page_cache.snapshot(),
+            'logging': logs.snapshot(),
+            'booking_writer': bookings.writer.snapshot(),
+            'holds': holds.reaper.snapshot(),
+            'booking_codes': code_allocator.snapshot(),
+            'idempotency': idempotency_store.snapshot()
+        }
+    })
+
+@app.route('/api/admin/counters/rebuild', methods=['POST'])
+@admin_required
+def rebuild_counters_api():
+    """Reconcile status_counters from the bookings and payments tables"""
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute("START TRANSACTION")
+        rows = counters.rebuild_counters(cur)
+        cur.execute("COMMIT")
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'rows': rows,
+                'bookings': counters.booking_counts(cur),
+                'payments': counters.payment_counts(cur)
+            }
+        })
+    except Exception as e:
+        cur.execute("ROLLBACK")
+        return jsonify({'success': False, 'error': str(e), 'code': 500}), 500
+    finally:
+        cur.close()
+
+@app.route('/api/admin/blobs/gc', methods=['POST'])
+@admin_required
+def blob_gc_api():
+    """Recount blob references, then delete blobs nobody uses"""
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute("START TRANSACTION")
+        referenced = blobs.rebuild_refs(cur)
+        # collect_garbage() meng-commit hitungan ulang sebelum menghapus file
+        removed = blobs.collect_garbage(cur)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'referenced': referenced,
+                'removed': removed['blobs'],
+                'bytes_freed': removed['bytes']
+            }
+        })
+    except Exception as e:
+        cur.execute("ROLLBACK")
+        return jsonify({'success': False, 'error': str(e), 'code': 500}), 500
+    finally:
+        cur.close()
+
 # =============== DEBUG ROUTES ===============
 @app.route('/api/debug-csrf', methods=['GET', 'POST'])
 def debug_csrf():
@@ -4,254 +4,39 @@ from config import app, mysql
 from models import login_required, allowed_file
 import os
 from datetime import datetime, timedelta
-import json
 import time
 import uuid
 from werkzeug.utils import secure_filename
 from models import allowed_file
+from services import counters
+from services.catalog import catalog
+from services.uploads import processor as upload_processor, PAYMENT
+from services import blobs
+from services.blobs import payment_store
+from services import chunked_uploads, bookings
+from services.idempotency import store as idempotency_store
+from services.parsing import parse_images, parse_amenities, main_image
+from services.logs import get_logger
 
-# =============== BOOKING ROUTES ===============
-@app.route('/book', methods=['GET', 'POST'])
-@login_required
-def book():
-    if request.method == 'POST':
-        room_id = request.form.get('room_id')
-        check_in = request.form.get('check_in')
-        check_out = request.form.get('check_out')
-        guests = int(request.form.get('guests', 2))
-        special_requests = request.form.get('special_requests', '')
-        
-        cur = mysql.connection.cursor()
-        
-        try:
-            print(f"\n=== DEBUG: START BOOKING PROCESS ===")
-            print(f"Room ID: {room_id}, Dates: {check_in} to {check_out}")
-            
-            # 1. CEK KAMAR TERSEDIA DENGAN LOCK ROW
-            cur.execute("""
-                SELECT * FROM rooms 
-                WHERE id = %s AND is_available = 1 AND available_count > 0
-                FOR UPDATE
-            """, (room_id,))
-            
-            room = cur.fetchone()
-            
-            if not room:
-                print(f"DEBUG: Room {room_id} not available")
-                flash('Room not available or fully booked.', 'danger')
-                cur.close()
-                return redirect(url_for('rooms'))
-            
-            room = dict(room)
-            current_available = room['available_count']
-            
-            print(f"DEBUG: Room {room['name']}")
-            print(f"  - Current available_count: {current_available}")
-            print(f"  - Room count: {room['room_count']}")
-            
-            # 2. VALIDASI KAPASITAS
-            if guests > room['capacity']:
-                flash(f'Maximum capacity for this room is {room["capacity"]} guests.', 'danger')
-                cur.close()
-                return redirect(url_for('book', room_id=room_id))
-            
-            # 3. VALIDASI TANGGAL
-            try:
-                check_in_date = datetime.strptime(check_in, '%Y-%m-%d')
-                check_out_date = datetime.strptime(check_out, '%Y-%m-%d')
-                
-                if check_out_date <= check_in_date:
-                    flash('Check-out date must be after check-in date.', 'danger')
-                    cur.close()
-                    return redirect(url_for('book', room_id=room_id))
-                
-                nights = (check_out_date - check_in_date).days
-                if nights <= 0:
-                    nights = 1
-            except ValueError:
-                flash('Invalid date format.', 'danger')
-                cur.close()
-                return redirect(url_for('book', room_id=room_id))
-            
-            if current_available <= 0:
-                flash('This room is fully booked.', 'danger')
-                cur.close()
-                return redirect(url_for('rooms'))
-            
-            # 5. HITUNG HARGA DENGAN PAJAK
-            room_price = float(room['price'])
-            
-            # Hitung sub-total (harga kamar × malam)
-            subtotal = room_price * nights
-            
-            # **HITUNG PAJAK DAN SERVICE CHARGE**
-            # Asumsi: Tax 10% dan Service Charge 11% (total 21%)
-            tax_rate = 0.10  # 10%
-            service_rate = 0.11  # 11%
-            
-            tax_amount = subtotal * tax_rate
-            service_charge = subtotal * service_rate
-            
-            # **TOTAL HARGA SETELAH PAJAK**
-            total_price = subtotal + tax_amount + service_charge
-            
-            print(f"DEBUG: Price Calculation")
-            print(f"  - Room price per night: Rp{room_price:,.0f}")
-            print(f"  - Nights: {nights}")
-            print(f"  - Subtotal: Rp{subtotal:,.0f}")
-            print(f"  - Tax (10%): Rp{tax_amount:,.0f}")
-            print(f"  - Service Charge (11%): Rp{service_charge:,.0f}")
-            print(f"  - TOTAL: Rp{total_price:,.0f}")
-            
-            # 6. GENERATE KODE BOOKING
-            import random, string
-            def generate_booking_code():
-                letters = ''.join(random.choices(string.ascii_uppercase, k=3))
-                numbers = ''.join(random.choices(string.digits, k=6))
-                return f"FH-{letters}-{numbers}"
-            
-            booking_code = generate_booking_code()
-            
-            print(f"DEBUG: Creating booking with code {booking_code}")
-            
-            # 7. SIMPAN BOOKING DENGAN HARGA YANG SUDAH PAJAK
-            cur.execute("""
-                INSERT INTO bookings 
-                (user_id, room_id, check_in, check_out, guests, 
-                total_price, subtotal, tax_amount, service_charge,  -- PERHATIKAN URUTAN!
-                special_requests, status, booking_code,
-                guest_name, guest_email, guest_phone, guest_country)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'waiting_payment', %s, 
-                        %s, %s, %s, %s)
-            """, (
-                session['user_id'], room_id, check_in, check_out, guests,
-                total_price, subtotal, tax_amount, service_charge, 
-                special_requests, booking_code,
-                request.form.get('guest_name', ''),
-                request.form.get('guest_email', ''),
-                request.form.get('guest_phone', ''),
-                request.form.get('guest_country', 'Indonesia')
-            ))
-            
-            booking_id = cur.lastrowid
-            
-            # 8. BUAT RECORD PAYMENT
-            expiration_date = datetime.now() + timedelta(hours=24)
-            cur.execute("""
-                INSERT INTO payments 
-                (booking_id, amount, payment_method, status, expiration_date)
-                VALUES (%s, %s, 'pending', 'pending', %s)
-            """, (booking_id, total_price, expiration_date))
-            
-            new_available_count = current_available - 1
-            
-            print(f"DEBUG: Updating room availability")
-            print(f"  - From: {current_available}")
-            print(f"  - To: {new_available_count}")
-            
-            # 9. UPDATE ROOM AVAILABILITY
-            cur.execute("""
-                UPDATE rooms 
-                SET available_count = %s,
-                    is_available = CASE WHEN %s > 0 THEN 1 ELSE 0 END
-                WHERE id = %s
-            """, (new_available_count, new_available_count, room_id))
-            
-            mysql.connection.commit()
-            cur.close()
-            
-            print(f"=== DEBUG: BOOKING SUCCESS ===")
-            print(f"Booking ID: {booking_id}")
-            print(f"Booking Code: {booking_code}")
-            print(f"Total Price (with tax): Rp{total_price:,.0f}")
-            print(f"New available_count for room {room_id}: {new_available_count}")
-            
-            flash(f'Booking successful! Please complete payment.', 'success')
-            
-            return redirect(url_for('booking_success', booking_id=booking_id))
-            
-        except Exception as e:
-            mysql.connection.rollback()
-            cur.close()
-            print(f"DEBUG: BOOKING ERROR - {str(e)}")
-            flash(f'Booking failed. Please try again.', 'danger')
-            return redirect(url_for('book', room_id=room_id))
-    
-    room_id = request.args.get('room_id')
-    cur = mysql.connection.cursor()
-    
-    print(f"\n=== DEBUG: GET BOOK PAGE ===")
-    print(f"Requested room_id: {room_id}")
-    
-    if room_id:
-        cur.execute("""
-            SELECT *, 
-                   CASE 
-                       WHEN available_count <= 0 THEN 'Sold Out'
-                       WHEN available_count <= 2 THEN CONCAT('Only ', available_count, ' left')
-                       ELSE CONCAT(available_count, ' available')
-                   END as availability_text
-            FROM rooms 
-            WHERE id = %s AND is_available = 1
-        """, (room_id,))
+log = get_logger('booking')
+
+def db_cursor():
+    return mysql.connection.cursor()
+
+def prepare_book_room(raw_room):
+    """Room record for the booking form (memoized per catalog version)"""
+    room = dict(raw_room)
+    
+    available_count = room.get('available_count') or 0
+    if available_count <= 0:
+        room['availability_text'] = 'Sold Out'
+    elif available_count <= 2:
+        room['availability_text'] = f'Only {available_count} left'
     else:
-        cur.execute("""
-            SELECT *, 
-                   CASE 
-                       WHEN available_count <= 0 THEN 'Sold Out'
-                       WHEN available_count <= 2 THEN CONCAT('Only ', available_count, ' left')
-                       ELSE CONCAT(available_count, ' available')
-                   END as availability_text
-            FROM rooms 
-            WHERE is_available = 1 
-            LIMIT 1
-        """)
-    
-    room = cur.fetchone()
-    cur.close()
-    
-    if not room:
-        print(f"DEBUG: Room not found or not available")
-        flash('Room not available.', 'warning')
-        return redirect(url_for('rooms'))
-    
-    room = dict(room)
+        room['availability_text'] = f'{available_count} available'
     
-    print(f"DEBUG: Displaying room {room['name']}")
-    print(f"  - Available: {room.get('available_count')}")
-    print(f"  - Availability text: {room.get('availability_text')}")
-    
-    if room.get('images'):
-        images_raw = room['images']
-        if isinstance(images_raw, str):
-            if images_raw.startswith('['):
-                try:
-                    room['images_list'] = json.loads(images_raw.replace("'", '"'))
-                except json.JSONDecodeError:
-                    room['images_list'] = [img.strip() for img in images_raw.split(',') if img.strip()]
-            else:
-                room['images_list'] = [images_raw] if images_raw.strip() else []
-        else:
-            room['images_list'] = []
-    else:
-        room['images_list'] = []
-    
-    # Process amenities for room
-    if room.get('amenities'):
-        amenities_raw = room['amenities']
-        if isinstance(amenities_raw, str):
-            if amenities_raw.startswith('['):
-                try:
-                    room['amenities_list'] = json.loads(amenities_raw.replace("'", '"'))
-                except json.JSONDecodeError:
-                    # Fallback: split by comma
-                    room['amenities_list'] = [amenity.strip() for amenity in amenities_raw.split(',') if amenity.strip()]
-            else:
-                room['amenities_list'] = [amenities_raw] if amenities_raw.strip() else []
-        else:
-            room['amenities_list'] = []
-    else:
-        room['amenities_list'] = []
+    room['images_list'] = parse_images(room.get('images'))
+    room['amenities_list'] = parse_amenities(room.get('amenities'))
     
     # Add default amenities if empty
     if not room.get('amenities_list'):
@@ -273,6 +58,76 @@ def book():
     if not room.get('capacity'):
         room['capacity'] = 2
     
+    return room
+
+# =============== BOOKING ROUTES ===============
+@app.route('/book', methods=['GET', 'POST'])
+@login_required
+@idempotency_store.guard('book', db_cursor)
+def book():
+    if request.method == 'POST':
+        room_id = request.form.get('room_id')
+        cur = mysql.connection.cursor()
+        
+        try:
+            # Validasi dan harga dihitung sebelum transaksi dibuka
+            booking_request = bookings.prepare(
+                bookings.load_room(cur, room_id),
+                session['user_id'],
+                request.form.get('check_in'),
+                request.form.get('check_out'),
+                request.form.get('guests', 2),
+                request.form.get('special_requests', ''),
+                guest={
+                    'name': request.form.get('guest_name', ''),
+                    'email': request.form.get('guest_email', ''),
+                    'phone': request.form.get('guest_phone', ''),
+                    'country': request.form.get('guest_country', 'Indonesia')
+                },
+                hold_token=request.form.get('hold_token')
+            )
+            booking = bookings.submit(cur, booking_request)
+            
+        except bookings.BookingError as e:
+            log.info('booking.rejected', room_id=room_id, reason=e.reason)
+            if e.reason == bookings.PROCESSING:
+                flash(str(e), 'info')
+                return redirect(url_for('my_bookings'))
+            flash(str(e), 'danger')
+            if e.reason == bookings.ROOM_UNAVAILABLE:
+                return redirect(url_for('rooms'))
+            return redirect(url_for('book', room_id=room_id))
+        except Exception:
+            log.exception('booking.error', room_id=room_id)
+            flash(f'Booking failed. Please try again.', 'danger')
+            return redirect(url_for('book', room_id=room_id))
+        finally:
+            cur.close()
+        
+        log.info('booking.created', booking_id=booking['booking_id'], booking_code=booking['booking_code'],
+                 room_id=room_id, nights=booking_request['nights'], total=booking['total_price'])
+        flash(f'Booking successful! Please complete payment.', 'success')
+        
+        return redirect(url_for('booking_success', booking_id=booking['booking_id']))
+    
+    room_id = request.args.get('room_id')
+    
+    cursor_factory = db_cursor
+    if room_id:
+        room = catalog.room(room_id, cursor_factory)
+        if room and room.get('is_available') != 1:
+            room = None
+    else:
+        room = next((r for r in catalog.rooms(cursor_factory) if r.get('is_available') == 1), None)
+    
+    if not room:
+        log.debug('book_page.room_unavailable', room_id=room_id)
+        flash('Room not available.', 'warning')
+        return redirect(url_for('rooms'))
+    
+    room = catalog.view(f"book:{room['id']}", lambda rooms, venues: prepare_book_room(room),
+                        cursor_factory)
+    
     # Default dates
     tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
     day_after = (datetime.now() + timedelta(days=3)).strftime('%Y-%m-%d')
@@ -409,34 +264,33 @@ def fix_payment_paths():
             continue
         
         if old_path.startswith('static/'):
-            print(f"✅ Payment {payment_id}: Path sudah benar - {old_path}")
+            log.debug('payment_path.ok', payment_id=payment_id, path=old_path)
             continue
         
         if '/' not in old_path:
             new_path = f"images/uploads/payments/{old_path}"
-            print(f"🔄 Payment {payment_id}: Update '{old_path}' -> '{new_path}'")
+            log.info('payment_path.updated', payment_id=payment_id, old=old_path, new=new_path)
             
             cur.execute("UPDATE payments SET proof_image = %s WHERE id = %s", 
                        (new_path, payment_id))
         
         elif 'static/images/uploads/payments/' in old_path:
             new_path = old_path.replace('static/', '')
-            print(f"🔄 Payment {payment_id}: Fix static path '{old_path}' -> '{new_path}'")
+            log.info('payment_path.updated', payment_id=payment_id, old=old_path, new=new_path)
             
             cur.execute("UPDATE payments SET proof_image = %s WHERE id = %s", 
                        (new_path, payment_id))
     
     mysql.connection.commit()
     cur.close()
-    print("Migration completed!")
+    log.info('payment_path.migrated')
 
 @app.route('/booking/payment/<int:booking_id>', methods=['GET', 'POST'])
 @login_required
+@idempotency_store.guard('payment', db_cursor)
 def booking_payment(booking_id):
     cur = mysql.connection.cursor()
     
-    print(f"=== DEBUG booking_payment for booking_id={booking_id} ===")
-    
     # Ambil data booking dengan informasi lengkap
     cur.execute("""
         SELECT b.*, 
@@ -500,8 +354,124 @@ def booking_payment(booking_id):
     
     return prepare_booking_data_for_template(booking_id, booking, cur)
 
-def handle_ajax_payment(booking_id, booking, cur):
-    """Handle AJAX payment submission"""
+# =============== CHUNKED PROOF UPLOAD ===============
+def load_payable_booking(cur, booking_id):
+    """(booking, None) if the current user may upload a proof, else (None, error)"""
+    cur.execute("""
+        SELECT b.*, r.name as room_name
+        FROM bookings b
+        JOIN rooms r ON b.room_id = r.id
+        WHERE b.id = %s AND b.user_id = %s
+    """, (booking_id, session['user_id']))
+    booking = cur.fetchone()
+    if not booking:
+        return None, ('Booking not found.', 404)
+    
+    booking = dict(booking)
+    if booking.get('status') in ['cancelled', 'expired', 'confirmed']:
+        return None, (f'Booking is already {booking.get("status")}.', 409)
+    
+    cur.execute("SELECT status FROM payments WHERE booking_id = %s", (booking_id,))
+    payment = cur.fetchone()
+    if payment and payment['status'] in ['completed', 'processing']:
+        return None, ('Payment already submitted for this booking.', 409)
+    
+    return booking, None
+
+def upload_session_error(error):
+    body = {'success': False, 'error': str(error)}
+    if error.offset is not None:
+        body['offset'] = error.offset
+    return jsonify(body), error.status
+
+@app.route('/booking/payment/<int:booking_id>/uploads', methods=['POST'])
+@login_required
+def create_proof_upload(booking_id):
+    """Start a resumable proof upload: JSON {filename, size, sha256}"""
+    data = request.get_json(silent=True) or {}
+    
+    if not allowed_file(str(data.get('filename', ''))):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid file type. Please upload JPG, PNG, or PDF.'
+        }), 400
+    
+    cur = mysql.connection.cursor()
+    try:
+        booking, error = load_payable_booking(cur, booking_id)
+    finally:
+        cur.close()
+    if error:
+        return jsonify({'success': False, 'error': error[0]}), error[1]
+    
+    try:
+        meta = chunked_uploads.create(session['user_id'], booking_id, data.get('size'), data.get('sha256'))
+    except chunked_uploads.UploadSessionError as e:
+        return upload_session_error(e)
+    
+    return jsonify({
+        'success': True,
+        'upload_id': meta['upload_id'],
+        'offset': 0,
+        'size': meta['size'],
+        'chunk_size': chunked_uploads.MAX_CHUNK_SIZE
+    }), 201
+
+@app.route('/booking/payment/<int:booking_id>/uploads/<upload_id>', methods=['GET', 'PATCH'])
+@login_required
+def proof_upload_chunk(booking_id, upload_id):
+    """GET: stored offset (resume point). PATCH: append the raw body at Upload-Offset"""
+    try:
+        meta = chunked_uploads.load(upload_id, session['user_id'], booking_id)
+        if request.method == 'GET':
+            offset = chunked_uploads.current_offset(meta)
+        else:
+            # request.stream tidak di-buffer Werkzeug, dibaca per potongan kecil
+            offset = chunked_uploads.append(meta, request.headers.get('Upload-Offset'),
+                                            request.stream, request.content_length)
+    except chunked_uploads.UploadSessionError as e:
+        return upload_session_error(e)
+    
+    response = jsonify({
+        'success': True,
+        'upload_id': meta['upload_id'],
+        'offset': offset,
+        'size': meta['size'],
+        'complete': offset == meta['size']
+    })
+    response.headers['Upload-Offset'] = str(offset)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/booking/payment/<int:booking_id>/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_proof_upload(booking_id, upload_id):
+    """Verify the assembled file and run the normal AJAX payment transaction"""
+    try:
+        meta = chunked_uploads.load(upload_id, session['user_id'], booking_id)
+        proof_path = chunked_uploads.finish(meta)
+    except chunked_uploads.UploadSessionError as e:
+        return upload_session_error(e)
+    
+    cur = mysql.connection.cursor()
+    booking, error = load_payable_booking(cur, booking_id)
+    if error:
+        cur.close()
+        return jsonify({'success': False, 'error': error[0]}), error[1]
+    
+    response = handle_ajax_payment(booking_id, booking, cur, proof_path=proof_path)
+    
+    # File sudah dipindah ke blob store kalau transaksi jalan
+    if not os.path.exists(proof_path):
+        chunked_uploads.discard(meta)
+    return response
+
+def handle_ajax_payment(booking_id, booking, cur, proof_path=None):
+    """Handle AJAX payment submission
+
+    `proof_path` is a file already assembled by the chunked upload API;
+    the multipart file checks are skipped for it.
+    """
     try:
         payment_method = request.form.get('payment_method')
         qris_simulated = request.form.get('qris_simulated', 'false')
@@ -514,53 +484,49 @@ def handle_ajax_payment(booking_id, booking, cur):
                 'error': 'Invalid payment method.'
             }), 400
         
-        # Validasi file upload
-        if 'payment_proof' not in request.files:
-            return jsonify({
-                'success': False,
-                'error': 'No file selected.'
-            }), 400
-        
-        proof_file = request.files['payment_proof']
-        
-        # Check if file is selected
-        if proof_file.filename == '':
-            return jsonify({
-                'success': False,
-                'error': 'No file selected.'
-            }), 400
-        
-        # Check file extension
-        if not allowed_file(proof_file.filename):
-            return jsonify({
-                'success': False,
-                'error': 'Invalid file type. Please upload JPG, PNG, or PDF.'
-            }), 400
+        if proof_path is None:
+            # Validasi file upload
+            if 'payment_proof' not in request.files:
+                return jsonify({
+                    'success': False,
+                    'error': 'No file selected.'
+                }), 400
         
-        # Check file size (max 5MB)
-        proof_file.seek(0, os.SEEK_END)
-        file_size = proof_file.tell()
-        proof_file.seek(0)
+            proof_file = request.files['payment_proof']
         
-        if file_size > 5 * 1024 * 1024:  # 5MB
-            return jsonify({
-                'success': False,
-                'error': 'File size must be less than 5MB.'
-            }), 400
+            # Check if file is selected
+            if proof_file.filename == '':
+                return jsonify({
+                    'success': False,
+                    'error': 'No file selected.'
+                }), 400
         
-        # Generate unique filename
-        filename = generate_payment_filename(booking_id, payment_method, proof_file.filename, qris_simulated)
+            # Check file extension
+            if not allowed_file(proof_file.filename):
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid file type. Please upload JPG, PNG, or PDF.'
+                }), 400
         
-        # Create directory jika belum ada
-        uploads_dir = os.path.join('uploads', 'payments')
-        os.makedirs(uploads_dir, exist_ok=True)
+            # Check file size (max 5MB)
+            proof_file.seek(0, os.SEEK_END)
+            file_size = proof_file.tell()
+            proof_file.seek(0)
         
-        filepath = os.path.join(uploads_dir, filename)
+            if file_size > 5 * 1024 * 1024:  # 5MB
+                return jsonify({
+                    'success': False,
+                    'error': 'File size must be less than 5MB.'
+                }), 400
         
         try:
-            # Save file
-            proof_file.save(filepath)
-            print(f"DEBUG: Payment proof saved: {filepath}")
+            # Simpan ke blob store (nama file = hash isinya)
+            label = payment_label(payment_method, qris_simulated)
+            if proof_path is None:
+                filename, filepath, _ = payment_store.put(proof_file.stream, label)
+            else:
+                filename, filepath, _ = payment_store.put_file(proof_path, label, move=True)
+            log.debug('payment.proof_saved', booking_id=booking_id, path=filepath)
             
             # Set expiration date (24 hours from now)
             expiration_date = datetime.now() + timedelta(hours=24)
@@ -572,13 +538,18 @@ def handle_ajax_payment(booking_id, booking, cur):
             # Start transaction
             try:
                 cur.execute("START TRANSACTION")
-                if cur.execute("SELECT id FROM payments WHERE booking_id = %s", (booking_id,)):
+                cur.execute("SELECT status, proof_image FROM payments WHERE booking_id = %s", (booking_id,))
+                old_payments = cur.fetchall()
+                old_payment_statuses = [row['status'] for row in old_payments]
+                if old_payment_statuses:
                     # Update existing payment
                     cur.execute("""
                         UPDATE payments 
                         SET amount = %s, 
                             payment_method = %s, 
                             proof_image = %s,
+                            upload_status = 'pending',
+                            upload_checksum = NULL,
                             status = %s,
                             expiration_date = %s,
                             updated_at = NOW()
@@ -589,8 +560,8 @@ def handle_ajax_payment(booking_id, booking, cur):
                     # Insert new payment record
                     cur.execute("""
                         INSERT INTO payments (booking_id, amount, payment_method, proof_image, 
-                                            status, expiration_date, created_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                                            upload_status, status, expiration_date, created_at)
+                        VALUES (%s, %s, %s, %s, 'pending', %s, %s, NOW())
                     """, (booking_id, booking.get('total_price', 0), payment_method, filename, 
                           payment_status, expiration_date))
                 
@@ -602,7 +573,14 @@ def handle_ajax_payment(booking_id, booking, cur):
                     WHERE id = %s
                 """, (booking_status, booking_id))
                 
+                for old_payment_status in old_payment_statuses or [None]:
+                    counters.payment_status_changed(cur, old_payment_status, payment_status)
+                counters.booking_status_changed(cur, booking['room_id'], booking.get('status'), booking_status)
+                blobs.change_refs(cur, blobs.PAYMENTS, [row['proof_image'] for row in old_payments],
+                                  [filename] * max(len(old_payments), 1))
+                
                 cur.execute("COMMIT")
+                upload_processor.submit(PAYMENT, booking_id, [filename])
                 
                 cur.close()
                 
@@ -614,27 +592,23 @@ def handle_ajax_payment(booking_id, booking, cur):
                 
             except Exception as db_error:
                 cur.execute("ROLLBACK")
-                if os.path.exists(filepath):
-                    try:
-                        os.remove(filepath)
-                    except:
-                        pass
+                # Blob tanpa referensi dibersihkan oleh blobs.collect_garbage()
                 
-                print(f"Database error: {db_error}")
+                log.exception('payment.db_error', booking_id=booking_id)
                 return jsonify({
                     'success': False,
                     'error': f'Payment processing failed: {str(db_error)}'
                 }), 500
                 
         except Exception as file_error:
-            print(f"File save error: {file_error}")
+            log.exception('payment.file_error', booking_id=booking_id)
             return jsonify({
                 'success': False,
                 'error': f'Failed to save payment proof: {str(file_error)}'
             }), 500
             
     except Exception as e:
-        print(f"General error: {e}")
+        log.exception('payment.error', booking_id=booking_id)
         return jsonify({
             'success': False,
             'error': f'Unexpected error: {str(e)}'
@@ -682,18 +656,10 @@ def handle_form_payment(booking_id, booking, cur):
         cur.close()
         return render_template('booking/payment.html', booking=booking)
     
-    # Generate unique filename
-    filename = generate_payment_filename(booking_id, payment_method, proof_file.filename, qris_simulated)
-    
-    uploads_dir = os.path.join('uploads', 'payments')
-    os.makedirs(uploads_dir, exist_ok=True)
-    
-    filepath = os.path.join(uploads_dir, filename)
-    
     try:
-        # Save file
-        proof_file.save(filepath)
-        print(f"DEBUG: Payment proof saved: {filepath}")
+        # Simpan ke blob store (nama file = hash isinya)
+        filename, filepath, _ = payment_store.put(proof_file.stream, payment_label(payment_method, qris_simulated))
+        log.debug('payment.proof_saved', booking_id=booking_id, path=filepath)
         
         # Set expiration date (24 hours from now)
         expiration_date = datetime.now() + timedelta(hours=24)
@@ -706,12 +672,17 @@ def handle_form_payment(booking_id, booking, cur):
         try:
             cur.execute("START TRANSACTION")
 
-            if cur.execute("SELECT id FROM payments WHERE booking_id = %s", (booking_id,)):
+            cur.execute("SELECT status, proof_image FROM payments WHERE booking_id = %s", (booking_id,))
+            old_payments = cur.fetchall()
+            old_payment_statuses = [row['status'] for row in old_payments]
+            if old_payment_statuses:
                 cur.execute("""
                     UPDATE payments 
                     SET amount = %s, 
                         payment_method = %s, 
                         proof_image = %s,
+                        upload_status = 'pending',
+                        upload_checksum = NULL,
                         status = %s,
                         expiration_date = %s,
                         updated_at = NOW()
@@ -722,8 +693,8 @@ def handle_form_payment(booking_id, booking, cur):
                 # Insert new payment record
                 cur.execute("""
                     INSERT INTO payments (booking_id, amount, payment_method, proof_image, 
-                                        status, expiration_date, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                                        upload_status, status, expiration_date, created_at)
+                    VALUES (%s, %s, %s, %s, 'pending', %s, %s, NOW())
                 """, (booking_id, booking.get('total_price', 0), payment_method, filename, 
                       payment_status, expiration_date))
             
@@ -735,7 +706,14 @@ def handle_form_payment(booking_id, booking, cur):
                 WHERE id = %s
             """, (booking_status, booking_id))
             
+            for old_payment_status in old_payment_statuses or [None]:
+                counters.payment_status_changed(cur, old_payment_status, payment_status)
+            counters.booking_status_changed(cur, booking['room_id'], booking.get('status'), booking_status)
+            blobs.change_refs(cur, blobs.PAYMENTS, [row['proof_image'] for row in old_payments],
+                              [filename] * max(len(old_payments), 1))
+            
             cur.execute("COMMIT")
+            upload_processor.submit(PAYMENT, booking_id, [filename])
             
             flash_messages = {
                 'qris': 'QRIS payment proof uploaded! Admin will verify within 1-2 hours.',
@@ -754,69 +732,36 @@ def handle_form_payment(booking_id, booking, cur):
             
         except Exception as db_error:
             cur.execute("ROLLBACK")
-            # Delete uploaded file if database error
-            if os.path.exists(filepath):
-                try:
-                    os.remove(filepath)
-                except:
-                    pass
+            # Blob tanpa referensi dibersihkan oleh blobs.collect_garbage()
             
-            print(f"Database error: {db_error}")
+            log.exception('payment.db_error', booking_id=booking_id)
             flash(f'Payment processing failed: {str(db_error)}', 'danger')
             cur.close()
             return render_template('booking/payment.html', booking=booking)
             
     except Exception as file_error:
-        print(f"File save error: {file_error}")
+        log.exception('payment.file_error', booking_id=booking_id)
         flash(f' Failed to save payment proof: {str(file_error)}', 'danger')
         cur.close()
         return render_template('booking/payment.html', booking=booking)
 
-def generate_payment_filename(booking_id, payment_method, original_filename, qris_simulated):
-    """Generate unique filename for payment proof"""
-    secure_name = secure_filename(original_filename)
-    file_extension = secure_name.rsplit('.', 1)[1].lower() if '.' in secure_name else ''
-    unique_id = uuid.uuid4().hex[:8]
-    timestamp = int(time.time())
-    
-    if file_extension:
-        base_name = f"payment_{booking_id}_{payment_method}_{timestamp}_{unique_id}"
-    else:
-        base_name = f"payment_{booking_id}_{payment_method}_{timestamp}_{unique_id}"
-    
-    # For QRIS simulated, add note to filename
+def payment_label(payment_method, qris_simulated):
+    """Reference prefix marking simulated QRIS proofs"""
     if payment_method == 'qris' and qris_simulated == 'true':
-        base_name = f"qris_simulated_{base_name}"
-    
-    return f"{base_name}.{file_extension}" if file_extension else base_name
+        return 'qris_simulated/'
+    return ''
 
 def prepare_booking_data_for_template(booking_id, booking, cur):
     """Prepare booking data for template rendering"""
     # Parse room images
-    if booking.get('room_images'):
-        try:
-            if isinstance(booking['room_images'], str):
-                try:
-                    images_list = json.loads(booking['room_images'])
-                except json.JSONDecodeError:
-                    images_list = [img.strip() for img in booking['room_images'].split(',') if img.strip()]
-            else:
-                images_list = []
-            
-            if images_list and len(images_list) > 0:
-                # Ensure the path is correct
-                first_image = images_list[0]
-                if not first_image.startswith(('http', '/static', '/')):
-                    booking['room_main_image'] = url_for('static', filename=f'images/rooms/{first_image}')
-                else:
-                    booking['room_main_image'] = first_image
-            else:
-                booking['room_main_image'] = None
-        except Exception as e:
-            print(f"Error parsing room images: {e}")
-            booking['room_main_image'] = None
+    first_image = main_image(booking.get('room_images'))
+    if first_image and first_image.startswith('static/'):
+        first_image = '/' + first_image
+    if first_image and not first_image.startswith(('http', '/static', '/')):
+        # Ensure the path is correct
+        booking['room_main_image'] = url_for('static', filename=f'images/rooms/{first_image}')
     else:
-        booking['room_main_image'] = None
+        booking['room_main_image'] = first_image
     
     # Format price
     if booking.get('total_price'):
@@ -903,7 +848,7 @@ def prepare_booking_data_for_template(booking_id, booking, cur):
             booking['nights'] = 1
             
     except Exception as e:
-        print(f"Error calculating nights: {e}")
+        log.warning('booking.nights_error', booking_id=booking_id, error=str(e))
         booking['nights'] = 1
     
     booking_created = booking.get('created_at')
@@ -943,7 +888,7 @@ def prepare_booking_data_for_template(booking_id, booking, cur):
     booking['countdown_seconds'] = total_seconds if not is_expired else 0
     booking['countdown_display'] = f"{hours_left:02d}:{minutes_left:02d}:{seconds_left:02d}"
     
-    print(f"DEBUG - Booking {booking_id}: {hours_left}h {minutes_left}m {seconds_left}s left")
+    log.debug('payment.countdown', booking_id=booking_id, seconds_left=booking['countdown_seconds'])
     
     # Ensure room name exists
     if not booking.get('room_name'):
@@ -6,70 +6,32 @@ from datetime import datetime, timedelta
 from helpers import (
     process_room_data,
     process_facility_data,
-    parse_images_data,
-    parse_amenities_data,
     format_price,
     get_availability_info,
     process_room_images
 )
+from services.catalog import catalog
+from services.parsing import parse_images, parse_amenities, main_image as first_image
+from services.page_cache import page_cache
+from services.logs import get_logger
+
+log = get_logger('main')
 
-def process_room_images(rooms):
-    """Process room images sama seperti di rooms() route"""
-    processed = []
-    
-    for raw_room in rooms:
-        room = dict(raw_room)
-        
-        main_image = None
-        
-        if room.get('images'):
-            img = str(room['images']).strip()
-            if img and img.lower() not in ['null', 'none', '']:
-                main_image = img
-        
-        # Fallback
-        if not main_image:
-            room_name = str(room.get('name', '')).lower()
-            if 'deluxe' in room_name:
-                main_image = '/static/images/rooms/deluxe.jpg'
-            elif 'executive' in room_name:
-                main_image = '/static/images/rooms/executive.jpg'
-            elif 'presidential' in room_name:
-                main_image = '/static/images/rooms/presidential.jpg'
-            else:
-                main_image = '/static/images/rooms/default.jpg'
-        
-        # Fix path
-        if main_image and not main_image.startswith(('http', '/static', '/')):
-            if main_image.startswith('static/'):
-                main_image = '/' + main_image
-            else:
-                main_image = '/static/images/rooms/' + main_image
-        
-        room['main_image'] = main_image
-        processed.append(room)
-    
-    return processed
-    
 # PUBLIC ROUTES 
-@app.route('/')
-def index():
-    cur = mysql.connection.cursor()
-    
-    cur.execute("""
-        SELECT * FROM rooms 
-        WHERE is_available = 1 
-        ORDER BY price ASC 
-        LIMIT 3
-    """)
-    featured_rooms_data = cur.fetchall()
+def catalog_version():
+    return catalog.current_version(lambda: mysql.connection.cursor())
+
+def build_index_view(rooms, venues):
+    """Featured rooms + venues for the home page (memoized per catalog version)"""
+    featured_rooms_data = sorted((room for room in rooms if room.get('is_available') == 1),
+                                 key=lambda room: room.get('price') or 0)[:3]
     
     featured_rooms = []
     for room in featured_rooms_data:
         room_dict = dict(room)
         
         images_raw = room_dict.get('images')
-        room_dict['images_list'] = parse_images_data(images_raw)
+        room_dict['images_list'] = parse_images(images_raw)
         
         if not room_dict['images_list']:
             room_name = str(room_dict.get('name', '')).lower()
@@ -82,22 +44,8 @@ def index():
             else:
                 room_dict['images_list'] = ['/static/images/rooms/default.jpg']
         
-        amenities_raw = room_dict.get('amenities')
-        if amenities_raw:
-            if isinstance(amenities_raw, str):
-                if amenities_raw.startswith('['):
-                    try:
-                        room_dict['amenities_list'] = json.loads(amenities_raw.replace("'", '"'))
-                    except:
-                        room_dict['amenities_list'] = [a.strip() for a in amenities_raw.split(',')]
-                else:
-                    room_dict['amenities_list'] = [a.strip() for a in amenities_raw.split(',')]
-            else:
-                room_dict['amenities_list'] = []
-        else:
-            room_dict['amenities_list'] = []
+        room_dict['amenities_list'] = parse_amenities(room_dict.get('amenities'))
         
-
         try:
             room_dict['price'] = float(room_dict.get('price', 1500000))
         except:
@@ -105,15 +53,14 @@ def index():
         
         featured_rooms.append(room_dict)
     
-    cur.execute("SELECT * FROM venues WHERE is_available = 1 LIMIT 6")
-    venues_data = cur.fetchall()
+    venues_data = [venue for venue in venues if venue.get('is_available') == 1][:6]
     
     venues_list = []
     for venue in venues_data:
         venue_dict = dict(venue)
         
         images_raw = venue_dict.get('image_url') or venue_dict.get('images')
-        venue_dict['images_list'] = parse_images_data(images_raw)
+        venue_dict['images_list'] = parse_images(images_raw)
         
         if not venue_dict['images_list']:
             venue_type = str(venue_dict.get('type', '')).lower()
@@ -132,110 +79,30 @@ def index():
         
         venues_list.append(venue_dict)
     
-    cur.close()
+    return featured_rooms, venues_list
+
+@app.route('/')
+@page_cache.cached(version=catalog_version)
+def index():
+    featured_rooms, venues_list = catalog.view('index', build_index_view,
+                                               lambda: mysql.connection.cursor())
     
     return render_template('main/index.html', 
                          featured_rooms=featured_rooms,
                          venues=venues_list)
 
 @app.route('/about')
+@page_cache.cached()
 def about():
     return render_template('main/about.html')
 
-def parse_images_data(images_str):
-    """Parse images data dari berbagai format - SUPPORT LOCAL STATIC PATHS"""
-    if not images_str:
-        return []
-    
-    print(f"DEBUG parse_images_data INPUT: '{images_str}'")
-    
-    try:
-        if isinstance(images_str, str):
-            images_str = images_str.strip()
-            
-            if not images_str or images_str.lower() in ['null', 'none', '[]', '{}']:
-                print("DEBUG: Empty string, returning []")
-                return []
-            
-            if images_str.startswith('/static/'):
-                print(f"DEBUG: Detected local static path: {images_str}")
-                return [images_str]
-
-            if images_str.startswith('[') and images_str.endswith(']'):
-                print("DEBUG: Detected JSON array format")
-                try:
-
-                    cleaned = images_str.replace("'", '"')
-                    parsed = json.loads(cleaned)
-                    
-                    if isinstance(parsed, list):
-                        print(f"DEBUG: Parsed as list: {parsed}")
-                        valid_paths = []
-                        for item in parsed:
-                            if isinstance(item, str) and item:
-
-                                if item.startswith('http') or item.startswith('/static/'):
-                                    valid_paths.append(item.strip())
-                                else:
-                                    valid_paths.append(str(item).strip())
-                        
-                        print(f"DEBUG: Valid paths found: {valid_paths}")
-                        return valid_paths
-                    else:
-
-                        print(f"DEBUG: Parsed as non-list, converting: {parsed}")
-                        return [str(parsed)] if parsed else []
-                        
-                except json.JSONDecodeError as e:
-                    print(f"DEBUG: JSON decode error: {e}")
-
-                    content = images_str[1:-1].strip()
-                    if content:
-                        print(f"DEBUG: Extracted content: {content}")
-                        return [content]
-                    return []
-            
-            elif images_str.startswith('http'):
-                print(f"DEBUG: Detected plain URL: {images_str}")
-                return [images_str]
-            
-            elif ',' in images_str:
-                print(f"DEBUG: Detected comma-separated: {images_str}")
-                paths = []
-                for part in images_str.split(','):
-                    part = part.strip().strip('"').strip("'").strip()
-                    if part:  
-                        paths.append(part)
-                print(f"DEBUG: Extracted paths: {paths}")
-                return paths
-            
-            else:
-                print(f"DEBUG: Single string: {images_str}")
-                return [images_str] if images_str else []
-        
-        print(f"DEBUG: Not a string, returning []")
-        return []
-        
-    except Exception as e:
-        print(f"ERROR in parse_images_data: {e}")
-        import traceback
-        traceback.print_exc()
-        return []
-    
-@app.route('/rooms')
-def rooms():
-    cur = mysql.connection.cursor()
-    
-
-    cur.execute("""
-        SELECT * FROM rooms 
-        WHERE room_type = 'hotel_room' 
-        AND available_count > 0 
-        AND is_available = 1
-        ORDER BY price ASC
-    """)
-    
-    raw_rooms = cur.fetchall()
+def build_rooms_view(catalog_rooms, venues):
+    """Context for the rooms page (memoized per catalog version)"""
+    raw_rooms = sorted((room for room in catalog_rooms
+                        if room.get('room_type') == 'hotel_room'
+                        and (room.get('available_count') or 0) > 0
+                        and room.get('is_available') == 1),
+                       key=lambda room: room.get('price') or 0)
     rooms = []
 
     for raw_room in raw_rooms:
@@ -256,13 +123,7 @@ def rooms():
         else:
             room['availability'] = {'text': f'{available} available', 'color': 'green', 'class': 'bg-green-100 text-green-800'}
         
-        main_image = None
-
-        if room.get('images'):
-            img = str(room['images']).strip()
-            if img and img.lower() not in ['null', 'none', '']:
-                main_image = img
-                print(f"DEBUG Room '{room.get('name')}': Found image: {main_image}")
+        main_image = first_image(room.get('images'))
         
         # Fallback
         if not main_image:
@@ -275,7 +136,7 @@ def rooms():
                 main_image = '/static/images/rooms/presidential.jpg'
             else:
                 main_image = '/static/images/rooms/default.jpg'
-            print(f"DEBUG Room '{room.get('name')}': Using fallback: {main_image}")
+            log.debug('rooms.fallback_image', room_id=room.get('id'), image=main_image)
         
         room['main_image'] = main_image
         rooms.append(room)
@@ -285,11 +146,18 @@ def rooms():
     presidential_rooms = [r for r in rooms if 'presidential' in r['name'].lower()]
     processed_rooms = process_room_images(raw_rooms)
 
-    return render_template('main/rooms.html', 
-                        rooms=processed_rooms,
-                        deluxe_rooms=deluxe_rooms,
-                        executive_rooms=executive_rooms,
-                        presidential_rooms=presidential_rooms)
+    return {
+        'rooms': processed_rooms,
+        'deluxe_rooms': deluxe_rooms,
+        'executive_rooms': executive_rooms,
+        'presidential_rooms': presidential_rooms
+    }
+
+@app.route('/rooms')
+@page_cache.cached(version=catalog_version)
+def rooms():
+    context = catalog.view('rooms', build_rooms_view, lambda: mysql.connection.cursor())
+    return render_template('main/rooms.html', **context)
 
 # Sudah diganti menjadi Venue (Hanya untuk compability)
 @app.route('/facilities')
@@ -304,34 +172,24 @@ def facilities_list():
     flash('Please visit our Venues page for all facilities information.', 'info')
     return redirect(url_for('venues'))
 
-@app.route('/venues')
-def venues():
-    """Halaman venues (gabungan meeting, facilities, dining)"""
-    cur = mysql.connection.cursor()
-    
-    cur.execute("""
-        SELECT * FROM venues 
-        WHERE is_available = 1 
-        ORDER BY 
-            CASE type 
-                WHEN 'meeting_room' THEN 1
-                WHEN 'conference_room' THEN 2
-                WHEN 'ballroom' THEN 3
-                WHEN 'pool' THEN 4
-                WHEN 'spa' THEN 5
-                WHEN 'gym' THEN 6
-                WHEN 'fitness_center' THEN 7
-                WHEN 'restaurant' THEN 8
-                WHEN 'cafe' THEN 9
-                WHEN 'bar' THEN 10
-                WHEN 'lounge' THEN 11
-                ELSE 12
-            END,
-            name
-    """)
-    
-    venues_data = cur.fetchall()
-    cur.close()
+VENUE_TYPE_ORDER = {
+    'meeting_room': 1,
+    'conference_room': 2,
+    'ballroom': 3,
+    'pool': 4,
+    'spa': 5,
+    'gym': 6,
+    'fitness_center': 7,
+    'restaurant': 8,
+    'cafe': 9,
+    'bar': 10,
+    'lounge': 11
+}
+
+def build_venues_view(rooms, catalog_venues):
+    """Venues grouped for the venues page (memoized per catalog version)"""
+    venues_data = sorted((venue for venue in catalog_venues if venue.get('is_available') == 1),
+                         key=lambda venue: (VENUE_TYPE_ORDER.get(venue.get('type'), 12), venue.get('name') or ''))
     
     meeting_rooms = []
     hotel_facilities = []
@@ -380,10 +238,18 @@ def venues():
         else:
             hotel_facilities.append(venue_dict)
     
-    return render_template('main/venues.html',
-                         meeting_rooms=meeting_rooms,
-                         hotel_facilities=hotel_facilities,
-                         dining=dining)
+    return {
+        'meeting_rooms': meeting_rooms,
+        'hotel_facilities': hotel_facilities,
+        'dining': dining
+    }
+
+@app.route('/venues')
+@page_cache.cached(version=catalog_version)
+def venues():
+    """Halaman venues (gabungan meeting, facilities, dining)"""
+    context = catalog.view('venues', build_venues_view, lambda: mysql.connection.cursor())
+    return render_template('main/venues.html', **context)
 
 @app.route('/contact', methods=['GET', 'POST'])
 def contact():
@@ -426,7 +292,7 @@ def contact():
                 
             except Exception as e:
                 mysql.connection.rollback()
-                print(f"Error: {e}")
+                log.exception('contact.save_error')
                 flash('Failed to send message. Please try again.', 'danger')
             finally:
                 cur.close()
@@ -439,6 +305,7 @@ import re  # Import regex untuk validasi
 from werkzeug.security import generate_password_hash
 
 @app.route('/support')
+@page_cache.cached()
 def support():
     """Support page for password reset and other issues"""
     return render_template('main/contact_support.html')
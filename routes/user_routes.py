@@ -3,6 +3,12 @@ from config import app, mysql
 from models import login_required
 import json
 from datetime import datetime, timedelta
+from services import inventory, counters
+from services.availability import engine as availability_engine
+from services.dashboard import dashboard_cache
+from services.logs import get_logger
+
+log = get_logger('booking')
 
 @app.route('/profile')
 @login_required
@@ -145,7 +151,7 @@ def my_bookings():
             else:
                 booking_dict['nights'] = 1
         except Exception as e:
-            print(f"Error calculating nights: {e}")
+            log.warning('booking.nights_error', booking_id=booking_dict.get('id'), error=str(e))
             booking_dict['nights'] = 1
         
         if booking_dict.get('total_price'):
@@ -190,30 +196,10 @@ def my_bookings():
             booking_dict['is_expired'] = True
             booking_dict['time_left_display'] = "EXPIRED"
             
-            if booking_dict.get('status') == 'waiting_payment':
-                try:
-                    cur2 = mysql.connection.cursor()
-                    cur2.execute("""
-                        UPDATE bookings 
-                        SET status = 'expired', updated_at = NOW() 
-                        WHERE id = %s AND status = 'waiting_payment'
-                    """, (booking_dict['id'],))
-                    
-                    if booking_dict.get('payment_status') in ['pending', 'processing']:
-                        cur2.execute("""
-                            UPDATE payments 
-                            SET status = 'expired', updated_at = NOW() 
-                            WHERE booking_id = %s AND status IN ('pending', 'processing')
-                        """, (booking_dict['id'],))
-                    
-                    mysql.connection.commit()
-                    cur2.close()
-                    
-                    booking_dict['status'] = 'expired'
-                    booking_dict['payment_status'] = 'expired'
-                    
-                except Exception as e:
-                    print(f"Error auto-expiring booking {booking_dict['id']}: {e}")
+            # Update ke database dilakukan oleh expiry sweeper (services/expiry.py)
+            if booking_dict.get('status') == 'waiting_payment' and booking_dict.get('payment_status') == 'pending':
+                booking_dict['status'] = 'expired'
+                booking_dict['payment_status'] = 'expired'
         else:
             total_seconds = int(time_left.total_seconds())
             booking_dict['hours_left'] = total_seconds // 3600
@@ -288,12 +274,9 @@ def cancel_booking(booking_id):
     cur = mysql.connection.cursor()
     
     try:
-        print(f"\n=== DEBUG: CANCEL BOOKING {booking_id} ===")
-        
         cur.execute("""
-            SELECT b.*, r.available_count as room_available
+            SELECT b.*
             FROM bookings b
-            JOIN rooms r ON b.room_id = r.id
             WHERE b.id = %s AND b.user_id = %s
         """, (booking_id, session['user_id']))
         
@@ -306,23 +289,11 @@ def cancel_booking(booking_id):
         
         booking = dict(booking)
         
-        print(f"DEBUG: Found booking {booking.get('booking_code')}")
-        print(f"  - Status: {booking.get('status')}")
-        print(f"  - Room ID: {booking.get('room_id')}")
-        print(f"  - Room current available: {booking.get('room_available')}")
-        
         if booking['status'] not in ['pending', 'waiting_payment']:
             flash(f'Cannot cancel booking with status: {booking["status"]}', 'warning')
             cur.close()
             return redirect(url_for('my_bookings'))
         
-        current_available = booking.get('room_available', 0)
-        new_available = current_available + 1
-        
-        print(f"DEBUG: Updating room availability")
-        print(f"  - From: {current_available}")
-        print(f"  - To: {new_available}")
-        
         # Update booking status
         cur.execute("""
             UPDATE bookings 
@@ -331,31 +302,38 @@ def cancel_booking(booking_id):
             WHERE id = %s
         """, (booking_id,))
         
-        # Update room availability
-        room_id = booking['room_id']
-        cur.execute("""
-            UPDATE rooms 
-            SET available_count = %s,
-                is_available = CASE WHEN %s > 0 THEN 1 ELSE 0 END
-            WHERE id = %s
-        """, (new_available, new_available, room_id))
+        # Kembalikan stok malam yang dipegang booking ini
+        inventory.release_nights(cur, booking['room_id'], booking['check_in'], booking['check_out'])
         
         # Update payment jika ada
+        cur.execute("""
+            SELECT status, COUNT(*) as total FROM payments
+            WHERE booking_id = %s GROUP BY status
+        """, (booking_id,))
+        payment_statuses = cur.fetchall()
+        
         cur.execute("""
             UPDATE payments 
             SET status = 'failed'
             WHERE booking_id = %s
         """, (booking_id,))
         
+        counters.booking_status_changed(cur, booking['room_id'], booking['status'], 'cancelled')
+        for row in payment_statuses:
+            counters.payment_status_changed(cur, row['status'], 'failed', row['total'])
+        
         mysql.connection.commit()
+        dashboard_cache.invalidate()
+        availability_engine.record_release(booking['room_id'], booking['check_in'], booking['check_out'])
         
-        print(f"DEBUG: Cancellation successful")
+        log.info('booking.cancelled', booking_id=booking_id, room_id=booking['room_id'],
+                 previous_status=booking['status'])
         
         flash(f'✅ Booking {booking.get("booking_code", f"#{booking_id}")} cancelled successfully.', 'success')
         
-    except Exception as e:
+    except Exception:
         mysql.connection.rollback()
-        print(f"DEBUG: CANCEL ERROR - {str(e)}")
+        log.exception('booking.cancel_error', booking_id=booking_id)
         flash('❌ Failed to cancel booking.', 'danger')
     finally:
         cur.close()
@@ -0,0 +1,167 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+
+try:
+    import brotli
+except ImportError:  # tanpa modul brotli hanya varian .gz yang dibuat
+    brotli = None
+
+STATIC_DIR = 'static'
+SOURCE_DIRS = ('css', 'js')
+BUILD_DIR = 'dist'
+MANIFEST_PATH = os.path.join(STATIC_DIR, BUILD_DIR, 'manifest.json')
+
+# Encoding yang didukung, urutan = prioritas saat Accept-Encoding cocok
+ENCODINGS = (
+    ('br', '.br'),
+    ('gzip', '.gz'),
+)
+
+# ASSET PIPELINE
+# `python -m services.assets` meminify CSS/JS di static/css dan static/js,
+# menulis hasilnya ke static/dist/ dengan hash isi di nama file, membuat
+# varian .br dan .gz, lalu manifest.json (nama asli -> nama build).
+# services/static_files.py memakai manifest ini untuk url_for('static')
+# dan mengirim varian terkompresi sesuai Accept-Encoding.
+
+_manifest = {}
+_manifest_mtime = None
+
+def _strip_comments(source, line_comments):
+    """Remove /* */ (and optionally full-line //) comments outside strings"""
+    out = []
+    i = 0
+    length = len(source)
+    quote = None
+    line_blank = True
+    while i < length:
+        ch = source[i]
+        if quote:
+            out.append(ch)
+            if ch == '\\' and i + 1 < length:
+                out.append(source[i + 1])
+                i += 2
+                continue
+            if ch == quote:
+                quote = None
+            i += 1
+            continue
+
+        if ch in '"\'`':
+            quote = ch
+            line_blank = False
+            out.append(ch)
+            i += 1
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+        elif line_comments and line_blank and source.startswith('//', i):
+            # Hanya komentar satu baris penuh; // di tengah baris bisa saja regex/URL
+            end = source.find('\n', i)
+            i = length if end == -1 else end
+        else:
+            if ch == '\n':
+                line_blank = True
+            elif not ch.isspace():
+                line_blank = False
+            out.append(ch)
+            i += 1
+    return ''.join(out)
+
+def minify_css(source):
+    source = _strip_comments(source, line_comments=False)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    source = source.replace(';}', '}')
+    return source.strip()
+
+def minify_js(source):
+    """Conservative: drop comments, indentation and blank lines only"""
+    source = _strip_comments(source, line_comments=True)
+    lines = (line.strip() for line in source.splitlines())
+    return '\n'.join(line for line in lines if line) + '\n'
+
+MINIFIERS = {
+    '.css': minify_css,
+    '.js': minify_js
+}
+
+def build(static_dir=STATIC_DIR):
+    """Minify, fingerprint and precompress every CSS/JS asset; returns the manifest"""
+    build_root = os.path.join(static_dir, BUILD_DIR)
+    manifest = {}
+
+    for source_dir in SOURCE_DIRS:
+        directory = os.path.join(static_dir, source_dir)
+        if not os.path.isdir(directory):
+            continue
+
+        for name in sorted(os.listdir(directory)):
+            stem, ext = os.path.splitext(name)
+            if ext not in MINIFIERS:
+                continue
+
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                content = MINIFIERS[ext](f.read()).encode('utf-8')
+
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            built_name = f"{source_dir}/{stem}.{digest}{ext}"
+            built_path = os.path.join(build_root, *built_name.split('/'))
+            os.makedirs(os.path.dirname(built_path), exist_ok=True)
+
+            with open(built_path, 'wb') as f:
+                f.write(content)
+            # mtime=0 supaya hasil build identik di setiap mesin
+            with open(built_path + '.gz', 'wb') as f:
+                f.write(gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(built_path + '.br', 'wb') as f:
+                    f.write(brotli.compress(content, quality=11))
+
+            manifest[f"{source_dir}/{name}"] = f"{BUILD_DIR}/{built_name}"
+
+    os.makedirs(build_root, exist_ok=True)
+    with open(os.path.join(build_root, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    """Source name -> built name, re-read only when the file changed"""
+    global _manifest, _manifest_mtime
+    try:
+        mtime = os.path.getmtime(manifest_path)
+    except OSError:
+        _manifest, _manifest_mtime = {}, None
+        return _manifest
+
+    if mtime != _manifest_mtime:
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                _manifest = json.load(f)
+            _manifest_mtime = mtime
+        except (OSError, ValueError):
+            pass
+    return _manifest
+
+def resolve(filename):
+    """Built file for a static filename, or the filename itself"""
+    return load_manifest().get(filename, filename)
+
+def precompressed(path, accept_encoding):
+    """(encoding, path) of the best precompressed variant the client accepts"""
+    for encoding, suffix in ENCODINGS:
+        if accept_encoding[encoding] and os.path.isfile(path + suffix):
+            return encoding, path + suffix
+    return None, path
+
+if __name__ == '__main__':
+    result = build()
+    for source, built in sorted(result.items()):
+        print(f"{source} -> {built}")
+    if brotli is None:
+        print("Modul brotli belum terpasang, hanya varian .gz yang dibuat", file=sys.stderr)
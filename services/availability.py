@@ -0,0 +1,245 @@
+import threading
+import time
+from array import array
+from datetime import date, timedelta
+
+from services.inventory import HOLDING_STATUSES, to_date
+
+# Kira-kira 18 bulan ke depan
+HORIZON_DAYS = 550
+# Batas satu request kalender (18 bulan)
+MAX_CALENDAR_DAYS = 548
+# Worker lain juga menulis booking, jadi snapshot di-reload berkala
+REFRESH_SECONDS = 60
+
+# AVAILABILITY ENGINE
+# Snapshot in-process dari ledger room_inventory: satu array int per tipe
+# kamar, index = jumlah hari sejak base_date. Query availability cukup
+# slicing array, tanpa round-trip ke MySQL.
+
+class RoomOccupancy:
+    """Per-night reserved units for one room type"""
+    __slots__ = ('room_id', 'name', 'room_type', 'price', 'max_guests', 'capacity', 'is_available', 'reserved')
+
+    def __init__(self, room, horizon_days):
+        self.room_id = room['id']
+        self.name = room['name']
+        self.room_type = room['room_type']
+        self.price = float(room['price'] or 0)
+        self.max_guests = room['capacity'] or 2
+        self.capacity = room['available_count'] or 0
+        self.is_available = bool(room['is_available'])
+        self.reserved = array('i', bytes(4 * horizon_days))
+
+    def to_dict(self):
+        return {
+            'room_id': self.room_id,
+            'room_name': self.name,
+            'room_type': self.room_type,
+            'price_per_night': self.price,
+            'max_capacity': self.max_guests,
+            'units_on_sale': self.capacity,
+            'is_available': self.is_available
+        }
+
+class AvailabilityEngine:
+    """Per-room occupancy arrays answering free units per night"""
+
+    def __init__(self, horizon_days=HORIZON_DAYS, refresh_seconds=REFRESH_SECONDS):
+        self.horizon_days = horizon_days
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._rooms = {}
+        self._base_date = None
+        self._loaded_at = 0.0
+
+    # LOADING
+    def is_stale(self):
+        if self._base_date != date.today():
+            return True
+        return time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    def invalidate(self):
+        """Force a reload on the next query (room catalog changed)"""
+        self._loaded_at = 0.0
+
+    def load(self, cur):
+        """Rebuild every occupancy array from rooms + room_inventory"""
+        base_date = date.today()
+        end_date = base_date + timedelta(days=self.horizon_days)
+
+        cur.execute("""
+            SELECT id, name, room_type, price, capacity, available_count, is_available
+            FROM rooms
+        """)
+        rooms = {room['id']: RoomOccupancy(room, self.horizon_days) for room in cur.fetchall()}
+
+        cur.execute("""
+            SELECT room_id, stay_date, reserved_units
+            FROM room_inventory
+            WHERE stay_date >= %s AND stay_date < %s AND reserved_units > 0
+        """, (base_date, end_date))
+
+        for row in cur.fetchall():
+            occupancy = rooms.get(row['room_id'])
+            if occupancy:
+                occupancy.reserved[(to_date(row['stay_date']) - base_date).days] = row['reserved_units']
+
+        with self._lock:
+            self._rooms = rooms
+            self._base_date = base_date
+            self._loaded_at = time.monotonic()
+
+        return len(rooms)
+
+    def ensure_loaded(self, cursor_factory):
+        """Reload through `cursor_factory()` only when the snapshot is stale"""
+        if not self.is_stale():
+            return False
+
+        cur = cursor_factory()
+        try:
+            self.load(cur)
+        finally:
+            cur.close()
+        return True
+
+    # WRITES (dipanggil setelah commit)
+    def _shift(self, room_id, check_in, check_out, delta):
+        with self._lock:
+            occupancy = self._rooms.get(int(room_id))
+            if occupancy is None or self._base_date is None:
+                return
+            start, end = self._window(check_in, check_out)
+            reserved = occupancy.reserved
+            for i in range(start, end):
+                reserved[i] = max(reserved[i] + delta, 0)
+
+    def record_booking(self, room_id, check_in, check_out, units=1):
+        self._shift(room_id, check_in, check_out, units)
+
+    def record_release(self, room_id, check_in, check_out, units=1):
+        self._shift(room_id, check_in, check_out, -units)
+
+    def apply_status_change(self, room_id, check_in, check_out, old_status, new_status):
+        """Mirror of inventory.apply_status_change for the in-memory arrays"""
+        was_holding = old_status in HOLDING_STATUSES
+        is_holding = new_status in HOLDING_STATUSES
+
+        if was_holding and not is_holding:
+            self.record_release(room_id, check_in, check_out)
+        elif is_holding and not was_holding:
+            self.record_booking(room_id, check_in, check_out)
+
+    def set_capacity(self, room_id, capacity):
+        with self._lock:
+            occupancy = self._rooms.get(int(room_id))
+            if occupancy is not None:
+                occupancy.capacity = capacity
+
+    # QUERIES
+    def _window(self, check_in, check_out):
+        start = (to_date(check_in) - self._base_date).days
+        end = (to_date(check_out) - self._base_date).days
+        return max(start, 0), min(end, self.horizon_days)
+
+    def room(self, room_id):
+        return self._rooms.get(int(room_id))
+
+    def horizon(self):
+        """(first, end) dates the arrays cover; end is exclusive"""
+        with self._lock:
+            if self._base_date is None:
+                return None, None
+            return self._base_date, self._base_date + timedelta(days=self.horizon_days)
+
+    def free_by_night(self, room_id, check_in, check_out):
+        """Free units for each night in [check_in, check_out)"""
+        with self._lock:
+            occupancy = self._rooms.get(int(room_id))
+            if occupancy is None:
+                return None
+
+            first_night = to_date(check_in)
+            start, end = self._window(check_in, check_out)
+            capacity = occupancy.capacity
+
+            nights = []
+            for i in range(start, end):
+                nights.append({
+                    'date': (self._base_date + timedelta(days=i)).isoformat(),
+                    'available': max(capacity - occupancy.reserved[i], 0)
+                })
+
+            # Malam di luar horizon/lampau tidak dijual
+            expected = (to_date(check_out) - first_night).days
+            if len(nights) < expected:
+                return []
+            return nights
+
+    def min_free(self, room_id, check_in, check_out):
+        """Units bookable for the whole stay (0 when any night is full)"""
+        nights = self.free_by_night(room_id, check_in, check_out)
+        if not nights:
+            return 0
+        return min(night['available'] for night in nights)
+
+    def calendar(self, room_id, date_from, date_to):
+        """Remaining units and price for each night in [date_from, date_to).
+
+        Nights outside horizon() are left out; callers check the range first.
+        """
+        with self._lock:
+            occupancy = self._rooms.get(int(room_id))
+            if occupancy is None or self._base_date is None:
+                return None
+
+            start, end = self._window(date_from, date_to)
+            capacity = occupancy.capacity
+            price = occupancy.price
+            base_date = self._base_date
+
+            return [
+                {
+                    'date': (base_date + timedelta(days=i)).isoformat(),
+                    'available': max(capacity - reserved, 0),
+                    'price': price
+                }
+                for i, reserved in enumerate(occupancy.reserved[start:end], start)
+            ]
+
+    def search(self, check_in, check_out, guests=1, room_type=None,
+               min_price=None, max_price=None):
+        """Free units for the whole stay for every matching room type.
+
+        The arrays form a rooms x nights matrix; each row is reduced with a
+        single max() over the stay's slice, so a 365-night search across all
+        room types never leaves memory.
+        """
+        with self._lock:
+            if self._base_date is None:
+                return []
+
+            start, end = self._window(check_in, check_out)
+            expected = (to_date(check_out) - to_date(check_in)).days
+            if expected <= 0 or end - start < expected:
+                return []
+
+            results = []
+            for occupancy in self._rooms.values():
+                if not occupancy.is_available or occupancy.max_guests < guests:
+                    continue
+                if room_type and occupancy.room_type != room_type:
+                    continue
+                if min_price is not None and occupancy.price < min_price:
+                    continue
+                if max_price is not None and occupancy.price > max_price:
+                    continue
+
+                peak = max(occupancy.reserved[start:end])
+                results.append((occupancy, max(occupancy.capacity - peak, 0)))
+
+        results.sort(key=lambda item: item[0].price)
+        return results
+
+engine = AvailabilityEngine()
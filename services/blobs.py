@@ -0,0 +1,272 @@
+import hashlib
+import os
+import re
+import time
+import uuid
+from collections import Counter
+
+# File yatim baru dihapus setelah lewat masa tenggang ini, supaya upload
+# yang belum sempat commit tidak ikut terhapus
+GC_GRACE_SECONDS = 24 * 3600
+
+PAYMENTS = 'payments'
+ROOMS = 'rooms'
+
+# Ekstensi diturunkan dari isi file (magic bytes), bukan dari nama upload
+CONTENT_EXTENSIONS = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'%PDF-', 'pdf'),
+)
+
+REF_PATTERN = re.compile(r'blobs/([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})\.([a-z0-9]+)$')
+
+# BLOB STORE
+# Upload disimpan sekali per isi: nama file = SHA-256 isinya, di folder
+# shard blobs/ab/cd/. Kolom payments.proof_image dan rooms.images menyimpan
+# referensinya; tabel blobs menghitung berapa baris yang memakai tiap blob
+# (diubah di transaksi yang sama), dan collect_garbage() menghapus blob
+# yang sudah tidak dipakai siapa pun.
+
+def content_extension(head):
+    for signature, ext in CONTENT_EXTENSIONS:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return 'bin'
+
+def parse_ref(ref):
+    """(sha256, ext) of a blob reference, or None for legacy paths"""
+    match = REF_PATTERN.search(str(ref or '').strip())
+    if not match:
+        return None
+    return match.group(3), match.group(4)
+
+class BlobStore:
+    """Content-addressed files under `base_dir`/blobs/ab/cd/<sha256>.<ext>.
+
+    References are paths relative to `base_dir`, optionally prefixed with
+    `ref_prefix` (room images keep their full 'static/...' path).
+    """
+
+    def __init__(self, name, base_dir, ref_prefix=''):
+        self.name = name
+        self.base_dir = base_dir
+        self.ref_prefix = ref_prefix
+        self.root = os.path.join(base_dir, 'blobs')
+
+    def _relative(self, sha256, ext):
+        return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}"
+
+    def ref_for(self, sha256, ext):
+        return self.ref_prefix + self._relative(sha256, ext)
+
+    def path_for(self, sha256, ext):
+        return os.path.join(self.base_dir, *self._relative(sha256, ext).split('/'))
+
+    def label_of(self, ref):
+        """Non-content prefix of a reference (e.g. 'qris_simulated/')"""
+        parsed = parse_ref(ref)
+        if not parsed:
+            return ''
+        return ref.strip()[:-len(self.ref_for(*parsed))]
+
+    def path_for_ref(self, ref):
+        parsed = parse_ref(ref)
+        return self.path_for(*parsed) if parsed else None
+
+    def put(self, stream, label=''):
+        """Store the bytes of `stream`; hashes while writing (single pass).
+
+        Returns (ref, path, size). Identical content always lands on the same
+        path, so a re-upload just replaces the file with the same bytes.
+        """
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+
+        digest = hashlib.sha256()
+        head = b''
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as out:
+                for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+                    if len(head) < 16:
+                        head += chunk[:16 - len(head)]
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            return self._commit_tmp(tmp_path, digest.hexdigest(), content_extension(head), size, label)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_file(self, source_path, label='', move=False):
+        """Store an existing file (moved when `move` is true)"""
+        if not move:
+            with open(source_path, 'rb') as f:
+                return self.put(f, label)
+
+        digest = hashlib.sha256()
+        with open(source_path, 'rb') as f:
+            head = f.read(16)
+            f.seek(0)
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        size = os.path.getsize(source_path)
+        return self._commit_tmp(source_path, digest.hexdigest(), content_extension(head), size, label)
+
+    def _commit_tmp(self, tmp_path, sha256, ext, size, label):
+        path = self.path_for(sha256, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Replace juga menyegarkan mtime, jadi GC tidak menghapus blob yang
+        # baru saja dipakai ulang
+        os.replace(tmp_path, path)
+        return label + self.ref_for(sha256, ext), path, size
+
+    def iter_files(self):
+        """(sha256, ext, path) for every blob on disk"""
+        if not os.path.isdir(self.root):
+            return
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                parsed = parse_ref(path.replace(os.sep, '/'))
+                if parsed:
+                    yield parsed[0], parsed[1], path
+
+payment_store = BlobStore(PAYMENTS, os.path.join('uploads', 'payments'))
+room_store = BlobStore(ROOMS, os.path.join('static', 'uploads'), ref_prefix='static/uploads/')
+STORES = {PAYMENTS: payment_store, ROOMS: room_store}
+
+# REFERENCE COUNTS
+
+def split_refs(value):
+    """Blob references in a proof_image value or comma-joined images list"""
+    return [ref.strip() for ref in str(value or '').split(',') if parse_ref(ref)]
+
+def change_refs(cur, store, old_refs, new_refs):
+    """Apply the refcount difference between two reference lists"""
+    delta = Counter(parse_ref(ref) for ref in new_refs if parse_ref(ref))
+    delta.subtract(Counter(parse_ref(ref) for ref in old_refs if parse_ref(ref)))
+
+    for (sha256, ext), count in sorted(delta.items()):
+        if not count:
+            continue
+        cur.execute("""
+            INSERT INTO blobs (store, sha256, ext, ref_count)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE ref_count = ref_count + VALUES(ref_count)
+        """, (store, sha256, ext, count))
+
+def rebuild_refs(cur):
+    """Recount every blob reference from payments.proof_image and rooms.images.
+
+    Works with any DB-API cursor that returns dict rows; the caller commits.
+    """
+    counts = Counter()
+    cur.execute("SELECT proof_image FROM payments WHERE proof_image LIKE %s", ('%blobs/%',))
+    for row in cur.fetchall():
+        counts.update((PAYMENTS,) + parse_ref(ref) for ref in split_refs(row['proof_image']))
+    cur.execute("SELECT images FROM rooms WHERE images LIKE %s", ('%blobs/%',))
+    for row in cur.fetchall():
+        counts.update((ROOMS,) + parse_ref(ref) for ref in split_refs(row['images']))
+
+    cur.execute("UPDATE blobs SET ref_count = 0")
+    for (store, sha256, ext), count in counts.items():
+        cur.execute("""
+            INSERT INTO blobs (store, sha256, ext, ref_count)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE ref_count = VALUES(ref_count)
+        """, (store, sha256, ext, count))
+    return len(counts)
+
+def collect_garbage(cur, grace_seconds=GC_GRACE_SECONDS):
+    """Delete blobs nobody references anymore; commits the caller's transaction.
+
+    Covers rows whose ref_count dropped to zero and files that never got a
+    row (upload whose transaction rolled back). Anything touched within
+    `grace_seconds` is kept. Rows are deleted and committed first; files
+    are unlinked afterwards, so an upload of the same content that waited
+    on the row lock never ends up pointing at a deleted file.
+    """
+    cutoff = time.time() - grace_seconds
+    removed = {'blobs': 0, 'bytes': 0}
+
+    cur.execute("""
+        SELECT store, sha256, ext FROM blobs
+        WHERE ref_count <= 0 AND updated_at < NOW() - INTERVAL %s SECOND
+        FOR UPDATE
+    """, (grace_seconds,))
+    unused = [(row['store'], row['sha256'], row['ext']) for row in cur.fetchall()]
+    for store, sha256, _ in unused:
+        cur.execute("DELETE FROM blobs WHERE store = %s AND sha256 = %s", (store, sha256))
+    cur.connection.commit()
+
+    # Dibaca ulang setelah COMMIT: upload yang menunggu lock tadi sudah
+    # membuat barisnya lagi, dan file-nya tidak boleh dihapus
+    cur.execute("SELECT store, sha256 FROM blobs")
+    known = {(row['store'], row['sha256']) for row in cur.fetchall()}
+    cur.connection.commit()
+
+    candidates = []
+    for name, sha256, ext in unused:
+        store = STORES.get(name)
+        if store and (name, sha256) not in known:
+            candidates.append((store, store.path_for(sha256, ext)))
+    for name, store in STORES.items():
+        for sha256, _, path in store.iter_files():
+            if (name, sha256) not in known:
+                candidates.append((store, path))
+
+    for store, path in dict.fromkeys(candidates):
+        size = _remove_if_stale(store, path, cutoff)
+        if size is not None:
+            removed['blobs'] += 1
+            removed['bytes'] += size
+
+    for store in STORES.values():
+        tmp_dir = os.path.join(store.root, 'tmp')
+        if os.path.isdir(tmp_dir):
+            for filename in os.listdir(tmp_dir):
+                path = os.path.join(tmp_dir, filename)
+                try:
+                    if os.path.getmtime(path) <= cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    return removed
+
+def _remove_if_stale(store, path, cutoff):
+    """Unlink `path` unless it was (re)written after `cutoff`; returns its size.
+
+    The file is first renamed aside and the mtime checked on the renamed
+    copy: an upload that rewrote the same content just before is put back,
+    one that writes it afterwards simply creates a new file.
+    """
+    tmp_dir = os.path.join(store.root, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    trash = os.path.join(tmp_dir, f"gc-{uuid.uuid4().hex}")
+    try:
+        os.rename(path, trash)
+    except OSError:
+        return None
+
+    try:
+        if os.path.getmtime(trash) > cutoff:
+            # Baru dipakai ulang: isinya sama, jadi aman dikembalikan
+            if os.path.exists(path):
+                os.remove(trash)
+            else:
+                os.replace(trash, path)
+            return None
+        size = os.path.getsize(trash)
+        os.remove(trash)
+        return size
+    except OSError:
+        return None
@@ -0,0 +1,120 @@
+import random
+import string
+import threading
+from datetime import date
+
+from services.logs import get_logger
+
+log = get_logger('booking')
+
+# Hari ke-0 untuk bagian huruf kode (AAA = EPOCH, 26^3 hari ~ 48 tahun)
+EPOCH = date(2025, 1, 1)
+# Jumlah kode yang disewa sekaligus dari booking_code_blocks
+BLOCK_SIZE = 100
+# Bagian angka 6 digit: maksimal kode per hari
+PER_DAY = 1000000
+
+# BOOKING CODE ALLOCATOR
+# Kode tetap FH-XXX-NNNNNN, tapi XXX adalah nomor hari sejak EPOCH (basis 26)
+# dan NNNNNN nomor urut hari itu. Tiap worker menyewa blok BLOCK_SIZE nomor
+# lewat satu UPDATE di booking_code_blocks, lalu membagikan kode dari memori
+# tanpa query per kode. Kode unik tanpa retry, urut waktu, dan INSERT baru
+# selalu jatuh di ujung kanan idx_booking_code. Kode acak lama yang kebetulan
+# ada di rentang blok dilewati (satu range scan per blok).
+
+def day_letters(day_index):
+    letters = []
+    for _ in range(3):
+        day_index, digit = divmod(day_index, 26)
+        letters.append(string.ascii_uppercase[digit])
+    return ''.join(reversed(letters))
+
+def format_code(day_index, number):
+    return f"FH-{day_letters(day_index)}-{number:06d}"
+
+def random_code():
+    """Legacy random code; only used when a day's sequence is exhausted"""
+    letters = ''.join(random.choices(string.ascii_uppercase, k=3))
+    numbers = ''.join(random.choices(string.digits, k=6))
+    return f"FH-{letters}-{numbers}"
+
+class CodeAllocator:
+    """Hands out booking codes from per-worker leased blocks"""
+
+    def __init__(self, block_size=BLOCK_SIZE, epoch=EPOCH):
+        self.block_size = block_size
+        self.epoch = epoch
+        self._lock = threading.Lock()
+        self._day = None
+        self._next = 0
+        self._end = 0
+        self._taken = set()
+        self._exhausted_day = None
+        self.stats = {'leases': 0, 'issued': 0, 'skipped': 0, 'fallbacks': 0}
+
+    def next(self, cur):
+        """One unique code; `cur` is only used when a new block is needed.
+
+        Call outside a transaction: leasing commits on its own.
+        """
+        return self.take(cur, 1)[0]
+
+    def take(self, cur, count):
+        codes = []
+        with self._lock:
+            day = (date.today() - self.epoch).days
+            while len(codes) < count:
+                if day != self._day or self._next >= self._end:
+                    # Urutan hari ini habis: kode acak sampai ganti hari
+                    if day == self._exhausted_day or not self._lease(cur, day):
+                        self.stats['fallbacks'] += 1
+                        codes.append(random_code())
+                        continue
+
+                code = format_code(day, self._next)
+                self._next += 1
+                if code in self._taken:
+                    self.stats['skipped'] += 1
+                    continue
+                codes.append(code)
+            self.stats['issued'] += len(codes)
+        return codes
+
+    def _lease(self, cur, day):
+        """Reserve the next block of today's sequence; False when exhausted"""
+        cur.execute("INSERT IGNORE INTO booking_code_blocks (day, next_value) VALUES (%s, 0)", (day,))
+        cur.execute("""
+            UPDATE booking_code_blocks
+            SET next_value = LAST_INSERT_ID(next_value + %s)
+            WHERE day = %s
+        """, (self.block_size, day))
+        cur.execute("SELECT LAST_INSERT_ID() AS block_end")
+        end = cur.fetchone()['block_end']
+        start = end - self.block_size
+
+        if start >= PER_DAY:
+            cur.connection.commit()
+            self._exhausted_day = day
+            log.warning('booking_code.sequence_exhausted', day=day)
+            return False
+
+        end = min(end, PER_DAY)
+        cur.execute("""
+            SELECT booking_code FROM bookings
+            WHERE booking_code BETWEEN %s AND %s
+        """, (format_code(day, start), format_code(day, end - 1)))
+        taken = {row['booking_code'] for row in cur.fetchall()}
+        cur.connection.commit()
+
+        self._day = day
+        self._next = start
+        self._end = end
+        self._taken = taken
+        self.stats['leases'] += 1
+        return True
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, remaining=max(self._end - self._next, 0))
+
+allocator = CodeAllocator()
@@ -0,0 +1,348 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from datetime import date, datetime, timedelta
+
+from helpers import calculate_stay_price
+from services import inventory, counters, holds
+from services.availability import engine as availability_engine, MAX_CALENDAR_DAYS
+from services.booking_codes import allocator as code_allocator
+from services.dashboard import dashboard_cache
+from services.expiry import scheduler as expiry_scheduler, PAYMENT_WINDOW_HOURS
+from services.logs import get_logger
+
+log = get_logger('booking')
+
+# Alasan penolakan (route memilih redirect/status berdasarkan ini)
+ROOM_UNAVAILABLE = 'room_unavailable'
+INVALID = 'invalid'
+SOLD_OUT = 'sold_out'
+# Writer belum selesai; booking mungkin tetap ter-commit (jangan diulang)
+PROCESSING = 'processing'
+
+# Group commit: request untuk kamar yang sama yang datang dalam
+# GROUP_WINDOW_SECONDS digabung (maksimal GROUP_MAX_BATCH) jadi satu transaksi
+GROUP_WINDOW_SECONDS = 0.005
+GROUP_MAX_BATCH = 50
+GROUP_TIMEOUT_SECONDS = 30
+
+# Check-out paling jauh MAX_BOOKING_DAYS dari hari ini (sama dengan kalender)
+MAX_BOOKING_DAYS = MAX_CALENDAR_DAYS
+
+# BOOKING COMMIT
+# Satu jalur untuk POST /book dan /api/user/create-booking. prepare()
+# memvalidasi input dan menghitung harga tanpa transaksi; create() membuka
+# transaksi hanya untuk INSERT booking + payment, lalu reservasi stok
+# sebagai statement terakhir (satu UPDATE bersyarat di room_inventory),
+# jadi lock baris ledger hanya dipegang dari UPDATE itu sampai COMMIT.
+
+class BookingError(Exception):
+    """Rejected booking; `status` is the HTTP status"""
+
+    def __init__(self, message, status=400, reason=INVALID):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+def load_room(cur, room_id):
+    """Room row for a booking (no lock; stock is checked in the ledger)"""
+    cur.execute("""
+        SELECT id, name, price, capacity, available_count, is_available
+        FROM rooms WHERE id = %s
+    """, (room_id,))
+    return cur.fetchone()
+
+def prepare(room, user_id, check_in, check_out, guests, special_requests='', guest=None,
+            hold_token=None):
+    """Validate and price a booking; raises BookingError"""
+    if not room or room['is_available'] != 1 or (room['available_count'] or 0) <= 0:
+        raise BookingError('Room not available or fully booked.', 400, ROOM_UNAVAILABLE)
+
+    try:
+        guests = int(guests)
+    except (TypeError, ValueError):
+        raise BookingError('Invalid number of guests.')
+    if guests > room['capacity']:
+        raise BookingError(f'Maximum capacity for this room is {room["capacity"]} guests.')
+
+    try:
+        check_in_date = datetime.strptime(str(check_in), '%Y-%m-%d').date()
+        check_out_date = datetime.strptime(str(check_out), '%Y-%m-%d').date()
+    except ValueError:
+        raise BookingError('Invalid date format.')
+
+    nights = (check_out_date - check_in_date).days
+    if nights <= 0:
+        raise BookingError('Check-out date must be after check-in date.')
+    if check_in_date < date.today():
+        raise BookingError('Check-in date cannot be in the past.')
+    if (check_out_date - date.today()).days > MAX_BOOKING_DAYS:
+        raise BookingError(f'Bookings can only be made up to {MAX_BOOKING_DAYS} days ahead.')
+
+    booking = {
+        'user_id': user_id,
+        'room_id': room['id'],
+        'check_in': check_in_date,
+        'check_out': check_out_date,
+        'nights': nights,
+        'guests': guests,
+        'special_requests': special_requests or '',
+        'guest': guest or {},
+        'hold_token': hold_token or None
+    }
+    booking.update(calculate_stay_price(room['price'], nights))
+    return booking
+
+BOOKING_COLUMNS = """user_id, room_id, check_in, check_out, guests,
+    total_price, subtotal, tax_amount, service_charge,
+    special_requests, status, booking_code,
+    guest_name, guest_email, guest_phone, guest_country"""
+BOOKING_PLACEHOLDERS = ', '.join(['%s'] * 16)
+
+def booking_row(booking, booking_code):
+    guest = booking['guest']
+    return (
+        booking['user_id'], booking['room_id'], booking['check_in'], booking['check_out'],
+        booking['guests'], booking['total_price'], booking['subtotal'],
+        booking['tax_amount'], booking['service_charge'], booking['special_requests'],
+        'waiting_payment', booking_code,
+        guest.get('name', ''), guest.get('email', ''), guest.get('phone', ''),
+        guest.get('country', 'Indonesia')
+    )
+
+def create(cur, booking):
+    """Commit a prepared booking; returns the booking/payment summary.
+
+    A live hold (booking['hold_token']) is converted instead of reserving
+    stock again. Raises BookingError(409) when a night sold out; the
+    transaction is rolled back on any failure.
+    """
+    # Baris ledger dibuat (dan di-commit) sebelum transaksi booking
+    inventory.ensure_nights(cur, booking['room_id'], booking['check_in'], booking['check_out'])
+
+    # Kode dari blok yang disewa worker ini (lihat services/booking_codes.py)
+    booking_code = code_allocator.next(cur)
+    expiration_date = datetime.now() + timedelta(hours=PAYMENT_WINDOW_HOURS)
+
+    cur.execute("START TRANSACTION")
+    try:
+        cur.execute(f"""
+            INSERT INTO bookings ({BOOKING_COLUMNS})
+            VALUES ({BOOKING_PLACEHOLDERS})
+        """, booking_row(booking, booking_code))
+        booking_id = cur.lastrowid
+
+        cur.execute("""
+            INSERT INTO payments
+            (booking_id, amount, payment_method, status, expiration_date)
+            VALUES (%s, %s, 'pending', 'pending', %s)
+        """, (booking_id, booking['total_price'], expiration_date))
+
+        counters.booking_status_changed(cur, booking['room_id'], None, 'waiting_payment')
+        counters.payment_status_changed(cur, None, 'pending')
+
+        # Stok hold sudah tercatat di ledger, cukup pindahkan ke booking ini
+        hold_id = holds.claim(cur, booking.get('hold_token'), booking)
+        if hold_id:
+            holds.convert(cur, hold_id, booking_id)
+        # Statement terakhir sebelum COMMIT: satu UPDATE bersyarat per stay
+        elif not inventory.reserve_nights(cur, booking['room_id'], booking['check_in'], booking['check_out']):
+            cur.connection.rollback()
+            raise BookingError('Room is fully booked for the selected dates.', 409, SOLD_OUT)
+
+        cur.connection.commit()
+    except BookingError:
+        raise
+    except Exception:
+        cur.connection.rollback()
+        raise
+
+    dashboard_cache.invalidate()
+    return committed(booking, booking_id, booking_code, expiration_date, from_hold=bool(hold_id))
+
+def committed(booking, booking_id, booking_code, expiration_date, from_hold=False):
+    """Post-commit bookkeeping; returns the booking/payment summary"""
+    # Unit dari hold sudah dihitung engine saat holds.place()
+    if not from_hold:
+        availability_engine.record_booking(booking['room_id'], booking['check_in'], booking['check_out'])
+    expiry_scheduler.schedule(booking_id, expiration_date)
+    return {
+        'booking_id': booking_id,
+        'booking_code': booking_code,
+        'total_price': booking['total_price'],
+        'status': 'waiting_payment',
+        'expiration_date': expiration_date
+    }
+
+def create_many(cur, batch):
+    """Commit several prepared bookings for one room in one transaction.
+
+    Returns one entry per booking, in order: the create() summary or a
+    BookingError. Stock is admitted in arrival order from a snapshot and
+    reserved with one UPDATE; if another worker took stock in between, the
+    batch is rolled back and every booking is retried on its own.
+    """
+    room_id = batch[0]['room_id']
+    for check_in, check_out in {(b['check_in'], b['check_out']) for b in batch}:
+        inventory.ensure_nights(cur, room_id, check_in, check_out)
+
+    cur.execute("""
+        SELECT stay_date, total_units - reserved_units AS free_units
+        FROM room_inventory
+        WHERE room_id = %s AND stay_date >= %s AND stay_date < %s
+    """, (room_id, min(b['check_in'] for b in batch), max(b['check_out'] for b in batch)))
+    free = {inventory.to_date(row['stay_date']): row['free_units'] for row in cur.fetchall()}
+
+    results = [None] * len(batch)
+    admitted = []
+    demand = Counter()
+    for index, booking in enumerate(batch):
+        nights = inventory.stay_nights(booking['check_in'], booking['check_out'])
+        if all(free.get(night, 0) - demand[night] >= 1 for night in nights):
+            demand.update(nights)
+            admitted.append(index)
+        else:
+            results[index] = BookingError('Room is fully booked for the selected dates.', 409, SOLD_OUT)
+
+    if not admitted:
+        return results
+
+    expiration_date = datetime.now() + timedelta(hours=PAYMENT_WINDOW_HOURS)
+    codes = dict(zip(admitted, code_allocator.take(cur, len(admitted))))
+
+    cur.execute("START TRANSACTION")
+    try:
+        rows = ", ".join([f"({BOOKING_PLACEHOLDERS})"] * len(admitted))
+        cur.execute(f"INSERT INTO bookings ({BOOKING_COLUMNS}) VALUES {rows}",
+                    [value for index in admitted for value in booking_row(batch[index], codes[index])])
+
+        # Id auto-increment multi-row INSERT belum tentu berurutan
+        placeholders = ', '.join(['%s'] * len(admitted))
+        cur.execute(f"SELECT id, booking_code FROM bookings WHERE booking_code IN ({placeholders})",
+                    [codes[index] for index in admitted])
+        ids = {row['booking_code']: row['id'] for row in cur.fetchall()}
+
+        cur.executemany("""
+            INSERT INTO payments
+            (booking_id, amount, payment_method, status, expiration_date)
+            VALUES (%s, %s, 'pending', 'pending', %s)
+        """, [(ids[codes[index]], batch[index]['total_price'], expiration_date) for index in admitted])
+
+        counters.booking_status_changed(cur, room_id, None, 'waiting_payment', len(admitted))
+        counters.payment_status_changed(cur, None, 'pending', len(admitted))
+
+        reserved = inventory.reserve_demand(cur, room_id, demand)
+        if reserved:
+            cur.connection.commit()
+        else:
+            cur.connection.rollback()
+    except Exception:
+        cur.connection.rollback()
+        log.exception('booking.group_error', room_id=room_id, size=len(admitted))
+        reserved = False
+
+    if not reserved:
+        # Hasil tetap per request: tiap booking dicoba sendiri-sendiri
+        for index in admitted:
+            try:
+                results[index] = create(cur, batch[index])
+            except Exception as e:
+                results[index] = e
+        return results
+
+    dashboard_cache.invalidate()
+    for index in admitted:
+        results[index] = committed(batch[index], ids[codes[index]], codes[index], expiration_date)
+    return results
+
+# GROUP COMMIT
+# Mode opsional untuk lonjakan (flash sale): satu thread writer per kamar
+# mengumpulkan request yang datang hampir bersamaan, lalu create_many()
+# menulis semuanya dalam satu transaksi. Request menunggu Future-nya dan
+# tetap mendapat hasil sendiri (sukses, habis, atau error).
+
+class GroupCommitWriter:
+    """Per-room writer threads that batch concurrent bookings"""
+
+    def __init__(self, window_seconds=GROUP_WINDOW_SECONDS, max_batch=GROUP_MAX_BATCH):
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self._app = None
+        self._mysql = None
+        self._lock = threading.Lock()
+        self._queues = {}
+        self.stats = {'batches': 0, 'bookings': 0}
+
+    @property
+    def running(self):
+        return self._app is not None
+
+    def start(self, app, mysql):
+        self._app = app
+        self._mysql = mysql
+
+    def submit(self, booking, timeout=GROUP_TIMEOUT_SECONDS):
+        future = Future()
+        self._queue_for(booking['room_id']).put((booking, future))
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            raise BookingError('Booking is still being processed, please check My Bookings.', 202, PROCESSING)
+
+    def _queue_for(self, room_id):
+        with self._lock:
+            pending = self._queues.get(room_id)
+            if pending is None:
+                pending = self._queues[room_id] = queue.Queue()
+                threading.Thread(target=self._run, args=(pending,),
+                                 name=f'booking-writer-{room_id}', daemon=True).start()
+            return pending
+
+    def _run(self, pending):
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + self.window_seconds
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        try:
+            with self._app.app_context():
+                cur = self._mysql.connection.cursor()
+                try:
+                    results = create_many(cur, [booking for booking, _ in batch])
+                finally:
+                    cur.close()
+        except Exception as e:
+            log.exception('booking.group_error', size=len(batch))
+            results = [e] * len(batch)
+
+        with self._lock:
+            self.stats['batches'] += 1
+            self.stats['bookings'] += len(batch)
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def snapshot(self):
+        return dict(self.stats, running=self.running, rooms=len(self._queues))
+
+writer = GroupCommitWriter()
+
+def submit(cur, booking):
+    """create() in the request, or through the group-commit writer when started"""
+    # Booking dengan hold tidak rebutan stok, jadi tidak perlu digabung
+    if writer.running and not booking.get('hold_token'):
+        return writer.submit(booking)
+    return create(cur, booking)
@@ -0,0 +1,110 @@
+import threading
+import time
+
+# Seberapa sering worker mengecek versi katalog di database
+VERSION_CHECK_SECONDS = 5
+
+# CATALOG CACHE
+# Salinan rooms + venues per proses, beserta hasil olahan halaman publik
+# (view) yang di-memo per versi. Admin yang mengubah kamar memanggil
+# bump() di transaksinya dan invalidate() setelah COMMIT; worker lain
+# melihat versi baru paling lambat VERSION_CHECK_SECONDS kemudian dan
+# membangun ulang katalognya.
+
+class CatalogCache:
+    """Versioned process-local copy of the room/venue catalog"""
+
+    def __init__(self, check_seconds=VERSION_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._generation = 0
+        self._rooms = ()
+        self._rooms_by_id = {}
+        self._venues = ()
+        self._views = {}
+
+    @property
+    def version(self):
+        return self._version
+
+    def bump(self, cur):
+        """Publish a new catalog version inside the caller's transaction.
+
+        Call invalidate() after the COMMIT: invalidating earlier lets a
+        concurrent reader cache the old version again.
+        """
+        cur.execute("""
+            INSERT INTO cache_versions (name, version) VALUES ('catalog', 1)
+            ON DUPLICATE KEY UPDATE version = version + 1
+        """)
+
+    def invalidate(self):
+        self._generation += 1
+        self._checked_at = 0.0
+        self._version = None
+
+    def _refresh(self, cursor_factory):
+        if self._version is not None and time.monotonic() - self._checked_at <= self.check_seconds:
+            return
+
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._checked_at <= self.check_seconds:
+                return
+
+            generation = self._generation
+            cur = cursor_factory()
+            try:
+                cur.execute("SELECT version FROM cache_versions WHERE name = 'catalog'")
+                row = cur.fetchone()
+                version = row['version'] if row else 0
+
+                if version != self._version:
+                    cur.execute("SELECT * FROM rooms ORDER BY id")
+                    rooms = tuple(dict(room) for room in cur.fetchall())
+                    cur.execute("SELECT * FROM venues ORDER BY id")
+                    venues = tuple(dict(venue) for venue in cur.fetchall())
+
+                    self._rooms = rooms
+                    self._rooms_by_id = {room['id']: room for room in rooms}
+                    self._venues = venues
+                    self._views = {}
+                    self._version = version
+            finally:
+                cur.close()
+
+            # invalidate() selama membaca: versi yang dibaca mungkin sudah lama
+            if generation == self._generation:
+                self._checked_at = time.monotonic()
+
+    def current_version(self, cursor_factory):
+        """Catalog version, re-checked at most every check_seconds"""
+        self._refresh(cursor_factory)
+        return self._version
+
+    def rooms(self, cursor_factory):
+        """Every room row (treat as read-only)"""
+        self._refresh(cursor_factory)
+        return self._rooms
+
+    def venues(self, cursor_factory):
+        self._refresh(cursor_factory)
+        return self._venues
+
+    def room(self, room_id, cursor_factory):
+        self._refresh(cursor_factory)
+        try:
+            return self._rooms_by_id.get(int(room_id))
+        except (TypeError, ValueError):
+            return None
+
+    def view(self, name, builder, cursor_factory):
+        """Memoize `builder(rooms, venues)` until the catalog version changes"""
+        self._refresh(cursor_factory)
+        views = self._views
+        if name not in views:
+            views[name] = builder(self._rooms, self._venues)
+        return views[name]
+
+catalog = CatalogCache()
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: cukup lock per proses
+    fcntl = None
+
+CHUNK_DIR = os.path.join('uploads', 'chunks')
+# Batas sama dengan upload biasa di handle_ajax_payment()
+MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+READ_SIZE = 64 * 1024
+# Sesi yang tidak selesai dihapus setelah ini
+SESSION_TTL_SECONDS = 24 * 3600
+
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# CHUNKED UPLOADS
+# Bukti bayar bisa dikirim per potongan: klien membuat sesi (ukuran +
+# SHA-256 file), lalu mengirim potongan dengan header Upload-Offset.
+# Potongan ditulis langsung ke disk per READ_SIZE, jadi memori tetap kecil,
+# dan upload yang putus dilanjutkan dari offset terakhir yang tersimpan.
+
+class UploadSessionError(Exception):
+    """Rejected chunked-upload operation; `status` is the HTTP status"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+def _session_dir(upload_id):
+    return os.path.join(CHUNK_DIR, upload_id)
+
+def _data_path(upload_id):
+    return os.path.join(_session_dir(upload_id), 'data')
+
+def _write_meta(meta):
+    meta_path = os.path.join(_session_dir(meta['upload_id']), 'meta.json')
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+class _SessionLock:
+    """Serializes appends to one session across threads (and processes)"""
+
+    def __init__(self, upload_id):
+        with _locks_guard:
+            self._lock = _locks.setdefault(upload_id, threading.Lock())
+        self._path = os.path.join(_session_dir(upload_id), 'lock')
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if fcntl is not None:
+            self._file = open(self._path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+        self._lock.release()
+
+def create(owner_id, booking_id, size, sha256):
+    """Start a session for a file of `size` bytes with the given SHA-256"""
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadSessionError('Invalid file size.')
+    if size <= 0 or size > MAX_UPLOAD_SIZE:
+        raise UploadSessionError('File size must be less than 5MB.')
+
+    sha256 = str(sha256 or '').lower()
+    if not re.match(r'^[0-9a-f]{64}$', sha256):
+        raise UploadSessionError('Invalid SHA-256 checksum.')
+
+    purge_expired()
+
+    upload_id = uuid.uuid4().hex
+    os.makedirs(_session_dir(upload_id))
+    open(_data_path(upload_id), 'wb').close()
+
+    meta = {
+        'upload_id': upload_id,
+        'owner_id': owner_id,
+        'booking_id': booking_id,
+        'size': size,
+        'sha256': sha256,
+        'created_at': time.time()
+    }
+    _write_meta(meta)
+    return meta
+
+def load(upload_id, owner_id, booking_id):
+    """Session metadata, or UploadSessionError(404) if it is not ours"""
+    if not UPLOAD_ID_PATTERN.match(str(upload_id)):
+        raise UploadSessionError('Upload not found.', 404)
+    try:
+        with open(os.path.join(_session_dir(upload_id), 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        raise UploadSessionError('Upload not found.', 404)
+
+    if meta['owner_id'] != owner_id or meta['booking_id'] != booking_id:
+        raise UploadSessionError('Upload not found.', 404)
+    return meta
+
+def current_offset(meta):
+    try:
+        return os.path.getsize(_data_path(meta['upload_id']))
+    except OSError:
+        raise UploadSessionError('Upload not found.', 404)
+
+def append(meta, offset, stream, length):
+    """Append one chunk read from `stream` at `offset`; returns the new offset.
+
+    A chunk whose offset does not match what is stored is refused with 409
+    and the stored offset, so the client can resume from there.
+    """
+    try:
+        offset = int(offset)
+        length = int(length)
+    except (TypeError, ValueError):
+        raise UploadSessionError('Upload-Offset and Content-Length are required.')
+    if length <= 0 or length > MAX_CHUNK_SIZE:
+        raise UploadSessionError(f'Chunk size must be between 1 and {MAX_CHUNK_SIZE} bytes.')
+
+    with _SessionLock(meta['upload_id']):
+        stored = current_offset(meta)
+        if offset != stored:
+            raise UploadSessionError('Offset mismatch.', 409, stored)
+        if stored + length > meta['size']:
+            raise UploadSessionError('Chunk exceeds declared file size.', 413, stored)
+
+        remaining = length
+        with open(_data_path(meta['upload_id']), 'ab') as out:
+            while remaining:
+                chunk = stream.read(min(READ_SIZE, remaining))
+                if not chunk:
+                    break
+                out.write(chunk)
+                remaining -= len(chunk)
+
+        # Koneksi putus di tengah potongan: simpan yang sudah masuk saja,
+        # klien melanjutkan dari offset ini
+        return current_offset(meta)
+
+def finish(meta):
+    """Verify size and checksum; returns the path of the complete file"""
+    data_path = _data_path(meta['upload_id'])
+    with _SessionLock(meta['upload_id']):
+        stored = current_offset(meta)
+        if stored != meta['size']:
+            raise UploadSessionError('Upload is incomplete.', 409, stored)
+
+        digest = hashlib.sha256()
+        with open(data_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(READ_SIZE), b''):
+                digest.update(chunk)
+
+        if digest.hexdigest() != meta['sha256']:
+            # Data rusak: mulai ulang dari nol
+            open(data_path, 'wb').close()
+            raise UploadSessionError('Checksum mismatch, please upload again.', 422, 0)
+
+    return data_path
+
+def discard(meta):
+    shutil.rmtree(_session_dir(meta['upload_id']), ignore_errors=True)
+    with _locks_guard:
+        _locks.pop(meta['upload_id'], None)
+
+def purge_expired(ttl_seconds=SESSION_TTL_SECONDS):
+    if not os.path.isdir(CHUNK_DIR):
+        return
+    cutoff = time.time() - ttl_seconds
+    for upload_id in os.listdir(CHUNK_DIR):
+        session_dir = _session_dir(upload_id)
+        try:
+            # mtime file data ikut berubah setiap potongan masuk
+            touched = max(os.path.getmtime(session_dir), os.path.getmtime(_data_path(upload_id)))
+        except OSError:
+            touched = 0
+        if touched < cutoff:
+            shutil.rmtree(session_dir, ignore_errors=True)
@@ -0,0 +1,92 @@
+import random
+
+# Satu counter dipecah ke beberapa slot supaya booking paralel tidak
+# antri di satu baris yang sama
+COUNTER_SLOTS = 8
+
+BOOKING = 'booking'
+PAYMENT = 'payment'
+
+# STATUS COUNTERS
+# Tabel status_counters menyimpan jumlah booking per (kamar, status) dan
+# jumlah payment per status. Counter diubah di transaksi yang sama dengan
+# perubahan status, jadi pembacaan cukup menjumlah beberapa baris kecil.
+# rebuild_counters() menghitung ulang semuanya dari tabel asli.
+
+def bump(cur, entity, status, delta=1, scope_id=0):
+    """Add `delta` to one status counter inside the caller's transaction"""
+    if not status or not delta:
+        return
+    cur.execute("""
+        INSERT INTO status_counters (entity, scope_id, status, slot, total)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE total = total + VALUES(total)
+    """, (entity, scope_id, status, random.randrange(COUNTER_SLOTS), delta))
+
+def move(cur, entity, old_status, new_status, scope_id=0, count=1):
+    """Move `count` items from one status to another"""
+    if old_status == new_status:
+        return
+    bump(cur, entity, old_status, -count, scope_id)
+    bump(cur, entity, new_status, count, scope_id)
+
+def booking_status_changed(cur, room_id, old_status, new_status, count=1):
+    move(cur, BOOKING, old_status, new_status, room_id, count)
+
+def payment_status_changed(cur, old_status, new_status, count=1):
+    move(cur, PAYMENT, old_status, new_status, 0, count)
+
+def drop_scope(cur, entity, scope_id):
+    """Remove every counter of one scope (e.g. a deleted room)"""
+    cur.execute("""
+        DELETE FROM status_counters
+        WHERE entity = %s AND scope_id = %s
+    """, (entity, scope_id))
+
+def read(cur, entity, scope_id=None):
+    """Status -> total for one room (scope_id) or for every scope"""
+    if scope_id is None:
+        cur.execute("""
+            SELECT status, SUM(total) as total
+            FROM status_counters
+            WHERE entity = %s
+            GROUP BY status
+        """, (entity,))
+    else:
+        cur.execute("""
+            SELECT status, SUM(total) as total
+            FROM status_counters
+            WHERE entity = %s AND scope_id = %s
+            GROUP BY status
+        """, (entity, scope_id))
+
+    return {row['status']: max(int(row['total'] or 0), 0) for row in cur.fetchall()}
+
+def booking_counts(cur, room_id=None):
+    return read(cur, BOOKING, room_id)
+
+def payment_counts(cur):
+    return read(cur, PAYMENT, 0)
+
+def rebuild_counters(cur):
+    """Reconcile every counter from the bookings and payments tables.
+
+    Works with any DB-API cursor that returns dict rows; the caller commits.
+    """
+    cur.execute("DELETE FROM status_counters")
+    cur.execute("""
+        INSERT INTO status_counters (entity, scope_id, status, slot, total)
+        SELECT %s, room_id, status, 0, COUNT(*)
+        FROM bookings
+        WHERE status IS NOT NULL
+        GROUP BY room_id, status
+    """, (BOOKING,))
+    bookings = cur.rowcount
+    cur.execute("""
+        INSERT INTO status_counters (entity, scope_id, status, slot, total)
+        SELECT %s, 0, status, 0, COUNT(*)
+        FROM payments
+        WHERE status IS NOT NULL
+        GROUP BY status
+    """, (PAYMENT,))
+    return bookings + cur.rowcount
@@ -0,0 +1,111 @@
+import threading
+import time
+
+# Snapshot dashboard admin boleh basi paling lama sekian detik
+DASHBOARD_TTL = 30
+
+# DASHBOARD STATS
+# Semua counter dashboard dihitung dalam satu query, lalu disimpan sebagai
+# snapshot in-process. Write booking/payment memanggil invalidate() supaya
+# angka berikutnya langsung segar. available_rooms adalah unit kosong malam
+# ini menurut room_inventory (kamar tanpa baris ledger dihitung penuh kosong).
+
+COUNTERS_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM rooms) as total_rooms,
+        (SELECT COALESCE(SUM(GREATEST(COALESCE(i.total_units, r.available_count)
+                                      - COALESCE(i.reserved_units, 0), 0)), 0)
+         FROM rooms r
+         LEFT JOIN room_inventory i ON i.room_id = r.id AND i.stay_date = CURDATE()
+         WHERE r.is_available = 1) as available_rooms,
+        (SELECT COUNT(*) FROM users) as total_users,
+        b.total_bookings,
+        b.total_revenue,
+        b.pending_bookings,
+        b.today_bookings
+    FROM (
+        SELECT
+            COUNT(*) as total_bookings,
+            COALESCE(SUM(CASE WHEN status = 'completed' THEN total_price ELSE 0 END), 0) as total_revenue,
+            COALESCE(SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END), 0) as pending_bookings,
+            COALESCE(SUM(CASE WHEN created_at >= CURDATE() THEN 1 ELSE 0 END), 0) as today_bookings
+        FROM bookings
+    ) b
+"""
+
+RECENT_BOOKINGS_QUERY = """
+    SELECT
+        b.id, b.booking_code, b.status, b.total_price, b.guests,
+        b.check_in, b.check_out, b.created_at,
+        r.name as room_name,
+        u.first_name, u.last_name, u.email
+    FROM bookings b
+    JOIN rooms r ON b.room_id = r.id
+    LEFT JOIN users u ON b.user_id = u.id
+    ORDER BY b.created_at DESC
+    LIMIT 8
+"""
+
+RECENT_USERS_QUERY = """
+    SELECT id, first_name, last_name, email, created_at
+    FROM users
+    ORDER BY created_at DESC
+    LIMIT 5
+"""
+
+class DashboardCache:
+    """TTL-cached snapshot of the admin dashboard counters and lists"""
+
+    def __init__(self, ttl=DASHBOARD_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    def get(self, cursor_factory):
+        """Return the snapshot, reloading through `cursor_factory()` when stale"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._loaded_at <= self.ttl:
+            return snapshot
+
+        with self._lock:
+            # Request lain mungkin sudah reload selagi kita menunggu lock
+            if self._snapshot is not None and time.monotonic() - self._loaded_at <= self.ttl:
+                return self._snapshot
+
+            cur = cursor_factory()
+            try:
+                snapshot = self.load(cur)
+            finally:
+                cur.close()
+
+            self._snapshot = snapshot
+            self._loaded_at = time.monotonic()
+            return snapshot
+
+    def load(self, cur):
+        cur.execute(COUNTERS_QUERY)
+        counters = cur.fetchone() or {}
+
+        cur.execute(RECENT_BOOKINGS_QUERY)
+        recent_bookings = cur.fetchall()
+
+        cur.execute(RECENT_USERS_QUERY)
+        recent_users = cur.fetchall()
+
+        return {
+            'total_rooms': counters.get('total_rooms') or 0,
+            'total_bookings': counters.get('total_bookings') or 0,
+            'total_users': counters.get('total_users') or 0,
+            'total_revenue': counters.get('total_revenue') or 0,
+            'available_rooms': counters.get('available_rooms') or 0,
+            'pending_bookings': counters.get('pending_bookings') or 0,
+            'today_bookings': counters.get('today_bookings') or 0,
+            'recent_bookings': recent_bookings,
+            'recent_users': recent_users
+        }
+
+dashboard_cache = DashboardCache()
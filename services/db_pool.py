@@ -0,0 +1,259 @@
+import threading
+import time
+from collections import deque
+
+import MySQLdb
+from MySQLdb import cursors
+from flask import g
+
+DEFAULT_POOL_SIZE = 10
+# Koneksi idle lebih lama dari ini ditutup
+DEFAULT_MAX_IDLE = 300
+# Koneksi idle lebih lama dari ini dicek dulu dengan SELECT 1
+DEFAULT_CHECK_AFTER = 30
+DEFAULT_CHECKOUT_TIMEOUT = 10
+
+# CONNECTION POOL
+# Pengganti Flask-MySQLdb: koneksi dipinjam sekali per app context lalu
+# dikembalikan ke pool saat teardown, jadi request tidak lagi membayar
+# TCP connect + auth MySQL setiap kali.
+
+class PoolExhausted(Exception):
+    pass
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections created by `connect()`"""
+
+    def __init__(self, connect, size=DEFAULT_POOL_SIZE, max_idle=DEFAULT_MAX_IDLE,
+                 check_after=DEFAULT_CHECK_AFTER, timeout=DEFAULT_CHECKOUT_TIMEOUT):
+        self._connect = connect
+        self.size = size
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.timeout = timeout
+        self._idle = deque()
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'evicted_idle': 0,
+            'failed_checks': 0,
+            'waits': 0,
+            'timeouts': 0
+        }
+
+    def checkout(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn, needs_check, expired = None, False, []
+            with self._cond:
+                while True:
+                    while self._idle:
+                        candidate, returned_at = self._idle.pop()
+                        idle_for = time.monotonic() - returned_at
+                        if idle_for > self.max_idle:
+                            self._stats['evicted_idle'] += 1
+                            expired.append(candidate)
+                            continue
+                        conn, needs_check = candidate, idle_for > self.check_after
+                        break
+
+                    # Slot dipegang dulu, koneksi dicek/dibuat di luar lock
+                    if conn is not None or self._in_use < self.size:
+                        self._in_use += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        for candidate in expired:
+                            self._close(candidate)
+                        raise PoolExhausted(f'No database connection free after {self.timeout}s')
+                    self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+
+            for candidate in expired:
+                self._close(candidate)
+
+            if conn is None:
+                break
+
+            # SELECT 1 tanpa lock: server yang lambat tidak menahan checkout lain
+            if needs_check and not self._is_healthy(conn):
+                self._close(conn)
+                with self._cond:
+                    self._in_use -= 1
+                    self._stats['failed_checks'] += 1
+                    self._cond.notify()
+                continue
+
+            with self._cond:
+                self._stats['reused'] += 1
+            return conn
+
+        # Koneksi baru dibuat di luar lock
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+
+    def checkin(self, conn, discard=False):
+        if not discard:
+            try:
+                # Transaksi yang tidak di-commit tidak boleh bocor ke peminjam berikutnya
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._evict_oldest()
+            self._cond.notify()
+
+    def evict_idle(self):
+        """Close every idle connection unused for longer than max_idle"""
+        with self._cond:
+            return self._evict_oldest()
+
+    def _evict_oldest(self):
+        # Deque dipakai LIFO, jadi koneksi paling lama selalu di kiri
+        now = time.monotonic()
+        evicted = 0
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            self._close(conn)
+            evicted += 1
+        self._stats['evicted_idle'] += evicted
+        return evicted
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                **self._stats
+            }
+
+    def _is_healthy(self, conn):
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            return True
+        except Exception:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+class PooledMySQL:
+    """Drop-in replacement for flask_mysqldb.MySQL backed by ConnectionPool.
+
+    Reads the same MYSQL_* config keys, plus MYSQL_POOL_SIZE,
+    MYSQL_POOL_MAX_IDLE, MYSQL_POOL_CHECK_AFTER and MYSQL_POOL_TIMEOUT.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.pool = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MYSQL_HOST', 'localhost')
+        app.config.setdefault('MYSQL_USER', None)
+        app.config.setdefault('MYSQL_PASSWORD', None)
+        app.config.setdefault('MYSQL_DB', None)
+        app.config.setdefault('MYSQL_PORT', 3306)
+        app.config.setdefault('MYSQL_UNIX_SOCKET', None)
+        app.config.setdefault('MYSQL_CONNECT_TIMEOUT', 10)
+        app.config.setdefault('MYSQL_READ_DEFAULT_FILE', None)
+        app.config.setdefault('MYSQL_USE_UNICODE', True)
+        app.config.setdefault('MYSQL_CHARSET', 'utf8')
+        app.config.setdefault('MYSQL_SQL_MODE', None)
+        app.config.setdefault('MYSQL_CURSORCLASS', None)
+        app.config.setdefault('MYSQL_AUTOCOMMIT', False)
+        app.config.setdefault('MYSQL_CUSTOM_OPTIONS', None)
+        app.config.setdefault('MYSQL_POOL_SIZE', DEFAULT_POOL_SIZE)
+        app.config.setdefault('MYSQL_POOL_MAX_IDLE', DEFAULT_MAX_IDLE)
+        app.config.setdefault('MYSQL_POOL_CHECK_AFTER', DEFAULT_CHECK_AFTER)
+        app.config.setdefault('MYSQL_POOL_TIMEOUT', DEFAULT_CHECKOUT_TIMEOUT)
+
+        self.pool = ConnectionPool(
+            lambda: self._connect(app.config),
+            size=app.config['MYSQL_POOL_SIZE'],
+            max_idle=app.config['MYSQL_POOL_MAX_IDLE'],
+            check_after=app.config['MYSQL_POOL_CHECK_AFTER'],
+            timeout=app.config['MYSQL_POOL_TIMEOUT']
+        )
+
+        app.teardown_appcontext(self.teardown)
+
+    def _connect(self, config):
+        kwargs = {}
+
+        if config['MYSQL_HOST']:
+            kwargs['host'] = config['MYSQL_HOST']
+        if config['MYSQL_USER']:
+            kwargs['user'] = config['MYSQL_USER']
+        if config['MYSQL_PASSWORD']:
+            kwargs['passwd'] = config['MYSQL_PASSWORD']
+        if config['MYSQL_DB']:
+            kwargs['db'] = config['MYSQL_DB']
+        if config['MYSQL_PORT']:
+            kwargs['port'] = config['MYSQL_PORT']
+        if config['MYSQL_UNIX_SOCKET']:
+            kwargs['unix_socket'] = config['MYSQL_UNIX_SOCKET']
+        if config['MYSQL_CONNECT_TIMEOUT']:
+            kwargs['connect_timeout'] = config['MYSQL_CONNECT_TIMEOUT']
+        if config['MYSQL_READ_DEFAULT_FILE']:
+            kwargs['read_default_file'] = config['MYSQL_READ_DEFAULT_FILE']
+        if config['MYSQL_USE_UNICODE']:
+            kwargs['use_unicode'] = config['MYSQL_USE_UNICODE']
+        if config['MYSQL_CHARSET']:
+            kwargs['charset'] = config['MYSQL_CHARSET']
+        if config['MYSQL_SQL_MODE']:
+            kwargs['sql_mode'] = config['MYSQL_SQL_MODE']
+        if config['MYSQL_CURSORCLASS']:
+            kwargs['cursorclass'] = getattr(cursors, config['MYSQL_CURSORCLASS'])
+        if config['MYSQL_AUTOCOMMIT']:
+            kwargs['autocommit'] = config['MYSQL_AUTOCOMMIT']
+        if config['MYSQL_CUSTOM_OPTIONS']:
+            kwargs.update(config['MYSQL_CUSTOM_OPTIONS'])
+
+        return MySQLdb.connect(**kwargs)
+
+    @property
+    def connection(self):
+        """Connection checked out for the current app context"""
+        conn = g.get('_mysql_pooled')
+        if conn is None:
+            conn = self.pool.checkout()
+            g._mysql_pooled = conn
+        return conn
+
+    def teardown(self, exception):
+        conn = g.pop('_mysql_pooled', None)
+        if conn is not None:
+            # Koneksi yang error dibuang, bukan dikembalikan ke pool
+            self.pool.checkin(conn, discard=isinstance(exception, MySQLdb.OperationalError))
+
+    def pool_stats(self):
+        return self.pool.stats() if self.pool else {}
@@ -0,0 +1,222 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+
+from services import inventory, counters
+from services.availability import engine as availability_engine
+from services.dashboard import dashboard_cache
+from services.logs import get_logger
+
+log = get_logger('expiry')
+
+# Batas waktu bayar kalau payments.expiration_date kosong
+PAYMENT_WINDOW_HOURS = 24
+SWEEP_INTERVAL = 30
+# Worker lain juga membuat booking, jadi jadwal disinkron ulang berkala
+RESYNC_SECONDS = 300
+BATCH_SIZE = 200
+
+# EXPIRY SWEEPER
+# Booking waiting_payment yang belum dibayar dijadwalkan di min-heap
+# berdasarkan payments.expiration_date. Tiap putaran hanya booking yang
+# sudah jatuh tempo yang diambil, lalu di-expire per batch dalam satu
+# transaksi sekaligus mengembalikan stok di room_inventory.
+
+class ExpiryScheduler:
+    """Min-heap of (deadline, booking_id) with lazy removal"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap = []
+        self._deadlines = {}
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def schedule(self, booking_id, expires_at):
+        # Kolom TIMESTAMP membulatkan mikrodetik, jadi jadwal dibulatkan ke atas
+        if expires_at.microsecond:
+            expires_at = expires_at.replace(microsecond=0) + timedelta(seconds=1)
+        with self._lock:
+            if self._deadlines.get(booking_id) == expires_at:
+                return
+            self._deadlines[booking_id] = expires_at
+            heapq.heappush(self._heap, (expires_at, booking_id))
+
+    def cancel(self, booking_id):
+        with self._lock:
+            self._deadlines.pop(booking_id, None)
+
+    def next_deadline(self):
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now, limit=BATCH_SIZE):
+        """Remove and return up to `limit` booking ids due at `now`"""
+        due = []
+        with self._lock:
+            while self._heap and len(due) < limit:
+                self._drop_stale()
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                _, booking_id = heapq.heappop(self._heap)
+                del self._deadlines[booking_id]
+                due.append(booking_id)
+        return due
+
+    def _drop_stale(self):
+        # Entri yang sudah di-reschedule/cancel dibuang saat muncul di puncak
+        while self._heap:
+            expires_at, booking_id = self._heap[0]
+            if self._deadlines.get(booking_id) == expires_at:
+                return
+            heapq.heappop(self._heap)
+
+class ExpirySweeper:
+    """Background thread expiring unpaid bookings off the request path"""
+
+    def __init__(self, scheduler, interval=SWEEP_INTERVAL, resync_seconds=RESYNC_SECONDS):
+        self.scheduler = scheduler
+        self.interval = interval
+        self.resync_seconds = resync_seconds
+        self._synced_at = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, app, mysql):
+        """Run the sweep loop in a daemon thread inside `app`'s context"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    with app.app_context():
+                        self.run_once(mysql.connection)
+                except Exception:
+                    log.exception('expiry.sweep_error')
+                self._stop.wait(self._sleep_seconds())
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name='expiry-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _sleep_seconds(self):
+        deadline = self.scheduler.next_deadline()
+        if deadline is None:
+            return self.interval
+        seconds = (deadline - datetime.now()).total_seconds()
+        return min(max(seconds, 1), self.interval)
+
+    def run_once(self, connection):
+        """Resync when due, then expire every booking whose deadline passed"""
+        if self._synced_at is None or time.monotonic() - self._synced_at > self.resync_seconds:
+            self.resync(connection)
+
+        expired = 0
+        due = self.scheduler.pop_due(datetime.now())
+        while due:
+            expired += self.expire_batch(connection, due)
+            due = self.scheduler.pop_due(datetime.now())
+        return expired
+
+    def resync(self, connection):
+        """Schedule unpaid bookings expiring before the next resync"""
+        horizon = datetime.now() + timedelta(seconds=self.resync_seconds)
+        cur = connection.cursor()
+        try:
+            cur.execute("""
+                SELECT b.id,
+                       COALESCE(p.expiration_date, b.created_at + INTERVAL %s HOUR) as expires_at
+                FROM bookings b
+                JOIN payments p ON p.booking_id = b.id
+                WHERE b.status = 'waiting_payment'
+                AND p.status = 'pending'
+                AND COALESCE(p.expiration_date, b.created_at + INTERVAL %s HOUR) <= %s
+            """, (PAYMENT_WINDOW_HOURS, PAYMENT_WINDOW_HOURS, horizon))
+            rows = cur.fetchall()
+            connection.commit()
+        finally:
+            cur.close()
+
+        for row in rows:
+            self.scheduler.schedule(row['id'], row['expires_at'])
+        self._synced_at = time.monotonic()
+        return len(rows)
+
+    def expire_batch(self, connection, booking_ids):
+        """Expire due bookings + payments and release their nights atomically.
+
+        Bookings whose payment moved past 'pending' (proof uploaded, verified,
+        cancelled) are skipped, so stale heap entries are harmless.
+        """
+        placeholders = ', '.join(['%s'] * len(booking_ids))
+        cur = connection.cursor()
+        try:
+            cur.execute("START TRANSACTION")
+            cur.execute(f"""
+                SELECT b.id, b.room_id, b.check_in, b.check_out
+                FROM bookings b
+                JOIN payments p ON p.booking_id = b.id
+                WHERE b.id IN ({placeholders})
+                AND b.status = 'waiting_payment'
+                AND p.status = 'pending'
+                AND COALESCE(p.expiration_date, b.created_at + INTERVAL %s HOUR) <= NOW()
+                FOR UPDATE
+            """, (*booking_ids, PAYMENT_WINDOW_HOURS))
+            bookings = {row['id']: row for row in cur.fetchall()}
+
+            if not bookings:
+                cur.execute("COMMIT")
+                return 0
+
+            expired_ids = list(bookings)
+            placeholders = ', '.join(['%s'] * len(expired_ids))
+            cur.execute(f"""
+                UPDATE bookings
+                SET status = 'expired', updated_at = NOW()
+                WHERE id IN ({placeholders})
+            """, expired_ids)
+            cur.execute(f"""
+                UPDATE payments
+                SET status = 'expired', updated_at = NOW()
+                WHERE booking_id IN ({placeholders}) AND status = 'pending'
+            """, expired_ids)
+
+            payments_expired = cur.rowcount
+
+            # Stay yang sama cukup satu UPDATE ledger
+            stays = {}
+            for booking in bookings.values():
+                key = (booking['room_id'], booking['check_in'], booking['check_out'])
+                stays[key] = stays.get(key, 0) + 1
+            for (room_id, check_in, check_out), units in stays.items():
+                inventory.release_nights(cur, room_id, check_in, check_out, units)
+
+            rooms = {}
+            for booking in bookings.values():
+                rooms[booking['room_id']] = rooms.get(booking['room_id'], 0) + 1
+            for room_id, count in rooms.items():
+                counters.booking_status_changed(cur, room_id, 'waiting_payment', 'expired', count)
+            counters.payment_status_changed(cur, 'pending', 'expired', payments_expired)
+
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        finally:
+            cur.close()
+
+        for (room_id, check_in, check_out), units in stays.items():
+            dashboard_cache.invalidate()
+            availability_engine.record_release(room_id, check_in, check_out, units)
+
+        return len(bookings)
+
+scheduler = ExpiryScheduler()
+sweeper = ExpirySweeper(scheduler)
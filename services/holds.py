@@ -0,0 +1,300 @@
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+from services import inventory
+from services.availability import engine as availability_engine
+from services.expiry import ExpiryScheduler
+from services.logs import get_logger
+
+log = get_logger('holds')
+
+# Lama kamar ditahan selama tamu mengisi form booking
+HOLD_TTL_SECONDS = 600
+# Thread tetap bangun sesekali walau heap kosong (tanpa query DB)
+IDLE_SECONDS = 60
+# Hold dari worker lain (dan yang terlewat) dijadwalkan ulang berkala
+RESYNC_SECONDS = 300
+# Batch yang gagal dicoba lagi setelah RETRY_SECONDS
+RETRY_SECONDS = 15
+
+# INVENTORY HOLDS
+# Saat tamu memilih tanggal di halaman booking, satu unit kamar ditahan
+# di room_inventory selama HOLD_TTL_SECONDS dan dicatat di room_holds
+# dengan token acak. POST /book yang membawa token itu mengubah hold jadi
+# booking tanpa reservasi ulang. Hold yang tidak dipakai dilepas oleh
+# HoldReaper: deadline disimpan di min-heap dan thread tidur sampai
+# deadline terdekat, jadi DB hanya disentuh kalau memang ada hold yang habis.
+
+def place(cur, user_id, room_id, check_in, check_out, ttl_seconds=HOLD_TTL_SECONDS):
+    """Hold one unit for a stay; returns the hold or None when sold out.
+
+    Earlier active holds of the same user on the same room are released in
+    the same transaction, so changing dates moves the hold.
+    """
+    inventory.ensure_nights(cur, room_id, check_in, check_out)
+
+    token = secrets.token_hex(16)
+    # Tanpa mikrodetik: heap dan kolom TIMESTAMP memakai detik yang sama
+    expires_at = (datetime.now() + timedelta(seconds=ttl_seconds)).replace(microsecond=0)
+
+    cur.execute("START TRANSACTION")
+    try:
+        cur.execute("""
+            SELECT id, room_id, check_in, check_out, units
+            FROM room_holds
+            WHERE user_id = %s AND room_id = %s AND status = 'active'
+            FOR UPDATE
+        """, (user_id, room_id))
+        previous = cur.fetchall()
+        release_rows(cur, previous, 'released')
+
+        if not inventory.reserve_nights(cur, room_id, check_in, check_out):
+            cur.connection.rollback()
+            return None
+
+        cur.execute("""
+            INSERT INTO room_holds
+            (hold_token, user_id, room_id, check_in, check_out, units, status, expires_at)
+            VALUES (%s, %s, %s, %s, %s, 1, 'active', %s)
+        """, (token, user_id, room_id, check_in, check_out, expires_at))
+        hold_id = cur.lastrowid
+
+        cur.connection.commit()
+    except Exception:
+        cur.connection.rollback()
+        raise
+
+    released(previous)
+    availability_engine.record_booking(room_id, check_in, check_out)
+    reaper.schedule(hold_id, expires_at)
+    return {
+        'hold_token': token,
+        'room_id': int(room_id),
+        'check_in': inventory.to_date(check_in),
+        'check_out': inventory.to_date(check_out),
+        'expires_at': expires_at
+    }
+
+def release(cur, user_id, hold_token):
+    """Give back an active hold early (guest left the page)"""
+    cur.execute("START TRANSACTION")
+    try:
+        cur.execute("""
+            SELECT id, room_id, check_in, check_out, units
+            FROM room_holds
+            WHERE hold_token = %s AND user_id = %s AND status = 'active'
+            FOR UPDATE
+        """, (hold_token, user_id))
+        rows = cur.fetchall()
+        release_rows(cur, rows, 'released')
+        cur.connection.commit()
+    except Exception:
+        cur.connection.rollback()
+        raise
+
+    released(rows)
+    return len(rows)
+
+def claim(cur, hold_token, booking):
+    """Lock a live hold matching a prepared booking; returns its id or None.
+
+    Call inside the booking transaction. The hold's units already sit in
+    room_inventory, so a claimed booking skips reserve_nights().
+    """
+    if not hold_token:
+        return None
+
+    cur.execute("""
+        SELECT id FROM room_holds
+        WHERE hold_token = %s AND user_id = %s AND room_id = %s
+        AND check_in = %s AND check_out = %s
+        AND status = 'active' AND expires_at > NOW()
+        FOR UPDATE
+    """, (hold_token, booking['user_id'], booking['room_id'],
+          booking['check_in'], booking['check_out']))
+    row = cur.fetchone()
+    return row['id'] if row else None
+
+def convert(cur, hold_id, booking_id):
+    """Mark a claimed hold as turned into `booking_id` (same transaction).
+
+    The heap entry is left alone: expire_batch() skips converted holds.
+    """
+    cur.execute("""
+        UPDATE room_holds
+        SET status = 'converted', booking_id = %s
+        WHERE id = %s
+    """, (booking_id, hold_id))
+
+def release_rows(cur, rows, status):
+    """Set locked hold rows to `status` and give their nights back"""
+    if not rows:
+        return 0
+
+    ids = [row['id'] for row in rows]
+    placeholders = ', '.join(['%s'] * len(ids))
+    cur.execute(f"""
+        UPDATE room_holds SET status = %s
+        WHERE id IN ({placeholders})
+    """, (status, *ids))
+
+    # Stay yang sama cukup satu UPDATE ledger
+    stays = {}
+    for row in rows:
+        key = (row['room_id'], row['check_in'], row['check_out'])
+        stays[key] = stays.get(key, 0) + (row['units'] or 1)
+    for (room_id, check_in, check_out), units in stays.items():
+        inventory.release_nights(cur, room_id, check_in, check_out, units)
+    return len(rows)
+
+def released(rows):
+    """Post-commit bookkeeping for released/expired holds"""
+    for row in rows:
+        reaper.scheduler.cancel(row['id'])
+        availability_engine.record_release(row['room_id'], row['check_in'], row['check_out'],
+                                           row['units'] or 1)
+
+class HoldReaper:
+    """Background thread releasing holds when their deadline passes"""
+
+    def __init__(self, scheduler, idle_seconds=IDLE_SECONDS, resync_seconds=RESYNC_SECONDS):
+        self.scheduler = scheduler
+        self.idle_seconds = idle_seconds
+        self.resync_seconds = resync_seconds
+        self.stats = {'placed': 0, 'expired': 0, 'rescheduled': 0}
+        self._synced_at = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def schedule(self, hold_id, expires_at):
+        self.scheduler.schedule(hold_id, expires_at)
+        self.stats['placed'] += 1
+        self._wake.set()
+
+    def start(self, app, mysql):
+        """Release holds as they expire, resyncing from room_holds periodically"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                self._wake.clear()
+                try:
+                    if self._resync_due() or self._due():
+                        with app.app_context():
+                            self.run_once(mysql.connection)
+                except Exception:
+                    log.exception('holds.reap_error')
+                self._wake.wait(self._sleep_seconds())
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name='hold-reaper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _resync_due(self):
+        return self._synced_at is None or time.monotonic() - self._synced_at > self.resync_seconds
+
+    def _due(self):
+        deadline = self.scheduler.next_deadline()
+        return deadline is not None and deadline <= datetime.now()
+
+    def _sleep_seconds(self):
+        deadline = self.scheduler.next_deadline()
+        if deadline is None:
+            return self.idle_seconds
+        seconds = (deadline - datetime.now()).total_seconds()
+        return min(max(seconds, 0.5), self.idle_seconds)
+
+    def resync(self, connection):
+        """Schedule active holds expiring before the next resync.
+
+        Covers restarts, holds placed by other workers and holds a failed
+        batch dropped. Deadlines are taken relative to the DB clock.
+        """
+        cur = connection.cursor()
+        try:
+            cur.execute("""
+                SELECT id, TIMESTAMPDIFF(SECOND, NOW(), expires_at) AS remaining
+                FROM room_holds
+                WHERE status = 'active'
+                AND expires_at <= NOW() + INTERVAL %s SECOND
+            """, (self.resync_seconds,))
+            rows = cur.fetchall()
+            connection.commit()
+        finally:
+            cur.close()
+
+        self._schedule_remaining(rows)
+        self._synced_at = time.monotonic()
+        return len(rows)
+
+    def _schedule_remaining(self, rows):
+        now = datetime.now().replace(microsecond=0)
+        for row in rows:
+            # Jam DB bisa beda dengan jam worker: minimal 1 detik lagi
+            seconds = max(int(row['remaining'] or 0), 0) + 1
+            self.scheduler.schedule(row['id'], now + timedelta(seconds=seconds))
+
+    def run_once(self, connection):
+        if self._resync_due():
+            self.resync(connection)
+
+        expired = 0
+        due = self.scheduler.pop_due(datetime.now())
+        while due:
+            expired += self.expire_batch(connection, due)
+            due = self.scheduler.pop_due(datetime.now())
+        return expired
+
+    def expire_batch(self, connection, hold_ids):
+        """Expire due holds and release their nights atomically.
+
+        Holds already converted or released are skipped, so stale heap
+        entries (and other workers loading the same hold) are harmless.
+        Holds not yet expired by the DB clock are scheduled again, and a
+        failed batch is retried after RETRY_SECONDS.
+        """
+        placeholders = ', '.join(['%s'] * len(hold_ids))
+        cur = connection.cursor()
+        try:
+            cur.execute("START TRANSACTION")
+            cur.execute(f"""
+                SELECT id, room_id, check_in, check_out, units,
+                       TIMESTAMPDIFF(SECOND, NOW(), expires_at) AS remaining
+                FROM room_holds
+                WHERE id IN ({placeholders})
+                AND status = 'active'
+                FOR UPDATE
+            """, hold_ids)
+            active = cur.fetchall()
+            rows = [row for row in active if row['remaining'] <= 0]
+            pending = [row for row in active if row['remaining'] > 0]
+            release_rows(cur, rows, 'expired')
+            cur.execute("COMMIT")
+        except Exception:
+            retry_at = datetime.now().replace(microsecond=0) + timedelta(seconds=RETRY_SECONDS)
+            for hold_id in hold_ids:
+                self.scheduler.schedule(hold_id, retry_at)
+            cur.execute("ROLLBACK")
+            raise
+        finally:
+            cur.close()
+
+        self._schedule_remaining(pending)
+        self.stats['rescheduled'] += len(pending)
+        released(rows)
+        self.stats['expired'] += len(rows)
+        return len(rows)
+
+    def snapshot(self):
+        return dict(self.stats, scheduled=len(self.scheduler),
+                    running=bool(self._thread and self._thread.is_alive()))
+
+reaper = HoldReaper(ExpiryScheduler())
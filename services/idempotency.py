@@ -0,0 +1,273 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from functools import wraps
+
+from services.logs import get_logger
+
+log = get_logger('idempotency')
+
+# Lama hasil request disimpan untuk di-replay
+TTL_SECONDS = 3600
+# Request kembar menunggu request pertama selesai paling lama WAIT_SECONDS
+WAIT_SECONDS = 10
+WAIT_INTERVAL = 0.2
+# Response lebih besar dari ini tidak disimpan (key dilepas)
+MAX_BODY_BYTES = 256 * 1024
+# Status "masih diproses": key tetap pending (tidak disimpan, tidak dilepas)
+PENDING_STATUS = 202
+# Ukuran baca saat file upload di-hash untuk fingerprint
+FILE_CHUNK_BYTES = 64 * 1024
+# Setiap CLEANUP_EVERY klaim, baris kedaluwarsa dihapus
+CLEANUP_EVERY = 200
+
+KEY_HEADER = 'Idempotency-Key'
+KEY_FIELD = 'idempotency_key'
+KEY_PATTERN = re.compile(r'^[A-Za-z0-9_.:-]{8,64}$')
+
+# Field yang tidak ikut fingerprint
+IGNORED_FIELDS = ('csrf_token', KEY_FIELD)
+
+# IDEMPOTENCY KEYS
+# POST booking dan pembayaran membawa key dari client (header
+# Idempotency-Key, atau hidden input idempotency_key dari
+# {{ idempotency_key() }}). Request pertama mengklaim key di tabel
+# idempotency_keys lalu menyimpan response-nya; request ulang dengan key
+# dan isi yang sama (double click, retry dari HP) mendapat response itu
+# lagi tanpa menjalankan transaksi atau menyimpan file lagi. Key yang
+# dipakai ulang dengan isi berbeda ditolak (422).
+
+class IdempotencyStore:
+    """TTL table of request fingerprints and their stored responses"""
+
+    def __init__(self, ttl_seconds=TTL_SECONDS, wait_seconds=WAIT_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.wait_seconds = wait_seconds
+        self._lock = threading.Lock()
+        self._claims = 0
+        self.stats = {'claimed': 0, 'replayed': 0, 'conflicts': 0, 'released': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def claim(self, cur, user_id, scope, key, fingerprint):
+        """'claimed', 'mismatch', or the stored row (pending or done)"""
+        expires_at = datetime.now() + timedelta(seconds=self.ttl_seconds)
+        for _ in range(2):
+            cur.execute("""
+                INSERT IGNORE INTO idempotency_keys
+                (user_id, scope, idem_key, fingerprint, state, expires_at)
+                VALUES (%s, %s, %s, %s, 'pending', %s)
+            """, (user_id, scope, key, fingerprint, expires_at))
+            inserted = cur.rowcount == 1
+            cur.connection.commit()
+            if inserted:
+                self._count('claimed')
+                self._maybe_cleanup(cur)
+                return 'claimed'
+
+            row = self.load(cur, user_id, scope, key)
+            if row is None:
+                continue
+            if row['expires_at'] <= datetime.now():
+                # Key lama yang sudah lewat TTL boleh dipakai lagi
+                self.release(cur, user_id, scope, key)
+                continue
+            if row['fingerprint'] != fingerprint:
+                self._count('conflicts')
+                return 'mismatch'
+            return row
+        return None
+
+    def load(self, cur, user_id, scope, key):
+        cur.execute("""
+            SELECT fingerprint, state, status_code, content_type, location, body, expires_at
+            FROM idempotency_keys
+            WHERE user_id = %s AND scope = %s AND idem_key = %s
+        """, (user_id, scope, key))
+        row = cur.fetchone()
+        cur.connection.commit()
+        return row
+
+    def wait(self, cur, user_id, scope, key):
+        """Stored row once the first request finished, None on timeout"""
+        deadline = time.monotonic() + self.wait_seconds
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            row = self.load(cur, user_id, scope, key)
+            if row is None or row['state'] == 'done':
+                return row
+        return None
+
+    def complete(self, cur, user_id, scope, key, response):
+        cur.execute("""
+            UPDATE idempotency_keys
+            SET state = 'done', status_code = %s, content_type = %s, location = %s, body = %s
+            WHERE user_id = %s AND scope = %s AND idem_key = %s
+        """, (response.status_code, response.content_type, response.headers.get('Location'),
+              response.get_data(), user_id, scope, key))
+        cur.connection.commit()
+
+    def release(self, cur, user_id, scope, key):
+        cur.execute("""
+            DELETE FROM idempotency_keys
+            WHERE user_id = %s AND scope = %s AND idem_key = %s
+        """, (user_id, scope, key))
+        cur.connection.commit()
+        self._count('released')
+
+    def _maybe_cleanup(self, cur):
+        with self._lock:
+            self._claims += 1
+            due = self._claims % CLEANUP_EVERY == 0
+        if due:
+            cur.execute("DELETE FROM idempotency_keys WHERE expires_at <= NOW() LIMIT 500")
+            cur.connection.commit()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, ttl_seconds=self.ttl_seconds)
+
+    def guard(self, scope, cursor_factory):
+        """Decorator for a POST view: replay the stored response for a repeated key.
+
+        Requests without a key run normally. Responses with status >= 500,
+        streamed or larger than MAX_BODY_BYTES are not stored, so the same
+        key can be retried. A PENDING_STATUS response means the work may
+        still commit, so the key stays pending until its TTL and retries get
+        409 instead of running the view again.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                from flask import request, session, make_response
+
+                if request.method != 'POST':
+                    return view(*args, **kwargs)
+
+                key = request_key()
+                if key is None:
+                    return view(*args, **kwargs)
+                if not KEY_PATTERN.match(key):
+                    return error_response('Invalid idempotency key.', 400)
+
+                user_id = session.get('user_id') or 0
+                fingerprint = request_fingerprint(scope, args, kwargs)
+
+                cur = cursor_factory()
+                try:
+                    stored = self.claim(cur, user_id, scope, key, fingerprint)
+                    if stored == 'mismatch':
+                        return error_response('Idempotency key was already used for a different request.', 422)
+                    if stored != 'claimed':
+                        if stored is not None and stored['state'] == 'pending':
+                            stored = self.wait(cur, user_id, scope, key)
+                        if stored is None or stored['state'] != 'done':
+                            return error_response('This request is still being processed. Please retry shortly.', 409)
+                        self._count('replayed')
+                        log.info('idempotency.replay', scope=scope, user_id=user_id)
+                        return replay(stored)
+                finally:
+                    cur.close()
+
+                try:
+                    response = make_response(view(*args, **kwargs))
+                except Exception:
+                    self._release_quietly(cursor_factory, user_id, scope, key)
+                    raise
+
+                if response.status_code == PENDING_STATUS:
+                    log.warning('idempotency.left_pending', scope=scope, user_id=user_id)
+                    return response
+
+                storable = (response.status_code < 500 and not response.is_streamed
+                            and len(response.get_data()) <= MAX_BODY_BYTES)
+                cur = cursor_factory()
+                try:
+                    if storable:
+                        self.complete(cur, user_id, scope, key, response)
+                    else:
+                        self.release(cur, user_id, scope, key)
+                except Exception:
+                    # Response tetap dikirim; key kedaluwarsa sendiri
+                    log.exception('idempotency.store_error', scope=scope)
+                finally:
+                    cur.close()
+                return response
+            return wrapper
+        return decorator
+
+    def _release_quietly(self, cursor_factory, user_id, scope, key):
+        cur = cursor_factory()
+        try:
+            self.release(cur, user_id, scope, key)
+        except Exception:
+            log.exception('idempotency.release_error', scope=scope)
+        finally:
+            cur.close()
+
+def request_key():
+    """Key from the Idempotency-Key header, the form, or the JSON body"""
+    from flask import request
+
+    key = request.headers.get(KEY_HEADER) or request.form.get(KEY_FIELD)
+    if not key and request.is_json:
+        key = (request.get_json(silent=True) or {}).get(KEY_FIELD)
+    return str(key).strip() if key else None
+
+def request_fingerprint(scope, args, kwargs):
+    """sha256 of what the request asks for (path args, fields, uploaded files)"""
+    from flask import request
+
+    fields = sorted((name, value) for name, value in request.form.items(multi=True)
+                    if name not in IGNORED_FIELDS)
+    body = request.get_json(silent=True) if request.is_json else None
+    if isinstance(body, dict):
+        body = {name: value for name, value in body.items() if name not in IGNORED_FIELDS}
+
+    # Isi file ikut di-hash (upload dibatasi 5MB), lalu stream dikembalikan ke awal
+    files = []
+    for name, upload in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+        stream = upload.stream
+        digest = hashlib.sha256()
+        stream.seek(0)
+        for chunk in iter(lambda: stream.read(FILE_CHUNK_BYTES), b''):
+            digest.update(chunk)
+        stream.seek(0)
+        files.append((name, upload.filename, digest.hexdigest()))
+
+    payload = json.dumps([scope, request.path, list(args), kwargs, fields, body, files],
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def replay(stored):
+    from flask import make_response
+
+    response = make_response(stored['body'] or b'', stored['status_code'])
+    if stored['content_type']:
+        response.headers['Content-Type'] = stored['content_type']
+    if stored['location']:
+        response.headers['Location'] = stored['location']
+    response.headers['Idempotent-Replay'] = 'true'
+    return response
+
+def error_response(message, status):
+    from flask import request, jsonify, make_response
+
+    if request.is_json or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({'success': False, 'error': message, 'code': status}), status
+    return make_response(message, status)
+
+def new_key():
+    """Jinja global: one-time key for a form (hidden input idempotency_key)"""
+    return uuid.uuid4().hex
+
+def install(app):
+    app.jinja_env.globals['idempotency_key'] = new_key
+
+store = IdempotencyStore()
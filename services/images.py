@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: cukup lock per proses
+    fcntl = None
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow opsional: tanpa Pillow gambar asli yang dipakai
+    Image = None
+
+from services.logs import get_logger
+
+log = get_logger('images')
+
+DERIVED_DIR = os.path.join('static', 'images', 'derived')
+MANIFEST_PATH = os.path.join(DERIVED_DIR, 'manifest.json')
+# Dikunci (flock) selama read-modify-write manifest lintas worker
+MANIFEST_LOCK_PATH = MANIFEST_PATH + '.lock'
+
+# Lebar maksimum tiap turunan
+SIZES = {
+    'thumb': 320,
+    'card': 640,
+    'hero': 1600
+}
+QUALITY = {
+    'jpeg': 80,
+    'webp': 78,
+    'avif': 55
+}
+EXTENSIONS = {
+    'jpeg': 'jpg',
+    'webp': 'webp',
+    'avif': 'avif'
+}
+
+# IMAGE DERIVATIVES
+# Setiap foto kamar/venue diturunkan ke beberapa lebar dan format dengan nama
+# file berisi hash konten. manifest.json memetakan path asli -> turunannya,
+# dan template memakai image_srcsets()/image_src() untuk membangun srcset.
+
+_lock = threading.Lock()
+_manifest = {}
+_manifest_mtime = None
+
+def manifest_key(path):
+    """'/static/x.jpg', 'static/x.jpg' and OS paths map to the same key"""
+    if not path:
+        return ''
+    return str(path).replace('\\', '/').lstrip('/')
+
+def output_formats():
+    formats = ['jpeg']
+    if Image is None:
+        return formats
+    for fmt in ('webp', 'avif'):
+        try:
+            if features.check(fmt):
+                formats.append(fmt)
+        except Exception:
+            pass
+    return formats
+
+def content_hash(path, length=12):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
+
+def load_manifest():
+    """Manifest dict, re-read only when the file changed"""
+    global _manifest, _manifest_mtime
+    try:
+        mtime = os.path.getmtime(MANIFEST_PATH)
+    except OSError:
+        return _manifest
+
+    if mtime != _manifest_mtime:
+        with _lock:
+            try:
+                with open(MANIFEST_PATH, encoding='utf-8') as f:
+                    _manifest = json.load(f)
+                _manifest_mtime = mtime
+            except (OSError, ValueError):
+                pass
+    return _manifest
+
+def _save_manifest(manifest):
+    global _manifest, _manifest_mtime
+    os.makedirs(DERIVED_DIR, exist_ok=True)
+    tmp_path = f"{MANIFEST_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+    _manifest = manifest
+    _manifest_mtime = os.path.getmtime(MANIFEST_PATH)
+
+def render_derivatives(source_path, known_hash=None):
+    """Write resized/recompressed variants of one image without touching the
+    manifest (safe to call from a worker process).
+
+    Returns the manifest entry, or None when Pillow is missing or the file
+    is not a readable image (the original is then served as-is).
+    """
+    if Image is None or not os.path.isfile(source_path):
+        return None
+
+    digest = content_hash(source_path)
+    if known_hash == digest:
+        return None
+
+    try:
+        with Image.open(source_path) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            original_width, original_height = img.size
+
+            stem = os.path.splitext(os.path.basename(source_path))[0]
+            os.makedirs(DERIVED_DIR, exist_ok=True)
+
+            variants = {}
+            for size_name, max_width in SIZES.items():
+                width = min(max_width, original_width)
+                height = max(1, round(original_height * width / original_width))
+                resized = img if width == original_width else img.resize((width, height), Image.LANCZOS)
+
+                files = {}
+                for fmt in output_formats():
+                    filename = f"{stem}-{digest}-{size_name}.{EXTENSIONS[fmt]}"
+                    out_path = os.path.join(DERIVED_DIR, filename)
+                    if not os.path.exists(out_path):
+                        save_options = {'quality': QUALITY[fmt]}
+                        if fmt == 'jpeg':
+                            save_options.update(optimize=True, progressive=True)
+                        resized.save(out_path, fmt.upper(), **save_options)
+                    files[fmt] = '/' + manifest_key(out_path)
+
+                variants[size_name] = {'width': width, 'files': files}
+    except (OSError, ValueError) as e:
+        log.warning('images.derivative_error', path=source_path, error=str(e))
+        return None
+
+    return {
+        'hash': digest,
+        'width': original_width,
+        'height': original_height,
+        'variants': variants
+    }
+
+class _ManifestLock:
+    """Serializes manifest updates across threads and worker processes"""
+
+    def __enter__(self):
+        _lock.acquire()
+        self._file = None
+        if fcntl is not None:
+            os.makedirs(DERIVED_DIR, exist_ok=True)
+            self._file = open(MANIFEST_LOCK_PATH, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+        _lock.release()
+
+def _read_manifest():
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def register(key, entry):
+    """Add one entry to manifest.json (safe from several web workers)"""
+    with _ManifestLock():
+        # Dibaca ulang dari disk di dalam lock: cache mtime bisa ketinggalan
+        # entri yang baru ditulis worker lain
+        manifest = _read_manifest()
+        manifest[manifest_key(key)] = entry
+        _save_manifest(manifest)
+
+def generate_derivatives(source_path, key=None):
+    """Render variants for `source_path` and register them in the manifest"""
+    key = manifest_key(key or source_path)
+    existing = load_manifest().get(key)
+
+    entry = render_derivatives(source_path, existing.get('hash') if existing else None)
+    if entry is None:
+        return existing if existing and os.path.isfile(source_path) else None
+
+    register(key, entry)
+    return entry
+
+def image_srcset(path, fmt='jpeg'):
+    """'url 320w, url 640w, ...' for `path`, or '' when no variants exist"""
+    return _srcset(load_manifest().get(manifest_key(path)), fmt)
+
+def image_srcsets(path, formats=('avif', 'webp', 'jpeg')):
+    """{fmt: srcset} for `path` from a single manifest lookup"""
+    entry = load_manifest().get(manifest_key(path))
+    return {fmt: _srcset(entry, fmt) for fmt in formats}
+
+def _srcset(entry, fmt):
+    if not entry:
+        return ''
+
+    seen = set()
+    parts = []
+    for variant in sorted(entry['variants'].values(), key=lambda v: v['width']):
+        url = variant['files'].get(fmt)
+        if url and variant['width'] not in seen:
+            seen.add(variant['width'])
+            parts.append(f"{url} {variant['width']}w")
+    return ', '.join(parts)
+
+def image_src(path, size='card', fmt='jpeg'):
+    """URL of one variant, falling back to the original path"""
+    entry = load_manifest().get(manifest_key(path))
+    if entry:
+        url = entry['variants'].get(size, {}).get('files', {}).get(fmt)
+        if url:
+            return url
+    return path
+
+def build_all(directories=('static/images/rooms', 'static/images/venues', 'static/uploads/rooms')):
+    """Generate derivatives for every image already on disk"""
+    count = 0
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.lower().rsplit('.', 1)[-1] in ('jpg', 'jpeg', 'png', 'webp'):
+                if generate_derivatives(os.path.join(directory, name)):
+                    count += 1
+    return count
+
+if __name__ == '__main__':
+    if Image is None:
+        print("Pillow belum terpasang: pip install Pillow")
+    else:
+        print(f"{build_all()} gambar diproses, format: {', '.join(output_formats())}")
@@ -0,0 +1,228 @@
+from datetime import datetime, date, timedelta
+
+# Status booking yang masih memegang kamar di ledger
+HOLDING_STATUSES = ('pending', 'waiting_payment', 'confirmed')
+
+# INVENTORY LEDGER
+# Satu baris room_inventory = stok satu tipe kamar untuk satu malam.
+# rooms.available_count sekarang hanya kapasitas (jumlah unit yang dijual),
+# jadi booking untuk tanggal berbeda tidak lagi rebutan satu baris rooms.
+
+def to_date(value):
+    """Convert date/datetime/'YYYY-MM-DD' string to a date object"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+def stay_nights(check_in, check_out):
+    """List every night covered by a stay, check_out excluded"""
+    start = to_date(check_in)
+    end = to_date(check_out)
+    return [start + timedelta(days=i) for i in range((end - start).days)]
+
+def ensure_nights(cur, room_id, check_in, check_out):
+    """Create missing ledger rows for a stay.
+
+    Call this OUTSIDE the booking transaction: it commits on its own so the
+    shared locks taken by INSERT IGNORE are released before any reservation.
+    """
+    nights = stay_nights(check_in, check_out)
+    if not nights:
+        return 0
+
+    cur.execute("""
+        SELECT COUNT(*) as total FROM room_inventory
+        WHERE room_id = %s AND stay_date >= %s AND stay_date < %s
+    """, (room_id, nights[0], nights[-1] + timedelta(days=1)))
+    existing = cur.fetchone()['total'] or 0
+
+    if existing >= len(nights):
+        return 0
+
+    night_rows = " UNION ALL ".join(["SELECT %s AS stay_date"] * len(nights))
+    cur.execute(f"""
+        INSERT IGNORE INTO room_inventory (room_id, stay_date, total_units, reserved_units)
+        SELECT r.id, n.stay_date, r.available_count, 0
+        FROM rooms r
+        JOIN ({night_rows}) n
+        WHERE r.id = %s
+    """, (*nights, room_id))
+    created = cur.rowcount
+    cur.connection.commit()
+    return created
+
+def reserve_nights(cur, room_id, check_in, check_out, units=1):
+    """Atomically reserve `units` for every night of a stay.
+
+    Single conditional UPDATE: only nights that still have enough stock are
+    touched. Returns False when at least one night is short (or missing); the
+    caller must then roll back its transaction.
+    """
+    nights = stay_nights(check_in, check_out)
+    if not nights:
+        return False
+
+    cur.execute("""
+        UPDATE room_inventory
+        SET reserved_units = reserved_units + %s
+        WHERE room_id = %s
+        AND stay_date >= %s AND stay_date < %s
+        AND total_units - reserved_units >= %s
+    """, (units, room_id, nights[0], nights[-1] + timedelta(days=1), units))
+
+    return cur.rowcount == len(nights)
+
+def reserve_demand(cur, room_id, demand):
+    """Reserve a {night: units} demand (several stays) in one conditional UPDATE.
+
+    Returns False when any night is short or missing; the caller must then
+    roll back its transaction.
+    """
+    if not demand:
+        return True
+
+    nights = sorted(demand)
+    case = "CASE stay_date " + " ".join(["WHEN %s THEN %s"] * len(nights)) + " END"
+    case_params = [value for night in nights for value in (night, demand[night])]
+    placeholders = ', '.join(['%s'] * len(nights))
+
+    cur.execute(f"""
+        UPDATE room_inventory
+        SET reserved_units = reserved_units + {case}
+        WHERE room_id = %s
+        AND stay_date IN ({placeholders})
+        AND total_units - reserved_units >= {case}
+    """, (*case_params, room_id, *nights, *case_params))
+
+    return cur.rowcount == len(nights)
+
+def release_nights(cur, room_id, check_in, check_out, units=1):
+    """Give back `units` for every night of a stay"""
+    nights = stay_nights(check_in, check_out)
+    if not nights:
+        return 0
+
+    cur.execute("""
+        UPDATE room_inventory
+        SET reserved_units = GREATEST(reserved_units - %s, 0)
+        WHERE room_id = %s
+        AND stay_date >= %s AND stay_date < %s
+    """, (units, room_id, nights[0], nights[-1] + timedelta(days=1)))
+    return cur.rowcount
+
+def apply_status_change(cur, room_id, check_in, check_out, old_status, new_status):
+    """Reserve or release ledger nights when a booking changes status.
+
+    Returns False only when a booking moves back into a holding status and
+    the nights are no longer available.
+    """
+    was_holding = old_status in HOLDING_STATUSES
+    is_holding = new_status in HOLDING_STATUSES
+
+    if was_holding and not is_holding:
+        release_nights(cur, room_id, check_in, check_out)
+    elif is_holding and not was_holding:
+        return reserve_nights(cur, room_id, check_in, check_out)
+
+    return True
+
+def available_units(cur, room_id, check_in, check_out):
+    """Minimum free units across all nights of a stay"""
+    nights = stay_nights(check_in, check_out)
+    if not nights:
+        return 0
+
+    cur.execute("""
+        SELECT r.available_count as capacity,
+               COUNT(i.stay_date) as known_nights,
+               MIN(i.total_units - i.reserved_units) as min_free
+        FROM rooms r
+        LEFT JOIN room_inventory i
+            ON i.room_id = r.id
+            AND i.stay_date >= %s AND i.stay_date < %s
+        WHERE r.id = %s
+        GROUP BY r.id, r.available_count
+    """, (nights[0], nights[-1] + timedelta(days=1), room_id))
+    result = cur.fetchone()
+
+    if not result:
+        return 0
+
+    capacity = result['capacity'] or 0
+    if not result['known_nights']:
+        return max(capacity, 0)
+
+    min_free = result['min_free'] or 0
+    # Malam yang belum punya baris ledger masih kosong penuh
+    if result['known_nights'] < len(nights):
+        min_free = min(min_free, capacity)
+    return max(min_free, 0)
+
+def set_capacity(cur, room_id, total_units):
+    """Apply a new room capacity to every future night in the ledger"""
+    cur.execute("""
+        UPDATE room_inventory
+        SET total_units = %s
+        WHERE room_id = %s AND stay_date >= CURDATE()
+    """, (total_units, room_id))
+    return cur.rowcount
+
+def rebuild_inventory(cur):
+    """Recompute future ledger rows from bookings and active holds.
+
+    Used for backfilling existing databases and for repairing drift. Works
+    with any DB-API cursor that returns dict rows.
+    """
+    today = date.today()
+
+    cur.execute("SELECT id, available_count FROM rooms")
+    capacities = {row['id']: row['available_count'] or 0 for row in cur.fetchall()}
+
+    placeholders = ', '.join(['%s'] * len(HOLDING_STATUSES))
+    cur.execute(f"""
+        SELECT room_id, check_in, check_out
+        FROM bookings
+        WHERE status IN ({placeholders}) AND check_out > %s
+    """, (*HOLDING_STATUSES, today))
+
+    stays = [(booking['room_id'], booking['check_in'], booking['check_out'], 1)
+             for booking in cur.fetchall()]
+
+    # Hold checkout yang masih aktif juga memegang stok (services/holds.py);
+    # hold yang sudah lewat ditutup di sini supaya tidak dilepas dua kali
+    cur.execute("""
+        UPDATE room_holds SET status = 'expired'
+        WHERE status = 'active' AND expires_at <= NOW()
+    """)
+    cur.execute("""
+        SELECT room_id, check_in, check_out, units
+        FROM room_holds
+        WHERE status = 'active' AND expires_at > NOW() AND check_out > %s
+    """, (today,))
+    stays.extend((hold['room_id'], hold['check_in'], hold['check_out'], hold['units'])
+                 for hold in cur.fetchall())
+
+    reserved = {}
+    for room_id, check_in, check_out, units in stays:
+        for night in stay_nights(check_in, check_out):
+            if night < today:
+                continue
+            key = (room_id, night)
+            reserved[key] = reserved.get(key, 0) + units
+
+    cur.execute("DELETE FROM room_inventory WHERE stay_date >= %s", (today,))
+
+    rows = [
+        (room_id, night, capacities.get(room_id, 0), count)
+        for (room_id, night), count in reserved.items()
+        if room_id in capacities
+    ]
+    if rows:
+        cur.executemany("""
+            INSERT INTO room_inventory (room_id, stay_date, total_units, reserved_units)
+            VALUES (%s, %s, %s, %s)
+        """, rows)
+
+    return len(rows)
@@ -0,0 +1,160 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+ROOT_LOGGER = 'feizen'
+
+# Level default dan level per logger, contoh:
+# LOG_LEVEL=INFO  LOG_LEVELS=booking=DEBUG,auth=WARNING
+DEFAULT_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOGGER_LEVELS = os.environ.get('LOG_LEVELS', '')
+
+# Record yang belum ditulis; kalau penuh, record dibuang (request tidak
+# pernah menunggu stdout)
+QUEUE_SIZE = 10000
+# Pesan DEBUG yang sama paling banyak DEBUG_BURST kali per DEBUG_INTERVAL detik
+DEBUG_BURST = 20
+DEBUG_INTERVAL = 10.0
+
+# LOGGING
+# Route dan service menulis lewat get_logger(name): satu event + field
+# terstruktur per baris JSON. Handler di thread request hanya memasukkan
+# record ke queue; QueueListener menulis ke stdout di thread sendiri.
+# DEBUG dibatasi per pesan supaya log per kamar/per gambar tidak membanjiri
+# worker saat ramai.
+
+class StructuredLogger(logging.LoggerAdapter):
+    """log.info('booking.created', booking_id=1) -> fields on the record"""
+
+    RESERVED = ('exc_info', 'stack_info', 'stacklevel', 'extra')
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in self.RESERVED}
+        kwargs['extra'] = dict(kwargs.get('extra') or {}, fields=fields)
+        return msg, kwargs
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class DebugRateLimit(logging.Filter):
+    """Let each DEBUG message through at most `burst` times per `interval`"""
+
+    def __init__(self, burst=DEBUG_BURST, interval=DEBUG_INTERVAL):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            started, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - started > self.interval:
+                started, count = now, 0
+            if count >= self.burst:
+                self._windows[key] = (started, count, suppressed + 1)
+                return False
+            self._windows[key] = (started, count + 1, 0)
+
+        # Jumlah yang dibuang sejak record terakhir ikut ditulis
+        record.suppressed = suppressed
+        return True
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Traceback diformat di thread penulis, bukan di thread request
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener = None
+_handler = None
+
+def get_logger(name):
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"), {})
+
+def parse_levels(value):
+    """'booking=DEBUG,auth=WARNING' -> {'booking': 'DEBUG', 'auth': 'WARNING'}"""
+    levels = {}
+    for item in value.split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def setup(level=DEFAULT_LEVEL, levels=LOGGER_LEVELS, stream=None):
+    """Install the queue handler + background writer (idempotent)"""
+    global _listener, _handler
+    if _listener is not None:
+        return _handler
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(str(level).upper())
+    root.propagate = False
+    for name, logger_level in parse_levels(levels).items():
+        logging.getLogger(f"{ROOT_LOGGER}.{name}").setLevel(logger_level)
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    _handler = DroppingQueueHandler(log_queue)
+    _handler.addFilter(DebugRateLimit())
+    root.addHandler(_handler)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_after_fork)
+    return _handler
+
+def _restart_after_fork():
+    # Proses hasil fork (pool upload) tidak mewarisi thread listener
+    global _listener
+    _handler.queue = queue.Queue(QUEUE_SIZE)
+    _listener = QueueListener(_handler.queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+def snapshot():
+    return {
+        'queued': _handler.queue.qsize() if _handler else 0,
+        'dropped': _handler.dropped if _handler else 0
+    }
@@ -0,0 +1,203 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from services.logs import get_logger
+
+log = get_logger('page_cache')
+
+# Total HTML yang disimpan per proses, dan batas satu halaman
+MAX_BYTES = 16 * 1024 * 1024
+MAX_ENTRY_BYTES = 512 * 1024
+# Halaman segar selama FRESH_SECONDS; sesudahnya masih boleh dikirim
+# (stale) sampai STALE_SECONDS sambil dirender ulang di background
+FRESH_SECONDS = 60
+STALE_SECONDS = 600
+
+# Bagian halaman yang berbeda per pengunjung (nama -> template)
+FRAGMENTS = {
+    'csrf_meta': 'partials/csrf_meta.html',
+    'flash_messages': 'partials/flash_messages.html',
+    'user_menu': 'partials/user_menu.html',
+    'user_icon_mobile': 'partials/user_icon_mobile.html',
+    'user_menu_mobile': 'partials/user_menu_mobile.html'
+}
+
+PLACEHOLDER = '<!--fragment:%s-->'
+PLACEHOLDER_PATTERN = re.compile(r'<!--fragment:([a-z_]+)-->')
+
+# PAGE CACHE
+# Halaman publik (home, rooms, venues, about, support) disimpan sebagai HTML
+# jadi per (path, query yang relevan, versi katalog, login/tamu). Bagian
+# personal di base.html ditulis lewat {{ fragment('...') }}: saat halaman
+# disimpan isinya placeholder, dan placeholder diisi per request dari
+# templates/partials/. Dengan begitu token CSRF, flash message dan menu
+# user tidak pernah ikut tersimpan. Admin yang mengubah katalog memanggil
+# purge(); worker lain ikut berganti key begitu versi katalog naik.
+
+class PageCache:
+    """Byte-bounded LRU of rendered pages with stale-while-revalidate"""
+
+    def __init__(self, max_bytes=MAX_BYTES, max_entry_bytes=MAX_ENTRY_BYTES,
+                 fresh_seconds=FRESH_SECONDS, stale_seconds=STALE_SECONDS):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = stale_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._refreshing = set()
+        self.stats = {'hits': 0, 'stale': 0, 'misses': 0, 'evictions': 0, 'purges': 0}
+
+    def get(self, key):
+        """(body, fresh) for a cached page, (None, False) on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None, False
+
+            body, size, stored_at = entry
+            age = now - stored_at
+            if age > self.stale_seconds:
+                self._drop(key)
+                self.stats['misses'] += 1
+                return None, False
+
+            self._entries.move_to_end(key)
+            fresh = age <= self.fresh_seconds
+            self.stats['hits' if fresh else 'stale'] += 1
+            return body, fresh
+
+    def put(self, key, body):
+        size = len(body.encode('utf-8'))
+        if size > self.max_entry_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (body, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+        return True
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def purge(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.stats['purges'] += 1
+
+    def begin_refresh(self, key):
+        """True for the one request that should re-render a stale page"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes,
+                        max_bytes=self.max_bytes)
+
+    def cached(self, query_args=(), version=None):
+        """Decorator for a public GET view that returns render_template() output.
+
+        `query_args` are the request args that change the page; `version`
+        is a callable whose result is part of the key (e.g. catalog version).
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                from flask import request, session, make_response, copy_current_request_context
+
+                if request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                key = (
+                    request.path,
+                    tuple((name, request.args.get(name)) for name in query_args),
+                    version() if version else None,
+                    bool(session.get('user_id'))
+                )
+
+                body, fresh = self.get(key)
+                state = 'HIT'
+                if body is None:
+                    state = 'MISS'
+                    body = capture(view, args, kwargs)
+                    if not isinstance(body, str):
+                        return body
+                    self.put(key, body)
+                elif not fresh and self.begin_refresh(key):
+                    state = 'STALE'
+
+                    @copy_current_request_context
+                    def revalidate():
+                        try:
+                            page = capture(view, args, kwargs)
+                            if isinstance(page, str):
+                                self.put(key, page)
+                        except Exception:
+                            log.exception('page_cache.refresh_error', path=key[0])
+                        finally:
+                            self.end_refresh(key)
+
+                    threading.Thread(target=revalidate, name='page-revalidate', daemon=True).start()
+
+                response = make_response(compose(body))
+                response.headers['X-Page-Cache'] = state
+                # Isi fragment personal: browser/proxy tidak boleh berbagi
+                response.headers['Cache-Control'] = 'private, no-cache'
+                response.vary.add('Cookie')
+                return response
+            return wrapper
+        return decorator
+
+def capture(view, args, kwargs):
+    """Render a view with fragments left as placeholders"""
+    from flask import g
+
+    g.page_capture = True
+    try:
+        return view(*args, **kwargs)
+    finally:
+        g.page_capture = False
+
+def compose(body):
+    """Fill every fragment placeholder for the current request"""
+    from flask import render_template
+
+    def render(match):
+        template = FRAGMENTS.get(match.group(1))
+        return render_template(template) if template else match.group(0)
+
+    return PLACEHOLDER_PATTERN.sub(render, body)
+
+def fragment(name):
+    """Jinja global: a personalized part of the page"""
+    from flask import g, render_template
+    from markupsafe import Markup
+
+    if g.get('page_capture'):
+        return Markup(PLACEHOLDER % name)
+    return Markup(render_template(FRAGMENTS[name]))
+
+def install(app):
+    app.jinja_env.globals['fragment'] = fragment
+
+page_cache = PageCache()
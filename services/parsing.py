@@ -0,0 +1,82 @@
+import json
+from functools import lru_cache
+
+# Jumlah nilai kolom berbeda yang hasil parse-nya disimpan
+CACHE_SIZE = 4096
+
+# Isi kolom yang berarti "tidak ada"
+EMPTY_VALUES = ('null', 'none', '[]', '{}')
+
+# ROOM/VENUE FIELD PARSING
+# Kolom images, amenities dan features berisi JSON array, JSON dengan kutip
+# tunggal, atau daftar dipisah koma, tergantung siapa yang menulisnya.
+# Semua route memakai parser di sini. Hasilnya di-memo per nilai mentah
+# (string yang sama muncul di setiap request) dan berupa tuple, jadi aman
+# dipakai bersama antar request.
+
+def _split(value):
+    parts = (part.strip().strip('"').strip("'").strip() for part in value.split(','))
+    return tuple(part for part in parts if part)
+
+def _load_json(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        # Ditulis dengan repr() Python: ['a', 'b']
+        return json.loads(value.replace("'", '"'))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_list(raw):
+    value = raw.strip()
+    if not value or value.lower() in EMPTY_VALUES:
+        return ()
+
+    if value.startswith('['):
+        try:
+            parsed = _load_json(value)
+        except ValueError:
+            return _split(value[1:-1] if value.endswith(']') else value[1:])
+
+        if not isinstance(parsed, list):
+            return (str(parsed),) if parsed else ()
+        items = (str(item).strip() for item in parsed if item is not None)
+        return tuple(item for item in items if item)
+
+    return _split(value)
+
+def parse_list(raw):
+    """Tuple of strings from a JSON array / comma-separated column value"""
+    if isinstance(raw, str):
+        return _parse_list(raw)
+    if isinstance(raw, (list, tuple)):
+        return tuple(str(item).strip() for item in raw if item)
+    return ()
+
+# images: path lokal, URL, atau referensi blob (lihat services/blobs.py)
+parse_images = parse_list
+parse_amenities = parse_list
+parse_features = parse_list
+
+def main_image(raw):
+    """First image of an images column value, or None"""
+    images = parse_images(raw)
+    return images[0] if images else None
+
+def normalize(rows, images_field='images', amenities_field='amenities'):
+    """Copies of a whole result set with images_list/amenities_list added.
+
+    One pass over the rows; rows sharing a column value share the parsed
+    tuple. Pass None as a field name to skip it.
+    """
+    normalized = []
+    for row in rows:
+        item = dict(row)
+        if images_field:
+            item['images_list'] = parse_images(item.get(images_field))
+        if amenities_field:
+            item['amenities_list'] = parse_amenities(item.get(amenities_field))
+        normalized.append(item)
+    return normalized
+
+def cache_info():
+    return _parse_list.cache_info()._asdict()
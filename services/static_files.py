@@ -0,0 +1,133 @@
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from services import assets
+from services.blobs import parse_ref
+
+# Cache-Control untuk URL yang isinya tidak akan pernah berubah
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# URL tanpa fingerprint: boleh disimpan, tapi selalu revalidasi (ETag -> 304)
+REVALIDATE = 'public, no-cache'
+
+FINGERPRINT_LENGTH = 16
+
+# File yang namanya sudah memuat hash isinya (blob store, turunan gambar,
+# hasil build asset)
+CONTENT_ADDRESSED = re.compile(r'(^|/)(blobs/|images/derived/|dist/)')
+
+# STATIC FILE SERVING
+# url_for('static', ...) otomatis diberi ?v=<hash isi file>; view static
+# menjawab dengan ETag kuat (hash yang sama), Range, 304 dan cache immutable
+# kalau fingerprint di URL cocok. Pengiriman memakai send_file(), jadi
+# wsgi.file_wrapper/sendfile() dan USE_X_SENDFILE tetap dipakai server.
+# File di static/dist/ dikirim dalam varian .br/.gz yang sudah dibuat
+# services/assets.py kalau browser menerimanya.
+
+_lock = threading.Lock()
+_fingerprints = {}
+
+def fingerprint(path):
+    """Content hash of a file, recomputed only when mtime/size change"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    parsed = parse_ref(path.replace(os.sep, '/'))
+    if parsed:
+        return parsed[0][:FINGERPRINT_LENGTH]
+
+    cached = _fingerprints.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    value = digest.hexdigest()[:FINGERPRINT_LENGTH]
+
+    with _lock:
+        _fingerprints[path] = (stat.st_mtime_ns, stat.st_size, value)
+    return value
+
+def send_fingerprinted(path, etag, immutable=False, private=False, **kwargs):
+    """send_file() with a strong ETag, ranges/304 and the right Cache-Control"""
+    from flask import send_file
+
+    response = send_file(path, conditional=True, etag=etag, **kwargs)
+    if immutable:
+        cache_control = IMMUTABLE
+    else:
+        cache_control = REVALIDATE
+    if private:
+        cache_control = cache_control.replace('public', 'private')
+    response.headers['Cache-Control'] = cache_control
+    response.headers.pop('Expires', None)
+    return response
+
+def install(app):
+    """Fingerprint url_for('static') and serve /static through send_fingerprinted"""
+    from flask import request, abort, url_for
+    from werkzeug.utils import safe_join
+
+    static_folder = app.static_folder
+
+    def static_path(filename):
+        path = safe_join(static_folder, filename)
+        return path if path and os.path.isfile(path) else None
+
+    @app.url_defaults
+    def add_static_fingerprint(endpoint, values):
+        if endpoint != 'static' or 'v' in values or 'filename' not in values:
+            return
+        # Asset hasil `python -m services.assets` menggantikan file sumbernya
+        values['filename'] = assets.resolve(values['filename'])
+        path = static_path(values['filename'])
+        if path and not CONTENT_ADDRESSED.search(values['filename']):
+            values['v'] = fingerprint(path)
+
+    def serve_static(filename):
+        path = static_path(filename)
+        if path is None:
+            abort(404)
+
+        etag = fingerprint(path)
+        immutable = bool(CONTENT_ADDRESSED.search(filename)) or request.args.get('v') == etag
+
+        # Varian .br/.gz dibuat saat build; tidak ada kompresi saat request
+        encoding, variant = assets.precompressed(path, request.accept_encodings)
+        if encoding is None:
+            return send_fingerprinted(path, etag, immutable)
+
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        response = send_fingerprinted(variant, f"{etag}-{encoding}", immutable, mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+    app.view_functions['static'] = serve_static
+
+    def asset_url(url):
+        """Fingerprint a literal '/static/...' URL (e.g. an image path from the DB)"""
+        if not url or not isinstance(url, str):
+            return url
+        if url.startswith('static/'):
+            url = '/' + url
+        if not url.startswith('/static/') or '?' in url or CONTENT_ADDRESSED.search(url):
+            return url
+
+        path = static_path(url[len('/static/'):])
+        return f"{url}?v={fingerprint(path)}" if path else url
+
+    def asset(name):
+        """URL of a CSS/JS asset, the built variant when the manifest has one"""
+        return url_for('static', filename=name)
+
+    app.jinja_env.globals['asset'] = asset
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.jinja_env.filters['fingerprint'] = asset_url
+    return asset_url
@@ -0,0 +1,35 @@
+import os
+from services.logs import get_logger
+
+log = get_logger('templates')
+
+# Bytecode hasil compile template, dipakai ulang lintas restart/worker
+CACHE_DIR = os.path.join('instance', 'jinja_cache')
+
+# TEMPLATE CACHE
+# Template besar (venues.html, book.html, payment.html) dicompile Jinja
+# saat pertama dirender, per worker. install() menyimpan bytecode-nya di
+# disk dan meng-compile semua template saat boot, jadi worker baru hanya
+# memuat bytecode dan request pertama tidak menanggung biaya compile.
+
+def install(app, directory=CACHE_DIR):
+    """Persist compiled template bytecode on disk and warm every template"""
+    from jinja2 import FileSystemBytecodeCache
+
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    return warm(app)
+
+def warm(app):
+    """Load every .html template once; returns how many were loaded"""
+    from jinja2 import TemplateError
+
+    loaded = 0
+    for name in app.jinja_env.list_templates(extensions=('html',)):
+        try:
+            app.jinja_env.get_template(name)
+            loaded += 1
+        except TemplateError as e:
+            # Template rusak tetap gagal saat dirender, tapi boot jalan terus
+            log.error('templates.warmup_error', template=name, error=str(e))
+    return loaded
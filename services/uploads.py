@@ -0,0 +1,250 @@
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from services import images, blobs
+from services.catalog import catalog
+from services.page_cache import page_cache
+from services.logs import get_logger
+
+log = get_logger('uploads')
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # tanpa Pillow hanya sniff format + checksum
+    Image = None
+
+UPLOAD_WORKERS = 2
+# Job yang boleh antri; kalau penuh request memproses sendiri (backpressure)
+UPLOAD_QUEUE_SIZE = 32
+# Sisi terpanjang foto yang disimpan
+MAX_IMAGE_SIDE = 2400
+
+PENDING = 'pending'
+READY = 'ready'
+REJECTED = 'rejected'
+
+PAYMENT = 'payment'
+ROOM = 'room'
+
+# Magic bytes -> format; ekstensi file tidak dipercaya
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'%PDF-', 'pdf'),
+)
+IMAGE_FORMATS = {'jpeg', 'png', 'gif', 'webp'}
+
+# UPLOAD PROCESSING
+# Request hanya menyimpan byte upload ke blob store dan mencatat status
+# 'pending' di barisnya (payments.upload_status / rooms.images_status).
+# Sniff format, resize, buang EXIF dan checksum dikerjakan pool proses;
+# hasilnya ditulis balik ke database oleh satu thread di proses web.
+
+def sniff_format(head):
+    for signature, fmt in SIGNATURES:
+        if head.startswith(signature):
+            return fmt
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+def _normalize_image(path, fmt, max_side, tmp_dir):
+    """Re-encode a copy: apply EXIF orientation, drop metadata, cap size"""
+    with Image.open(path) as img:
+        img.load()
+        img = ImageOps.exif_transpose(img)
+        if max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+        if fmt == 'jpeg' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+
+        os.makedirs(tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(tmp_dir, f"normalize-{os.getpid()}-{threading.get_ident()}")
+        save_options = {'quality': 88, 'optimize': True} if fmt == 'jpeg' else {}
+        # Tanpa exif=... Pillow tidak menulis ulang metadata
+        img.save(tmp_path, fmt.upper(), **save_options)
+    return tmp_path
+
+def process_file(ref, kind, max_side=MAX_IMAGE_SIDE):
+    """Post-process one stored upload; runs inside a pool worker.
+
+    Blobs are immutable, so a normalized image is stored as a new blob and
+    returned as `new_ref`; the old blob is left for the garbage collector.
+    """
+    store = blobs.payment_store if kind == PAYMENT else blobs.room_store
+    path = store.path_for_ref(ref)
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(16)
+    except (OSError, TypeError) as e:
+        return {'ref': ref, 'status': REJECTED, 'error': str(e)}
+
+    fmt = sniff_format(head)
+    if fmt is None or (kind == ROOM and fmt not in IMAGE_FORMATS):
+        return {'ref': ref, 'status': REJECTED, 'error': 'Unsupported file content'}
+
+    new_ref = ref
+    if Image is not None and fmt in IMAGE_FORMATS and fmt != 'gif':
+        try:
+            tmp_path = _normalize_image(path, fmt, max_side, os.path.join(store.root, 'tmp'))
+            new_ref, path, _ = store.put_file(tmp_path, store.label_of(ref), move=True)
+        except (OSError, ValueError) as e:
+            return {'ref': ref, 'status': REJECTED, 'error': f'Unreadable image: {e}'}
+
+    result = {
+        'ref': ref,
+        'new_ref': new_ref,
+        'status': READY,
+        'format': fmt,
+        'checksum': blobs.parse_ref(new_ref)[0]
+    }
+    if kind == ROOM:
+        result['derivatives'] = images.render_derivatives(path)
+    return result
+
+def process_job(kind, refs):
+    return [process_file(ref, kind) for ref in refs]
+
+class UploadProcessor:
+    """Bounded process pool for upload post-processing"""
+
+    def __init__(self, workers=UPLOAD_WORKERS, queue_size=UPLOAD_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._results = queue.Queue()
+        self._thread = None
+        self._app = None
+        self._mysql = None
+        self.stats = {'submitted': 0, 'inline': 0, 'ready': 0, 'rejected': 0, 'failed': 0}
+
+    def start(self, app, mysql):
+        """Create the pool and the status writer thread.
+
+        The pool forks its workers here, before the request threads exist.
+        Platforms without fork (Windows) fall back to a thread pool, since
+        spawned workers would re-import app.py.
+        """
+        if self._executor is not None:
+            return
+
+        self._app = app
+        self._mysql = mysql
+        self.workers = app.config.get('UPLOAD_WORKERS', self.workers)
+        self.queue_size = app.config.get('UPLOAD_QUEUE_SIZE', self.queue_size)
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+
+        if 'fork' in multiprocessing.get_all_start_methods():
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'))
+            for _ in range(self.workers):
+                self._executor.submit(os.getpid)
+        else:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='upload')
+
+        self._thread = threading.Thread(target=self._write_results, name='upload-status', daemon=True)
+        self._thread.start()
+
+    def submit(self, kind, row_id, refs):
+        """Queue post-processing of blob `refs` for one payment/room row.
+
+        `row_id` is the booking id for payments and the room id for rooms.
+        When the queue is full (or the pool is not running) the files are
+        processed in the calling thread instead.
+        """
+        refs = [ref for ref in refs if blobs.parse_ref(ref)]
+        if not refs:
+            return
+
+        if self._executor is not None and self._slots.acquire(blocking=False):
+            try:
+                future = self._executor.submit(process_job, kind, refs)
+            except Exception as e:
+                self._slots.release()
+                log.warning('uploads.pool_unavailable', error=str(e))
+            else:
+                self.stats['submitted'] += 1
+                future.add_done_callback(lambda f: self._done(kind, row_id, refs, f))
+                return
+
+        self.stats['inline'] += 1
+        results = process_job(kind, refs)
+        if self._thread is not None:
+            self._results.put((kind, row_id, results))
+        elif self._mysql is not None:
+            self._apply(self._mysql.connection, kind, row_id, results)
+
+    def _done(self, kind, row_id, refs, future):
+        self._slots.release()
+        try:
+            results = future.result()
+        except Exception as e:
+            log.exception('uploads.process_error')
+            self.stats['failed'] += 1
+            results = [{'ref': ref, 'status': REJECTED, 'error': str(e)} for ref in refs]
+        self._results.put((kind, row_id, results))
+
+    def _write_results(self):
+        while True:
+            item = self._results.get()
+            try:
+                with self._app.app_context():
+                    self._apply(self._mysql.connection, *item)
+            except Exception:
+                log.exception('uploads.status_error')
+
+    def _apply(self, connection, kind, row_id, results):
+        for result in results:
+            self.stats[result['status']] += 1
+            if result.get('derivatives'):
+                images.register(result['new_ref'], result['derivatives'])
+
+        cur = connection.cursor()
+        try:
+            if kind == PAYMENT:
+                for result in results:
+                    new_ref = result.get('new_ref', result['ref'])
+                    cur.execute("""
+                        UPDATE payments
+                        SET proof_image = %s, upload_status = %s, upload_checksum = %s
+                        WHERE booking_id = %s AND proof_image = %s
+                    """, (new_ref, result['status'], result.get('checksum'), row_id, result['ref']))
+                    if cur.rowcount:
+                        blobs.change_refs(cur, blobs.PAYMENTS, [result['ref']], [new_ref])
+            else:
+                # ref lama -> ref baru, None kalau ditolak
+                replaced = {r['ref']: r.get('new_ref') for r in results}
+                cur.execute("SELECT images FROM rooms WHERE id = %s FOR UPDATE", (row_id,))
+                room = cur.fetchone()
+                if room is not None:
+                    old_images = [img.strip() for img in (room['images'] or '').split(',') if img.strip()]
+                    new_images = [replaced.get(img, img) for img in old_images]
+                    new_images = [img for img in new_images if img]
+                    rejected = any(r['status'] == REJECTED for r in results)
+
+                    blobs.change_refs(cur, blobs.ROOMS, old_images, new_images)
+                    cur.execute("""
+                        UPDATE rooms SET images = %s, images_status = %s WHERE id = %s
+                    """, (','.join(new_images) or None, REJECTED if rejected else READY, row_id))
+                    # Halaman publik menampilkan gambar kamar: versi katalog ikut naik
+                    catalog.bump(cur)
+            connection.commit()
+            if kind == ROOM:
+                catalog.invalidate()
+                page_cache.purge()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def snapshot(self):
+        return dict(self.stats, queue_size=self.queue_size, workers=self.workers,
+                    unwritten=self._results.qsize())
+
+processor = UploadProcessor()
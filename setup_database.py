@@ -2,6 +2,9 @@ import mysql.connector
 from mysql.connector import Error
 import hashlib
 from werkzeug.security import generate_password_hash
+from services.inventory import rebuild_inventory
+from services.counters import rebuild_counters
+from services.blobs import rebuild_refs
 
 def create_connection():
     """Membuat koneksi ke database feizen_haven"""
@@ -68,6 +71,7 @@ def create_tables():
             room_count INT DEFAULT 1,
             room_type ENUM('hotel_room', 'meeting_room', 'facility', 'restaurant', 'spa') DEFAULT 'hotel_room',
             available_count INT DEFAULT 1,
+            images_status ENUM('pending', 'ready', 'rejected') DEFAULT 'ready',
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             INDEX idx_room_type (room_type),
             INDEX idx_is_available (is_available),
@@ -85,6 +89,8 @@ def create_tables():
             payment_method ENUM('qris', 'bank_transfer', 'credit_card', 'ovo', 'gopay', 'dana') NOT NULL,
             status ENUM('pending', 'processing', 'completed', 'failed', 'expired') DEFAULT 'pending',
             proof_image VARCHAR(255),
+            upload_status ENUM('pending', 'ready', 'rejected') DEFAULT 'ready',
+            upload_checksum CHAR(64),
             payment_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             expiration_date TIMESTAMP NULL,
             admin_notes TEXT,
@@ -92,7 +98,9 @@ def create_tables():
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
             INDEX idx_booking_id (booking_id),
             INDEX idx_status (status),
-            INDEX idx_payment_date (payment_date)
+            INDEX idx_payment_date (payment_date),
+            INDEX idx_created_at_id (created_at, id),
+            INDEX idx_status_created_at (status, created_at, id)
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
         """
         
@@ -130,7 +138,9 @@ def create_tables():
             INDEX idx_check_in (check_in),
             INDEX idx_check_out (check_out),
             INDEX idx_booking_code (booking_code),
-            INDEX idx_payment_status (payment_status)
+            INDEX idx_payment_status (payment_status),
+            INDEX idx_created_at_id (created_at, id),
+            INDEX idx_status_created_at (status, created_at, id)
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
         """
         
@@ -179,6 +189,103 @@ def create_tables():
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
         """
         
+        # SQL untuk membuat tabel room_inventory (ledger stok per malam)
+        room_inventory_table = """
+        CREATE TABLE IF NOT EXISTS room_inventory (
+            room_id INT NOT NULL,
+            stay_date DATE NOT NULL,
+            total_units INT NOT NULL DEFAULT 0,
+            reserved_units INT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (room_id, stay_date),
+            FOREIGN KEY (room_id) REFERENCES rooms(id) ON DELETE CASCADE ON UPDATE CASCADE,
+            INDEX idx_stay_date (stay_date)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """
+        
+        # SQL untuk membuat tabel room_holds (stok yang ditahan selama checkout)
+        room_holds_table = """
+        CREATE TABLE IF NOT EXISTS room_holds (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            hold_token CHAR(32) NOT NULL UNIQUE,
+            user_id INT NOT NULL,
+            room_id INT NOT NULL,
+            check_in DATE NOT NULL,
+            check_out DATE NOT NULL,
+            units INT NOT NULL DEFAULT 1,
+            status ENUM('active', 'converted', 'released', 'expired') DEFAULT 'active',
+            expires_at TIMESTAMP NOT NULL,
+            booking_id INT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (room_id) REFERENCES rooms(id) ON DELETE CASCADE ON UPDATE CASCADE,
+            INDEX idx_user_room_status (user_id, room_id, status),
+            INDEX idx_status_expires (status, expires_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """
+        
+        # SQL untuk membuat tabel booking_code_blocks (urutan kode booking per hari)
+        booking_code_blocks_table = """
+        CREATE TABLE IF NOT EXISTS booking_code_blocks (
+            day INT PRIMARY KEY,
+            next_value INT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """
+        
+        # SQL untuk membuat tabel idempotency_keys (response POST booking/pembayaran untuk replay)
+        idempotency_keys_table = """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            user_id INT NOT NULL,
+            scope VARCHAR(50) NOT NULL,
+            idem_key VARCHAR(64) NOT NULL,
+            fingerprint CHAR(64) NOT NULL,
+            state ENUM('pending', 'done') DEFAULT 'pending',
+            status_code SMALLINT NULL,
+            content_type VARCHAR(100) NULL,
+            location VARCHAR(500) NULL,
+            body MEDIUMBLOB NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (user_id, scope, idem_key),
+            INDEX idx_expires_at (expires_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """
+        
+        # SQL untuk membuat tabel status_counters (jumlah booking/payment per status)
+        status_counters_table = """
+        CREATE TABLE IF NOT EXISTS status_counters (
+            entity VARCHAR(20) NOT NULL,
+            scope_id INT NOT NULL DEFAULT 0,
+            status VARCHAR(30) NOT NULL,
+            slot TINYINT NOT NULL DEFAULT 0,
+            total INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (entity, scope_id, status, slot)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """
+        
+        # SQL untuk membuat tabel blobs (refcount blob store upload)
+        blobs_table = """
+        CREATE TABLE IF NOT EXISTS blobs (
+            store VARCHAR(20) NOT NULL,
+            sha256 CHAR(64) NOT NULL,
+            ext VARCHAR(10) NOT NULL,
+            ref_count INT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (store, sha256),
+            INDEX idx_ref_count_updated (ref_count, updated_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """
+        
+        # SQL untuk membuat tabel cache_versions (versi katalog untuk cache per worker)
+        cache_versions_table = """
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name VARCHAR(50) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """
+        
         # CREATE TABELS DALAM URUTAN YANG BENAR
         print("Membuat tabel users...")
         cursor.execute(users_table)
@@ -198,6 +305,31 @@ def create_tables():
         print("Membuat tabel contact_inquiries...")
         cursor.execute(contact_inquiries_table)
         
+        print("Membuat tabel room_inventory...")
+        cursor.execute(room_inventory_table)
+        
+        print("Membuat tabel room_holds...")
+        cursor.execute(room_holds_table)
+        
+        print("Membuat tabel booking_code_blocks...")
+        cursor.execute(booking_code_blocks_table)
+        
+        print("Membuat tabel idempotency_keys...")
+        cursor.execute(idempotency_keys_table)
+        
+        print("Membuat tabel status_counters...")
+        cursor.execute(status_counters_table)
+        
+        print("Membuat tabel blobs...")
+        cursor.execute(blobs_table)
+        
+        print("Membuat tabel cache_versions...")
+        cursor.execute(cache_versions_table)
+        cursor.execute("""
+            INSERT INTO cache_versions (name, version) VALUES ('catalog', 1)
+            ON DUPLICATE KEY UPDATE version = version + 1
+        """)
+        
         print("\n✅ Semua tabel berhasil dibuat!")
         
         connection.commit()
@@ -591,6 +723,162 @@ def insert_sample_data():
         cursor.close()
         connection.close()
 
+# Index untuk keyset pagination admin (created_at, id)
+PAGINATION_INDEXES = [
+    ('bookings', 'idx_created_at_id', '(created_at, id)'),
+    ('bookings', 'idx_status_created_at', '(status, created_at, id)'),
+    ('payments', 'idx_created_at_id', '(created_at, id)'),
+    ('payments', 'idx_status_created_at', '(status, created_at, id)'),
+]
+
+def add_pagination_indexes():
+    """Tambahkan index pagination ke database lama yang belum punya"""
+    connection = create_connection()
+    if connection is None:
+        print("❌ Gagal terkoneksi ke database!")
+        return False
+    
+    cursor = connection.cursor(dictionary=True)
+    
+    try:
+        for table, index_name, columns in PAGINATION_INDEXES:
+            cursor.execute("""
+                SELECT COUNT(*) as count FROM information_schema.statistics
+                WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+            """, (table, index_name))
+            if cursor.fetchone()['count']:
+                continue
+            
+            print(f"Menambahkan index {index_name} ke {table}...")
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX {index_name} {columns}")
+        
+        connection.commit()
+        return True
+        
+    except Error as e:
+        print(f"❌ Error saat menambahkan index: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+# Kolom status proses upload (services/uploads.py)
+UPLOAD_STATUS_COLUMNS = [
+    ('payments', 'upload_status', "ENUM('pending', 'ready', 'rejected') DEFAULT 'ready' AFTER proof_image"),
+    ('payments', 'upload_checksum', "CHAR(64) AFTER upload_status"),
+    ('rooms', 'images_status', "ENUM('pending', 'ready', 'rejected') DEFAULT 'ready' AFTER available_count"),
+]
+
+def add_upload_status_columns():
+    """Tambahkan kolom status upload ke database lama yang belum punya"""
+    connection = create_connection()
+    if connection is None:
+        print("❌ Gagal terkoneksi ke database!")
+        return False
+    
+    cursor = connection.cursor(dictionary=True)
+    
+    try:
+        for table, column, definition in UPLOAD_STATUS_COLUMNS:
+            cursor.execute("""
+                SELECT COUNT(*) as count FROM information_schema.columns
+                WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+            """, (table, column))
+            if cursor.fetchone()['count']:
+                continue
+            
+            print(f"Menambahkan kolom {column} ke {table}...")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        
+        connection.commit()
+        return True
+        
+    except Error as e:
+        print(f"❌ Error saat menambahkan kolom: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+def rebuild_room_inventory():
+    """Isi ulang ledger room_inventory dari data bookings"""
+    connection = create_connection()
+    if connection is None:
+        print("❌ Gagal terkoneksi ke database!")
+        return False
+    
+    cursor = connection.cursor(dictionary=True)
+    
+    try:
+        print("\n" + "=" * 50)
+        print("MEMBANGUN ULANG ROOM INVENTORY")
+        print("=" * 50)
+        
+        rows = rebuild_inventory(cursor)
+        connection.commit()
+        print(f"✅ {rows} baris inventory per malam dibuat")
+        return True
+        
+    except Error as e:
+        print(f"❌ Error saat membangun inventory: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+def rebuild_status_counters():
+    """Hitung ulang status_counters dari tabel bookings dan payments"""
+    connection = create_connection()
+    if connection is None:
+        print("❌ Gagal terkoneksi ke database!")
+        return False
+    
+    cursor = connection.cursor(dictionary=True)
+    
+    try:
+        print("\n" + "=" * 50)
+        print("MENGHITUNG ULANG STATUS COUNTERS")
+        print("=" * 50)
+        
+        rows = rebuild_counters(cursor)
+        connection.commit()
+        print(f"✅ {rows} baris counter dibuat")
+        return True
+        
+    except Error as e:
+        print(f"❌ Error saat menghitung counter: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+def rebuild_blob_refs():
+    """Hitung ulang refcount blob dari payments.proof_image dan rooms.images"""
+    connection = create_connection()
+    if connection is None:
+        print("❌ Gagal terkoneksi ke database!")
+        return False
+    
+    cursor = connection.cursor(dictionary=True)
+    
+    try:
+        blob_count = rebuild_refs(cursor)
+        connection.commit()
+        print(f"✅ {blob_count} blob upload terhitung")
+        return True
+        
+    except Error as e:
+        print(f"❌ Error saat menghitung blob: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
 def verify_database():
     """Verifikasi struktur database dan data"""
     connection = create_connection()
@@ -618,7 +906,10 @@ def verify_database():
             'bookings': 'Bookings',
             'payments': 'Payments',
             'venues': '📍 Venues',
-            'contact_inquiries': 'Contact Inquiries'
+            'contact_inquiries': 'Contact Inquiries',
+            'room_inventory': 'Room Inventory',
+            'room_holds': 'Room Holds',
+            'status_counters': 'Status Counters'
         }
         
         for table, label in table_counts.items():
@@ -645,18 +936,27 @@ def main():
         print("Gagal membuat tabel. Proses dihentikan.")
         return
     
+    add_pagination_indexes()
+    add_upload_status_columns()
+    
     # 2. Tanya apakah mau insert sample data
     print("\n" + "-" * 50)
     add_sample = input("Tambahkan data contoh? (y/n): ").lower().strip()
     
     if add_sample == 'y' or add_sample == '':
         if insert_sample_data():
+            rebuild_room_inventory()
+            rebuild_status_counters()
+            rebuild_blob_refs()
             # 3. Verifikasi database
             verify_database()
         else:
             print("Gagal menambahkan data contoh.")
     else:
         print("ℹData contoh tidak ditambahkan.")
+        rebuild_room_inventory()
+        rebuild_status_counters()
+        rebuild_blob_refs()
         verify_database()
     
     print("\n" + "=" * 60)